@@ -1,15 +1,18 @@
 """Application"""
+from os import environ
+
 from flask import Flask
 from flask_login import LoginManager, current_user
 from sqlite_database import op
 from future_router import Router
 
-from .model.user import UserInterface
+from .model.user import USER_CACHE_TTL, UserInterface, UserModel
 from .skeleton.user import UserSkeleton
 
 from .flask_utils import get_admin, get_moderator
-from .utils import load as toml_load
-from .database_loader import database
+from .utils import load as toml_load, NO_ROLES
+from .database_loader import database, init_app as init_database
+from .cache import cached
 
 login_manager = LoginManager()
 
@@ -23,39 +26,55 @@ def register_user_model(app: Flask, model: UserSkeleton):
 
 
 def register_login(base: Flask):
-    """This function should be registered in `bootstrap.register`"""
-    register_user_model(base, UserInterface)  # type: ignore
+    """This function should be registered in `bootstrap.register`
 
+    Config:
+        USER_CACHE_TTL: seconds a loaded user is reused before it is read
+            again, defaults to 5
+    """
+    UserModel.configure_identity_cache(ttl=base.config.get("USER_CACHE_TTL", USER_CACHE_TTL))
+    register_user_model(base, UserInterface)  # type: ignore
 
-def create_app():
-    """Bootstrap app creation"""
-    base = Flask(__name__)
-    base.config.from_file("../config.toml", toml_load)  # type: ignore
 
+@cached(maxsize=1, ttl=300, name="group_names")
+def group_names() -> tuple[str, str]:
+    """Names of root (gid 0) and moderator (gid 999) groups, queried on first use"""
     groups = database.table('groups')
     _rootgroup = groups.select_one({"gid": op == 0})
     _psadmin = groups.select_one({"gid": op == 999})
     rootgroup = _rootgroup['name'] if _rootgroup else get_admin()
     pseudo_admin = _psadmin['name'] if _psadmin else get_moderator()
+    return rootgroup, pseudo_admin
+
+
+def create_app(config: dict | None = None):
+    """Bootstrap app creation
+
+    Args:
+        config (dict | None, optional): Overrides config.toml values, which is
+            then optional (used by tests/benchmarks). Defaults to None.
+
+    The config file is read from `APP_CONFIG` when set, config.toml otherwise.
+    """
+    base = Flask(__name__, template_folder="../templates", static_folder="../static")
+    base.config.from_file(environ.get("APP_CONFIG", "../config.toml"), toml_load,  # type: ignore
+                          silent=config is not None)
+    if config:
+        base.config.update(config)
+    init_database(base)
 
     @base.template_global()
     def is_admin():
         """Is user admin"""
         if current_user is None:
             return False
-        uroles: list[str] = current_user.groups.split(',')  # type: ignore
-        if rootgroup in uroles:
-            return True
-        return False
+        return group_names()[0] in getattr(current_user, 'roles', NO_ROLES)
 
     @base.template_global()
     def is_moderator():
         """Is user moderator"""
         if current_user is None:
             return False
-        uroles: list[str] = current_user.groups.split(',')  # type: ignore
-        if pseudo_admin in uroles:
-            return True
-        return False
+        return group_names()[1] in getattr(current_user, 'roles', NO_ROLES)
 
     return base
@@ -1,14 +1,71 @@
-"""Api Route"""
+"""Api Route
+
+Views may be `async def`, blocking database calls in them go through
+`async_database` so they don't stall the event loop."""
 # pylint: disable=missing-function-docstring,missing-class-docstring
-from flask import Blueprint, jsonify
+from flask import Blueprint, abort, jsonify, request
 from future_router import Router
+from sqlite_database import op
+
+try:
+    from app import async_database
+    from app.flask_utils import role_required
+    from app.json_provider import json_array_response, ndjson_response
+    from app.model.user import UserModel
+except ImportError:
+    from . import async_database
+    from .flask_utils import role_required
+    from .json_provider import json_array_response, ndjson_response
+    from .model.user import UserModel
 
 Route = Router(Blueprint("api", __name__, url_prefix="/api"))
+users_table = async_database.table('users')
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 
 @Route.get('/')
-def root():
+async def root():
     return jsonify({
         'status': 'success',
         'message': "Hello, World"
     })
+
+
+@Route.get('/users')
+@role_required("admin")
+async def users():
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    after = request.args.get('after') or None
+    page = await async_database.run(UserModel.page, after, limit)
+    return jsonify({
+        'status': 'success',
+        'users': [user.as_public() for user in page],
+        'next': page[-1].username if len(page) == limit else None
+    })
+
+
+@Route.get('/users/<username>')
+@role_required("admin")
+async def user(username: str):
+    row = await users_table.select_one({'username': op == username},
+                                       what=('username', 'picture', 'groups'))
+    if not row:
+        abort(404)
+    return jsonify({'status': 'success', 'user': row})
+
+
+# Streaming generators are iterated by the server after the view returns, so
+# these stay synchronous
+@Route.get('/users.ndjson')
+@role_required("admin")
+def users_ndjson():
+    return ndjson_response(user.as_public() for user in UserModel.iterate())
+
+
+@Route.get('/users.json')
+@role_required("admin")
+def users_json():
+    return json_array_response((user.as_public() for user in UserModel.iterate()),
+                               'users', {'status': 'success'})
@@ -0,0 +1,78 @@
+"""Running the WSGI app under an ASGI server"""
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+THREADS = 32
+
+
+class _ThreadedInstance(WsgiToAsgiInstance):
+    """One request, its WSGI call runs on the adapter's pool"""
+
+    def __init__(self, wsgi_application, duplicate_header_limit: int,
+                 executor: ThreadPoolExecutor) -> None:
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):  # pylint: disable=invalid-overridden-method
+        # asgiref's version is a thread sensitive `sync_to_async`, one thread for all
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False,
+                            executor=self.executor)(body)
+
+    def _run_wsgi_app(self, body):
+        """Call the app on a pool thread and send its response, as asgiref does"""
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Too many duplicate headers
+            self.sync_send({'type': "http.response.start", 'status': 400,
+                            'headers': [(b"content-type", b"text/plain")]})
+            self.sync_send({'type': "http.response.body",
+                            'body': b"Bad Request: Too many duplicate headers"})
+            return
+        result = self.wsgi_application(environ, self.start_response)
+        try:
+            sent = 0
+            for output in result:
+                self._send_start()
+                length = self.response_content_length
+                if length is not None:
+                    output = output[:length - sent]
+                self.sync_send({'type': "http.response.body", 'body': output,
+                                'more_body': True})
+                sent += len(output)
+                if sent == length:
+                    break
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        self._send_start()
+        self.sync_send({'type': "http.response.body"})
+
+    def _send_start(self):
+        """Send the status and headers once, before the first body chunk"""
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):  # pylint: disable=too-few-public-methods
+    """`WsgiToAsgi` running requests concurrently on a thread pool.
+
+    asgiref runs every WSGI call on one shared thread, so requests would wait
+    for each other. Here up to `threads` requests are inside the app at once.
+
+    Args:
+        wsgi_application: The WSGI app.
+        threads (int, optional): Pool size. Defaults to THREADS.
+    """
+
+    def __init__(self, wsgi_application, threads: int = THREADS,
+                 duplicate_header_limit: int = 100) -> None:
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = ThreadPoolExecutor(max(1, threads), thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedInstance(self.wsgi_application, self.duplicate_header_limit,
+                                self.executor)(scope, receive, send)
@@ -0,0 +1,133 @@
+"""Static asset pipeline"""
+from gzip import compress as gzip_compress
+from hashlib import sha256
+from json import dumps, loads
+from mimetypes import guess_type
+from os import makedirs, walk
+from os.path import dirname, exists, join, relpath, splitext
+from types import SimpleNamespace
+
+from flask import Flask, abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    from brotli import compress as brotli_compress  # type: ignore
+except ImportError:
+    brotli_compress = None
+
+# Directories (under static folder) that get fingerprinted
+ASSET_DIRS = ('main',)
+ASSET_URL = "/assets"
+MANIFEST = "manifest.json"
+MAX_AGE = 31536000
+# Don't bother compressing files smaller than this
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+
+_Assets = SimpleNamespace(manifest={}, output=None)
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """Insert content hash into file name: main/app.css -> main/app.1a2b3c4d5e6f.css"""
+    root, ext = splitext(name)
+    return f"{root}.{sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _write(path: str, content: bytes):
+    if exists(path):
+        return
+    makedirs(dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+def build(source: str, output: str, dirs: tuple[str, ...] = ASSET_DIRS) -> dict[str, str]:
+    """Copy assets to output under fingerprinted names, with .gz (and .br when
+    brotli is installed) siblings, and write a manifest.
+
+    Returns:
+        dict[str, str]: Manifest, original name -> fingerprinted name
+    """
+    manifest: dict[str, str] = {}
+    for directory in dirs:
+        for root, _, files in walk(join(source, directory)):
+            for filename in sorted(files):
+                path = join(root, filename)
+                name = relpath(path, source).replace('\\', '/')
+                with open(path, 'rb') as file:
+                    content = file.read()
+                hashed = fingerprint(name, content)
+                manifest[name] = hashed
+                target = join(output, hashed)
+                _write(target, content)
+                if len(content) < MIN_COMPRESS_SIZE or not name.endswith(COMPRESSIBLE):
+                    continue
+                _write(target + ".gz", gzip_compress(content, 9, mtime=0))
+                if brotli_compress is not None:
+                    _write(target + ".br", brotli_compress(content))
+    makedirs(output, exist_ok=True)
+    with open(join(output, MANIFEST), 'w', encoding='utf-8') as file:
+        file.write(dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def load_manifest(output: str) -> dict[str, str]:
+    """Read manifest written by `build`"""
+    with open(join(output, MANIFEST), encoding='utf-8') as file:
+        return loads(file.read())
+
+
+def static_url(filename: str) -> str:
+    """URL of a static file, fingerprinted when it's part of the manifest"""
+    hashed = _Assets.manifest.get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('assets', filename=hashed)
+
+
+def serve_asset(filename: str):
+    """Serve a fingerprinted asset, picking a precompressed copy the client accepts"""
+    output: str | None = _Assets.output
+    path = safe_join(output, filename) if output else None
+    if path is None or not exists(path) or filename == MANIFEST:
+        return abort(404)
+    mimetype = guess_type(filename)[0] or 'application/octet-stream'
+    encodings = request.accept_encodings
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[candidate] and exists(path + suffix):
+            encoding = candidate
+            path += suffix
+            break
+    response = send_file(path, mimetype=mimetype, max_age=MAX_AGE, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f"public, max-age={MAX_AGE}, immutable"
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def build_assets(app: Flask):
+    """Build fingerprinted assets, or load the manifest of a previous build. Touches
+    no app state, so it can be registered in `bootstrap.register` with parallel=True
+
+    Config:
+        ASSETS_OUTPUT: build directory, defaults to `<static folder>/dist`
+        ASSETS_BUILD: rebuild at startup, defaults to true. When false an
+            existing manifest is loaded instead.
+    """
+    source: str = app.static_folder  # type: ignore
+    output = app.config.get("ASSETS_OUTPUT", join(source, "dist"))
+    if app.config.get("ASSETS_BUILD", True) or not exists(join(output, MANIFEST)):
+        manifest = build(source, output)
+    else:
+        manifest = load_manifest(output)
+    _Assets.manifest = manifest
+    _Assets.output = output
+
+
+def init_app(app: Flask):
+    """Register `static_url` and the asset route. This function should be registered
+    in `bootstrap.register`, along with `build_assets`"""
+    app.add_url_rule(f"{ASSET_URL}/<path:filename>", "assets", serve_asset)
+    app.add_template_global(static_url)
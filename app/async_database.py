@@ -0,0 +1,119 @@
+"""Async database access"""
+from asyncio import get_running_loop
+from atexit import register as atexit_register
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, TypeVar
+
+from flask import Flask
+
+try:
+    from app.database_loader import TableProxy, database
+except ImportError:
+    from .database_loader import TableProxy, database
+
+T = TypeVar("T")
+
+WORKERS = 8
+
+
+class DatabaseExecutor:
+    """Bounded thread pool for blocking database calls made from async views.
+
+    Every pool thread keeps its own connection (see `ConnectionManager`), so at
+    most `workers` connections serve any number of awaiting requests. The pool
+    starts on first use, nothing is spawned at import or bootstrap.
+
+    Args:
+        workers (int, optional): Pool size. Defaults to WORKERS.
+    """
+
+    def __init__(self, workers: int = WORKERS) -> None:
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+
+    def configure(self, workers: int):
+        """Change pool size, running pool is replaced on next use"""
+        self.shutdown()
+        self.workers = workers
+
+    def _pool(self) -> ThreadPoolExecutor:
+        running = self._executor
+        if running is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max(1, self.workers),
+                                                        thread_name_prefix="database")
+                running = self._executor
+        return running
+
+    async def run(self, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Await func(*args, **kwargs) run on the pool. It runs in a copy of the
+        caller's context, so app context, `g` and query metrics still apply."""
+        context = copy_context()
+        return await get_running_loop().run_in_executor(
+            self._pool(), partial(context.run, func, *args, **kwargs))
+
+    def shutdown(self):
+        """Stop the pool, queued calls are cancelled"""
+        with self._lock:
+            running, self._executor = self._executor, None
+        if running is not None:
+            running.shutdown(cancel_futures=True)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(workers={self.workers})"
+
+
+executor = DatabaseExecutor()
+atexit_register(executor.shutdown)
+
+
+def _call(proxy: TableProxy, name: str, args: tuple, kwargs: dict[str, Any]):
+    # Resolved on the pool thread, TableProxy picks that thread's connection
+    return getattr(proxy, name)(*args, **kwargs)
+
+
+class AsyncTable:
+    """Async facade of `TableProxy`: every public table method becomes a coroutine
+    function run on `executor`, i.e. `await table('users').select_one(...)`"""
+
+    def __init__(self, proxy: TableProxy, pool: DatabaseExecutor | None = None) -> None:
+        self._proxy = proxy
+        self._pool = pool or executor
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        async def method(*args: Any, **kwargs: Any):
+            return await self._pool.run(_call, self._proxy, name, args, kwargs)
+        method.__name__ = name
+        return method
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._proxy!r})"
+
+
+def table(table_name: str) -> AsyncTable:
+    """Return async table of the database"""
+    return AsyncTable(TableProxy(database, table_name))
+
+
+async def run(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Await a blocking call (i.e. a model method) on the database pool"""
+    return await executor.run(func, *args, **kwargs)
+
+
+def init_app(app: Flask):
+    """Configure database pool of async views. This function should be registered
+    in `bootstrap.register`
+
+    Config:
+        ASYNC_DATABASE_WORKERS: threads (and connections) serving async views,
+            defaults to 8
+    """
+    executor.configure(app.config.get("ASYNC_DATABASE_WORKERS", WORKERS))
@@ -1,50 +1,201 @@
 """Bootstrap"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import Iterable, NamedTuple
 from warnings import warn
 
 from flask import Flask
 try:
-    from app.utils import save_exc_groups
+    from app.utils import format_timings, save_exc_groups
     from typings import BootstrapFunction
 except ImportError:
-    from .utils import save_exc_groups
+    from .utils import format_timings, save_exc_groups
     from .typings import BootstrapFunction
 
 
-_PENDING_BOOTSTRAP: list[BootstrapFunction] = []
+class Step(NamedTuple):
+    """Registered bootstrap function"""
+    func: BootstrapFunction
+    depends: tuple[BootstrapFunction, ...]
+    parallel: bool
 
+
+class Timing(NamedTuple):
+    """Wall time of one bootstrap step"""
+    name: str
+    seconds: float
+    parallel: bool
+
+
+_PENDING_BOOTSTRAP: list[Step] = []
+# Timings of last `bootstrap` run
+TIMINGS: list[Timing] = []
+
+REPORT_FILE = "bootstrap-reports.txt"
 SETTINGS = {
     'keep': True,
-    'true_keep': False
+    'true_keep': False,
+    # Thread pool size for parallel steps
+    'workers': 4,
+    # Write report with timings even when nothing failed
+    'report_timings': False
 }
 
 
-def register(func: BootstrapFunction):
-    """Register a function to bootstrapping list"""
-    _PENDING_BOOTSTRAP.append(func)
+def register(func: BootstrapFunction, depends: Iterable[BootstrapFunction] = (),
+             parallel: bool = False):
+    """Register a function to bootstrapping list.
+
+    Args:
+        func (BootstrapFunction): Called with the app
+        depends (Iterable[BootstrapFunction], optional): Registered functions that
+            must finish before this one starts.
+        parallel (bool, optional): Safe to run on a worker thread alongside other
+            steps, it must not touch app state other steps modify. Other steps
+            run on the calling thread in registration order. Defaults to False.
+    """
+    _PENDING_BOOTSTRAP.append(Step(func, tuple(depends), parallel))
 
 
 def remove(func: BootstrapFunction):
     """Remove a function from bootstraping list"""
+    for index, step in enumerate(_PENDING_BOOTSTRAP):
+        if step.func == func:
+            del _PENDING_BOOTSTRAP[index]
+            return
+    raise ValueError("No such callable.")
+
+
+def clear():
+    """Remove every registered function, i.e. before registering them for another app"""
+    _PENDING_BOOTSTRAP.clear()
+
+
+def _name(func: BootstrapFunction) -> str:
+    owner = getattr(func, '__self__', None)
+    qualname = getattr(func, '__qualname__', repr(func))
+    if owner is not None and not isinstance(owner, type):
+        return f"{qualname} of {owner!r}"
+    return f"{getattr(func, '__module__', '?')}.{qualname}"
+
+
+def _check(steps: list[Step]):
+    """Reject unknown dependencies and cycles (serial steps also depend on the
+    serial step registered before them)"""
+    funcs = [step.func for step in steps]
+    edges: dict[int, set[int]] = {index: set() for index in range(len(steps))}
+    previous = None
+    for index, step in enumerate(steps):
+        for dependency in step.depends:
+            if dependency not in funcs:
+                raise ValueError(f"{_name(step.func)} depends on {_name(dependency)}, "
+                                 "which is not registered.")
+            edges[index].add(funcs.index(dependency))
+        if not step.parallel:
+            if previous is not None:
+                edges[index].add(previous)
+            previous = index
+    resolved: set[int] = set()
+    while len(resolved) < len(steps):
+        ready = {index for index, needs in edges.items()
+                 if index not in resolved and needs <= resolved}
+        if not ready:
+            names = ', '.join(_name(steps[index].func) for index in edges
+                              if index not in resolved)
+            raise ValueError(f"Bootstrap dependency cycle between: {names}")
+        resolved |= ready
+
+
+def _run(step: Step, app: Flask) -> tuple[float, Exception | None]:
+    start = perf_counter()
     try:
-        _PENDING_BOOTSTRAP.remove(func)
-    except ValueError:
-        raise ValueError("No such callable.") from None
+        if step.func is bootstrap:
+            raise ValueError(
+                "An illegal function has been passed to bootstrap list.")
+        step.func(app)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        return perf_counter() - start, exc
+    return perf_counter() - start, None
+
+
+class _Schedule:
+    """Bookkeeping of one bootstrap run"""
+
+    def __init__(self, steps: list[Step]) -> None:
+        self.serial = deque(step for step in steps if not step.parallel)
+        self.waiting = [step for step in steps if step.parallel]
+        self.running: dict[Future, Step] = {}
+        self.finished: set[BootstrapFunction] = set()
+        self.failed: set[BootstrapFunction] = set()
+        self.errors: list[BaseException] = []
+
+    def state(self, step: Step) -> bool | None:
+        """True when step can start, None when a dependency failed"""
+        if any(dependency in self.failed for dependency in step.depends):
+            return None
+        return all(dependency in self.finished for dependency in step.depends)
+
+    def record(self, step: Step, seconds: float, exc: BaseException | None):
+        """Store outcome of a step"""
+        TIMINGS.append(Timing(_name(step.func), seconds, step.parallel))
+        if exc is None:
+            self.finished.add(step.func)
+            return
+        self.failed.add(step.func)
+        if not SETTINGS.get('keep', False):
+            raise exc
+        self.errors.append(exc)
+
+    def skip(self, step: Step):
+        """Give up on a step whose dependency failed"""
+        self.failed.add(step.func)
+        self.errors.append(RuntimeError(
+            f"{_name(step.func)} skipped, a dependency failed to bootstrap."))
+
+
+def _execute(app: Flask, steps: list[Step]) -> list[BaseException]:
+    schedule = _Schedule(steps)
+    workers = max(1, SETTINGS.get('workers', 4))
+    with ThreadPoolExecutor(workers, thread_name_prefix="bootstrap") as pool:
+        while schedule.serial or schedule.waiting or schedule.running:
+            for step in list(schedule.waiting):
+                state = schedule.state(step)
+                if state is None:
+                    schedule.waiting.remove(step)
+                    schedule.skip(step)
+                elif state:
+                    schedule.waiting.remove(step)
+                    schedule.running[pool.submit(_run, step, app)] = step
+            if schedule.serial:
+                state = schedule.state(schedule.serial[0])
+                if state is None:
+                    schedule.skip(schedule.serial.popleft())
+                    continue
+                if state:
+                    step = schedule.serial.popleft()
+                    schedule.record(step, *_run(step, app))
+                    continue
+            if not schedule.running:
+                break
+            done, _ = wait(schedule.running, return_when=FIRST_COMPLETED)
+            for future in done:
+                schedule.record(schedule.running.pop(future), *future.result())
+    return schedule.errors
 
 
 def bootstrap(app: Flask):
-    """Initialize or run all bootstrap function."""
-    errors: list[BaseException] = []
-    for calls in _PENDING_BOOTSTRAP:
-        try:
-            if calls is bootstrap:
-                raise ValueError(
-                    "An illegal function has been passed to bootstrap list.")
-            calls(app)
-        except Exception as exc:
-            if SETTINGS.get('keep', False):
-                errors.append(exc)
-                continue
-            raise
+    """Initialize or run all bootstrap function.
+
+    Serial steps run on this thread in registration order, parallel ones on a
+    thread pool as soon as their dependencies finished. Each step is timed, see
+    `TIMINGS`; timings go to the report along with any errors."""
+    steps = list(_PENDING_BOOTSTRAP)
+    _check(steps)
+    TIMINGS.clear()
+    start = perf_counter()
+    errors = _execute(app, steps)
+    timings = format_timings(TIMINGS, perf_counter() - start)
 
     if errors:
         try:
@@ -52,5 +203,7 @@ def bootstrap(app: Flask):
         except ExceptionGroup as main_exc:
             if SETTINGS.get("true_keep", False):
                 raise
-            warn("Some errors have been occured. It is saved to bootstrap-reports.txt")
-            save_exc_groups("bootstrap-reports.txt", main_exc)
+            warn(f"Some errors have been occured. It is saved to {REPORT_FILE}")
+            save_exc_groups(REPORT_FILE, main_exc, timings)
+    elif SETTINGS.get('report_timings', False):
+        save_exc_groups(REPORT_FILE, None, timings)
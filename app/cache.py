@@ -0,0 +1,190 @@
+"""Cache"""
+from collections import OrderedDict
+from functools import wraps
+from os import stat
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable, Iterable
+
+_MISSING = object()
+_KWARGS_MARK = object()
+
+CACHES: 'dict[str, LRUCache]' = {}
+
+
+def _expired(expires: float, now: float) -> bool:
+    return bool(expires) and expires < now
+
+
+class LRUCache:  # pylint: disable=too-many-instance-attributes
+    """Bounded, thread-safe LRU cache with optional TTL and usage-count expiry.
+
+    Args:
+        maxsize (int): Maximum entries kept, least recently used is evicted first.
+        ttl (float | None): Seconds an entry stays valid. None means forever.
+        uses (int | None): Times an entry can be served before it expires. None means forever.
+        name (str | None): If set, the cache is registered in `CACHES` for `cache_stats()`.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float | None = None,
+                 uses: int | None = None, name: str | None = None) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        if uses is not None and uses <= 0:
+            raise ValueError("uses must be greater than 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.uses = uses
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> [value, expires_at, uses_left, stamp]
+        self._data: OrderedDict[Hashable, list[Any]] = OrderedDict()
+        self._lock = Lock()
+        if name:
+            CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None, stamp: Hashable = None) -> Any:
+        """Return cached value of key, or default if missing or expired.
+
+        Args:
+            key (Hashable): Cache key
+            default (Any, optional): Returned on miss. Defaults to None.
+            stamp (Hashable, optional): If given, entry is only valid when it was
+                stored with an equal stamp (e.g. file mtimes). Defaults to None.
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires, uses_left, stored_stamp = entry  # type: ignore
+            if _expired(expires, monotonic()) or stored_stamp != stamp:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if uses_left is not None:
+                if uses_left <= 1:
+                    del self._data[key]
+                    self.expirations += 1
+                else:
+                    entry[2] = uses_left - 1  # type: ignore
+                    self._data.move_to_end(key)
+            else:
+                self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, stamp: Hashable = None):
+        """Store value under key"""
+        expires = monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = [value, expires, self.uses, stamp]
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key: Hashable):
+        """Remove key from cache if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._data),
+                'maxsize': self.maxsize
+            }
+
+    def __len__(self) -> int:
+        """Entries not expired by TTL"""
+        now = monotonic()
+        with self._lock:
+            return sum(1 for entry in self._data.values() if not _expired(entry[1], now))
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether key has an entry not expired by TTL, doesn't count as a use"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and not _expired(entry[1], monotonic())  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(maxsize={self.maxsize}, ttl={self.ttl}, uses={self.uses})"
+
+
+def make_key(args: tuple[Any, ...], kwargs: dict[str, Any]) -> Hashable:
+    """Build a cache key from call arguments"""
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+
+
+def file_stamp(files: Iterable[str]) -> tuple[int, ...]:
+    """Return modification times of files, -1 for missing ones"""
+    stamps = []
+    for path in files:
+        try:
+            stamps.append(stat(path).st_mtime_ns)
+        except OSError:
+            stamps.append(-1)
+    return tuple(stamps)
+
+
+def cached(maxsize: int = 128,
+           ttl: float | None = None,
+           uses: int | None = None,
+           files: Iterable[str] = (),
+           name: str | None = None):
+    """Cache function results per arguments.
+
+    Args:
+        maxsize (int, optional): Maximum cached results. Defaults to 128.
+        ttl (float | None, optional): Seconds a result stays valid. Defaults to None.
+        uses (int | None, optional): Times a result is served before recomputing.
+            Defaults to None.
+        files (Iterable[str], optional): Files backing the result; a result is
+            recomputed when any of their mtimes changes. Defaults to ().
+        name (str | None, optional): Name in `cache_stats()`, defaults to function
+            qualified name.
+
+    The wrapped function exposes its cache as `.cache`."""
+    watched = tuple(files)
+
+    def decorator(func: Callable):
+        cache = LRUCache(maxsize, ttl, uses,
+                         name or f"{func.__module__}.{func.__qualname__}")
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any):
+            key = make_key(args, kwargs)
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            stamp = file_stamp(watched) if watched else None
+            value = cache.get(key, _MISSING, stamp)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                cache.set(key, value, stamp)
+            return value
+        wrapper.cache = cache  # type: ignore
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Return statistics of every named cache"""
+    return {name: cache.stats() for name, cache in sorted(CACHES.items())}
@@ -0,0 +1,189 @@
+"""Command line interface"""
+from csv import DictReader, DictWriter
+from itertools import islice
+from json import dumps, loads
+from time import perf_counter
+from typing import Any, Iterable, Iterator, TextIO
+
+import click
+from flask import Flask
+from flask.cli import AppGroup
+
+try:
+    from app.database_loader import database
+    from app.file_index import file_index
+    from app.flask_utils import is_invalid_username
+    from app.hashing import hasher
+    from app.model.user import UserModel
+    from app.write_behind import write_behind
+except ImportError:
+    from .database_loader import database
+    from .file_index import file_index
+    from .flask_utils import is_invalid_username
+    from .hashing import hasher
+    from .model.user import UserModel
+    from .write_behind import write_behind
+
+USER_COLUMNS = ('username', 'password', 'picture', 'groups')
+# Columns a row may leave out, with their defaults
+OPTIONAL_COLUMNS = {'picture': '', 'groups': ''}
+FORMATS = ('csv', 'ndjson')
+
+users_cli = AppGroup("users", help="Bulk user management")
+files_cli = AppGroup("files", help="File index management")
+
+
+def _guess_format(file: TextIO, given: str | None) -> str:
+    if given:
+        return given
+    name = getattr(file, 'name', '')
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(file: TextIO, fmt: str) -> Iterator[dict[str, Any]]:
+    """Stream user rows from csv/ndjson file"""
+    if fmt == 'csv':
+        yield from DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield loads(line)
+
+
+def batched(rows: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split iterable into lists of at most size items"""
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def row_error(row: dict[str, Any]) -> str | None:
+    """Why a user row can't be imported, None if it can"""
+    if not row.get('username'):
+        return "no username"
+    if is_invalid_username(row['username']):
+        return f"invalid username {row['username']!r}"
+    if not row.get('password'):
+        return f"no password for {row['username']!r}"
+    return None
+
+
+def insert_users(rows: list[dict[str, Any]], prehashed: bool = False) -> tuple[int, list[str]]:
+    """Insert a batch of users in one transaction, existing usernames are skipped.
+    Rows without username or password are rejected. Queued model writes are
+    flushed first, so a queued delete can't remove a new user.
+
+    Returns:
+        tuple[int, list[str]]: Rows inserted, and an error per rejected row
+    """
+    errors = []
+    valid = []
+    for row in rows:
+        error = row_error(row)
+        if error is None:
+            valid.append(row)
+        else:
+            errors.append(error)
+    if not valid:
+        return 0, errors
+    if not prehashed:
+        hashes = hasher.hash_many(row['password'] for row in valid)
+        for row, pwhash in zip(valid, hashes):
+            row['password'] = pwhash
+    values = [(row['username'], row['password'],
+               *(default if row.get(column) is None else row[column]
+                 for column, default in OPTIONAL_COLUMNS.items()))
+              for row in valid]
+    write_behind.flush()
+    conn = database.connection
+    before = conn.total_changes
+    with conn:
+        conn.executemany(
+            f"insert into users ({', '.join(USER_COLUMNS)}) "
+            f"values ({', '.join('?' * len(USER_COLUMNS))}) "
+            "on conflict (username) do nothing", values)
+    UserModel.changed(row['username'] for row in valid)
+    return conn.total_changes - before, errors
+
+
+@users_cli.command("import")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None,
+              help="Input format, guessed from file extension by default.")
+@click.option("--batch", "batch_size", default=5000, show_default=True,
+              help="Rows per transaction.")
+@click.option("--prehashed", is_flag=True, help="Passwords are already hashed.")
+@click.option("--workers", default=-1, show_default=True,
+              help="Hashing processes, -1 uses CPU count, 0 hashes inline.")
+def import_users(file: TextIO, fmt: str | None, batch_size: int, prehashed: bool, workers: int):
+    """Import users from csv/ndjson FILE ('-' for stdin)"""
+    fmt = _guess_format(file, fmt)
+    if workers and not prehashed:
+        hasher.start(None if workers < 0 else workers)
+    start = perf_counter()
+    total = inserted = rejected = 0
+    try:
+        for batch in batched(read_rows(file, fmt), batch_size):
+            total += len(batch)
+            added, errors = insert_users(batch, prehashed)
+            inserted += added
+            rejected += len(errors)
+            for error in errors:
+                click.echo(f"Rejected row: {error}", err=True)
+            elapsed = perf_counter() - start
+            click.echo(f"{total} rows read, {inserted} inserted, {rejected} rejected, "
+                       f"{total / elapsed:.0f} rows/s", err=True)
+    finally:
+        if workers and not prehashed:
+            hasher.shutdown()
+    elapsed = perf_counter() - start
+    click.echo(f"Imported {inserted}/{total} users in {elapsed:.2f}s "
+               f"({total / max(elapsed, 1e-9):.0f} rows/s), {rejected} rejected", err=True)
+    if rejected:
+        click.get_current_context().exit(1)
+
+
+@users_cli.command("export")
+@click.argument("file", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None,
+              help="Output format, guessed from file extension by default.")
+@click.option("--batch", "batch_size", default=5000, show_default=True,
+              help="Rows fetched at once.")
+def export_users(file: TextIO, fmt: str | None, batch_size: int):
+    """Export users to csv/ndjson FILE (stdout by default)"""
+    fmt = _guess_format(file, fmt)
+    start = perf_counter()
+    cursor = database.connection.execute(
+        f"select {', '.join(USER_COLUMNS)} from users order by rowid")
+    writer = DictWriter(file, USER_COLUMNS) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    total = 0
+    while rows := cursor.fetchmany(batch_size):
+        for row in rows:
+            row = dict(zip(USER_COLUMNS, row.values() if isinstance(row, dict) else row))
+            if writer:
+                writer.writerow(row)
+            else:
+                file.write(dumps(row) + "\n")
+        total += len(rows)
+    elapsed = perf_counter() - start
+    click.echo(f"Exported {total} users in {elapsed:.2f}s "
+               f"({total / max(elapsed, 1e-9):.0f} rows/s)", err=True)
+
+
+@files_cli.command("index")
+@click.option("--full", is_flag=True, help="List every directory, not only changed ones")
+def index_files(full: bool):
+    """Update file metadata index of FILES_ROOT"""
+    stats = file_index.scan(full)
+    click.echo(f"Visited {stats['visited']} directories, listed {stats['listed']} "
+               f"in {stats['seconds']:.2f}s")
+
+
+def register_cli(app: Flask):
+    """This function should be registered in `bootstrap.register`"""
+    app.cli.add_command(users_cli)
+    app.cli.add_command(files_cli)
@@ -1,7 +1,322 @@
 """Database Loader"""
+from atexit import register as atexit_register, unregister as atexit_unregister
+from functools import wraps
+from threading import RLock, Thread, current_thread, local
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+
+from flask import Flask
 from sqlite_database import Database
+from sqlite_database.table import Table
+
+DATABASE_PATH = "main.db"
+POOL_SIZE = 16
+
+# Applied to every new connection. journal_mode is persistent in the database file.
+PRAGMAS: dict[str, Any] = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'foreign_keys': 'on'
+}
+
+
+# Called as hook(name, seconds) after every statement issued through `execute` or a
+# `TableProxy` method, i.e. by `metrics.install`.
+QUERY_HOOKS: list[Callable[[str, float], None]] = []
+
+
+def _report(name: str, start: float):
+    elapsed = perf_counter() - start
+    for hook in QUERY_HOOKS:
+        hook(name, elapsed)
+
+
+def _timed(name: str, func: Callable) -> Callable:
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _report(name, start)
+    return wrapper
+
+
+def raw_connection(db: Database):
+    """Return underlying sqlite3 connection of a database"""
+    return db._database  # pylint: disable=protected-access
+
+
+class _Pooled(NamedTuple):
+    """A pooled connection and the tables looked up on it"""
+    database: Database
+    tables: dict[str, Table]
+
+
+def _close(db: Database):
+    db.close()
+    # The database library keeps every instance alive for its exit handler
+    atexit_unregister(db._finalizer)  # pylint: disable=protected-access
+
+
+class ConnectionManager:  # pylint: disable=too-many-instance-attributes
+    """Hand out pooled database connections, one per thread at a time.
+
+    SQLite connections are opened lazily and configured with `PRAGMAS`, nothing
+    touches the database file until one is first needed. A thread checks a
+    connection out on first use and keeps it until `release` (app context
+    teardown) puts it back for any thread to reuse. Connections of exited
+    threads are taken back when the next one is checked out. At most pool_size
+    idle connections are kept, the rest are closed.
+
+    Args:
+        path (str): Database file
+        pragmas (dict[str, Any] | None, optional): Defaults to PRAGMAS.
+        pool_size (int, optional): Idle connections kept. Defaults to POOL_SIZE.
+    """
+
+    def __init__(self, path: str, pragmas: dict[str, Any] | None = None,
+                 pool_size: int = POOL_SIZE) -> None:
+        self.path = path
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self.pool_size = pool_size
+        self._local = local()
+        self._lock = RLock()
+        self._idle: list[_Pooled] = []
+        # id(database) -> (thread it is checked out to, connection)
+        self._out: dict[int, tuple[Thread, _Pooled]] = {}
+        self._setup: list[Callable[[Any], None]] = []
+        self._prepared = False
+
+    def configure(self, path: str | None = None, pool_size: int | None = None, **pragmas: Any):
+        """Change database path, pool size and/or pragmas. Open connections are closed."""
+        self.close_all()
+        if path is not None:
+            self.path = path
+            self._prepared = False
+        if pool_size is not None:
+            self.pool_size = pool_size
+        self.pragmas.update(pragmas)
+
+    def on_first_connect(self, func: Callable[[Any], None]):
+        """Run func(sqlite3 connection) once, before the first connection to
+        configured database is handed out (i.e. schema migrations)"""
+        if func not in self._setup:
+            self._setup.append(func)
+            self._prepared = False
+
+    def _connect(self) -> Database:
+        db = Database(self.path)
+        conn = raw_connection(db)
+        for name, value in self.pragmas.items():
+            conn.execute(f"pragma {name}={value}")
+        if not self._prepared:
+            with self._lock:
+                if not self._prepared:
+                    for func in self._setup:
+                        func(conn)
+                    self._prepared = True
+        return db
+
+    def _checkin(self, pooled: _Pooled) -> bool:
+        """Put a connection back (lock held), False when it must be closed"""
+        if pooled.database.closed:
+            return True
+        conn = raw_connection(pooled.database)
+        if conn.in_transaction:
+            conn.rollback()
+        if len(self._idle) >= self.pool_size:
+            return False
+        self._idle.append(pooled)
+        return True
+
+    def _checkout(self) -> _Pooled:
+        pooled = None
+        surplus = []
+        with self._lock:
+            for key, (thread, held) in list(self._out.items()):
+                if not thread.is_alive():
+                    del self._out[key]
+                    if not self._checkin(held):
+                        surplus.append(held)
+            while self._idle and pooled is None:
+                pooled = self._idle.pop()
+                if pooled.database.closed:
+                    pooled = None
+        for held in surplus:
+            _close(held.database)
+        if pooled is None:
+            pooled = _Pooled(self._connect(), {})
+        with self._lock:
+            self._out[id(pooled.database)] = (current_thread(), pooled)
+        self._local.pooled = pooled
+        return pooled
+
+    def _pooled(self) -> _Pooled:
+        pooled = getattr(self._local, 'pooled', None)
+        if pooled is None or pooled.database.closed:
+            pooled = self._checkout()
+        return pooled
+
+    @property
+    def database(self) -> Database:
+        """Database of current thread, checked out on first use and replaced if it
+        was closed behind our back (i.e. by the database library at exit)"""
+        return self._pooled().database
+
+    @property
+    def connection(self):
+        """sqlite3 connection of current thread"""
+        return raw_connection(self._pooled().database)
+
+    def table(self, table_name: str) -> Table:
+        """Return table of current thread's database"""
+        pooled = self._pooled()
+        this_table = pooled.tables.get(table_name)
+        if this_table is None:
+            this_table = pooled.tables[table_name] = pooled.database.table(table_name)
+        return this_table
+
+    def execute(self, query: str, params: Any = (), commit: bool = False):
+        """Execute raw SQL on current thread's connection, committing if asked"""
+        conn = self.connection
+        if not QUERY_HOOKS:
+            return self._execute(conn, query, params, commit)
+        start = perf_counter()
+        try:
+            return self._execute(conn, query, params, commit)
+        finally:
+            _report("execute", start)
+
+    @staticmethod
+    def _execute(conn: Any, query: str, params: Any, commit: bool):
+        if not commit:
+            return conn.execute(query, params)
+        with conn:
+            return conn.execute(query, params)
+
+    @property
+    def opened(self) -> int:
+        """Connections open now, checked out or idle"""
+        with self._lock:
+            return len(self._out) + len(self._idle)
+
+    def _take(self) -> _Pooled | None:
+        pooled = getattr(self._local, 'pooled', None)
+        if pooled is None:
+            return None
+        self._local.pooled = None
+        with self._lock:
+            self._out.pop(id(pooled.database), None)
+        return pooled
+
+    def release(self, _exc: BaseException | None = None):
+        """Put current thread's connection back into the pool, uncommitted
+        changes are rolled back"""
+        pooled = self._take()
+        if pooled is None:
+            return
+        with self._lock:
+            kept = self._checkin(pooled)
+        if not kept:
+            _close(pooled.database)
+
+    def close(self, _exc: BaseException | None = None):
+        """Close current thread's connection, if any"""
+        pooled = self._take()
+        if pooled is not None:
+            _close(pooled.database)
+
+    def close_all(self):
+        """Close every connection opened by this manager"""
+        with self._lock:
+            opened = self._idle + [pooled for _, pooled in self._out.values()]
+            self._idle = []
+            self._out.clear()
+        for pooled in opened:
+            try:
+                _close(pooled.database)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # connection may only be closable from its own thread
+                pass
+        self._local = local()
+
+    def init_app(self, app: Flask):
+        """Configure from app config
+
+        Config:
+            DATABASE: database file
+            DATABASE_PRAGMAS: extra or overridden pragmas
+            DATABASE_POOL_SIZE: idle connections kept for reuse
+            DATABASE_CLOSE_ON_TEARDOWN: close a thread's connection when its app
+                context is torn down instead of returning it to the pool,
+                defaults to false
+        """
+        self.configure(app.config.get("DATABASE", self.path),
+                       app.config.get("DATABASE_POOL_SIZE", POOL_SIZE),
+                       **app.config.get("DATABASE_PRAGMAS", {}))
+        if app.config.get("DATABASE_CLOSE_ON_TEARDOWN", False):
+            app.teardown_appcontext(self.close)
+        else:
+            app.teardown_appcontext(self.release)
+
+    def __getattr__(self, name: str):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.database, name)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.path!r})"
+
+
+class TableProxy:
+    """Table bound to whichever thread uses it. Safe to keep at module level."""
+
+    def __init__(self, manager: ConnectionManager, table_name: str) -> None:
+        self._manager = manager
+        self._name = table_name
+        # method name -> timed method calling current thread's table, made once
+        self._timed: dict[str, Callable] = {}
+
+    @property
+    def name(self) -> str:
+        """Table name"""
+        return self._name
+
+    @property
+    def table(self) -> Table:
+        """Table of current thread"""
+        return self._manager.table(self._name)
+
+    def __getattr__(self, name: str):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        hooked = QUERY_HOOKS and not name.startswith('_')
+        if hooked and name in self._timed:
+            return self._timed[name]
+        attr = getattr(self._manager.table(self._name), name)
+        if hooked and callable(attr):
+            timed = self._timed[name] = _timed(f"{self._name}.{name}", self._method(name))
+            return timed
+        return attr
+
+    def _method(self, name: str) -> Callable:
+        def method(*args: Any, **kwargs: Any):
+            return getattr(self._manager.table(self._name), name)(*args, **kwargs)
+        return method
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._name!r})"
+
+
+database = ConnectionManager(DATABASE_PATH)
+atexit_register(database.close_all)
+
 
-database = Database("main.db")
+def init_app(app: Flask):
+    """Configure database connections for app"""
+    database.init_app(app)
 
 
 def table_namespace(table_name: str):
@@ -9,6 +324,6 @@ def table_namespace(table_name: str):
     return database.table(table_name).get_namespace()  # type: ignore
 
 
-def table(table_name: str):
+def table(table_name: str) -> Table:
     """Return table of a database"""
-    return database.table(table_name)
+    return TableProxy(database, table_name)  # type: ignore
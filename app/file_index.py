@@ -0,0 +1,309 @@
+"""Filesystem metadata index"""
+from atexit import register as atexit_register
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from contextlib import suppress
+from json import dumps, loads
+from os import scandir, stat
+from os.path import join, realpath
+from threading import Condition, Lock, Thread
+from time import monotonic, perf_counter
+from typing import Any, NamedTuple
+from warnings import warn
+
+from flask import Flask
+
+try:
+    from app.database_loader import ConnectionManager, database
+    from app.files import Entry
+except ImportError:
+    from .database_loader import ConnectionManager, database
+    from .files import Entry
+
+SORTS = ('name', 'size', 'mtime')
+SCAN_INTERVAL = 60.0
+
+
+class Page(NamedTuple):
+    """One page of entries, cursor fetches the next one (None on the last page)"""
+    entries: list[Entry]
+    cursor: str | None
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """Opaque, URL-safe page cursor"""
+    return urlsafe_b64encode(dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Values of a cursor made by `encode_cursor`, ValueError if it is not one"""
+    try:
+        values = loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (Base64Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor {cursor!r}") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return values
+
+
+def _child(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+def _escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _read_dir(path: str, parent: str) -> list[tuple[Any, ...]]:
+    rows = []
+    with scandir(path) as iterator:
+        for entry in iterator:
+            try:
+                is_link = entry.is_symlink()
+                is_dir = entry.is_dir()
+                info = entry.stat(follow_symlinks=False) if is_dir else entry.stat()
+            except OSError:
+                continue
+            rows.append((parent, entry.name, int(is_dir), int(is_link),
+                         0 if is_dir else info.st_size, int(info.st_mtime)))
+    return rows
+
+
+def _listing_page(rows: list[tuple[Any, ...]], limit: int, keys: tuple[str, ...]) -> Page:
+    """Page of (name, is_dir, size, mtime) rows, one more than limit if there are more"""
+    entries = [Entry(name, bool(is_dir), size, mtime) for name, is_dir, size, mtime in rows]
+    if len(entries) <= limit:
+        return Page(entries, None)
+    name, is_dir, size, mtime = rows[limit - 1]
+    values = {'name': name, 'size': size, 'mtime': mtime}
+    return Page(entries[:limit], encode_cursor([is_dir, *(values[key] for key in keys)]))
+
+
+class FileIndex:  # pylint: disable=too-many-instance-attributes
+    """SQLite index of file metadata (name, size, mtime, type) under a root directory.
+
+    A directory is listed again only when its mtime changed since it was indexed,
+    unchanged ones are descended through from the index alone. A directory's mtime
+    changes when entries are added, removed or renamed but not when a file is
+    rewritten in place, `scan(full=True)` picks those up.
+
+    Requests never walk the filesystem: a background thread rescans periodically
+    and re-lists browsed directories (see `queue`), `flask files index` scans on
+    demand.
+    """
+
+    def __init__(self, manager: ConnectionManager, root: str = "") -> None:
+        self.manager = manager
+        self.root = root
+        self.interval = SCAN_INTERVAL
+        self._scan_lock = Lock()
+        self._start_lock = Lock()
+        self._changed = Condition()
+        self._stopping = False
+        # Directories to refresh on the background thread
+        self._wanted: set[str] = set()
+        self._thread: Thread | None = None
+
+    def configure(self, root: str | None = None, interval: float | None = None):
+        """Change indexed root and background scan interval (0 disables it)"""
+        if root is not None:
+            self.root = root
+        if interval is not None:
+            self.interval = interval
+
+    def _query(self, sql: str, params: Any = ()) -> list[tuple[Any, ...]]:
+        cursor = self.manager.connection.cursor()
+        cursor.row_factory = None
+        return cursor.execute(sql, params).fetchall()
+
+    def _index_dir(self, parent: str, mtime_ns: int) -> list[str]:
+        """Replace index rows of one directory, returns subdirectories to descend to"""
+        rows = _read_dir(join(self.root, parent), parent)
+        subdirs = [row[1] for row in rows if row[2] and not row[3]]
+        removed = {row[0] for row in self._query(
+            "select name from files where parent = ? and is_dir = 1", (parent,))}
+        removed.difference_update(subdirs)
+        conn = self.manager.connection
+        with conn:
+            for name in removed:
+                path = _child(parent, name)
+                pattern = _escape_like(path) + "/%"
+                conn.execute("delete from files where parent = ? or parent like ? escape '\\'",
+                             (path, pattern))
+                conn.execute("delete from file_dirs where path = ? or path like ? escape '\\'",
+                             (path, pattern))
+            conn.execute("delete from files where parent = ?", (parent,))
+            conn.executemany("insert into files (parent, name, is_dir, is_link, size, mtime) "
+                             "values (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("insert into file_dirs (path, mtime_ns) values (?, ?) "
+                         "on conflict (path) do update set mtime_ns = excluded.mtime_ns",
+                         (parent, mtime_ns))
+        return subdirs
+
+    def scan(self, full: bool = False) -> dict[str, float]:
+        """Walk the root, re-listing changed directories (every one when full).
+
+        Returns:
+            dict[str, float]: directories visited and listed, seconds taken
+        """
+        with self._scan_lock:
+            start = perf_counter()
+            known = dict(self._query("select path, mtime_ns from file_dirs"))
+            stack = ['']
+            visited = listed = 0
+            while stack:
+                parent = stack.pop()
+                visited += 1
+                try:
+                    # stat before listing, so changes made meanwhile trigger another pass
+                    mtime_ns = stat(join(self.root, parent)).st_mtime_ns
+                    if not full and known.get(parent) == mtime_ns:
+                        subdirs = [row[0] for row in self._query(
+                            "select name from files "
+                            "where parent = ? and is_dir = 1 and is_link = 0", (parent,))]
+                    else:
+                        subdirs = self._index_dir(parent, mtime_ns)
+                        listed += 1
+                except OSError:
+                    continue
+                stack.extend(_child(parent, name) for name in subdirs)
+            return {'visited': visited, 'listed': listed, 'seconds': perf_counter() - start}
+
+    def refresh(self, parent: str):
+        """Re-list one directory if it changed since it was indexed"""
+        mtime_ns = stat(join(self.root, parent)).st_mtime_ns
+        known = self._query("select mtime_ns from file_dirs where path = ?", (parent,))
+        if not known or known[0][0] != mtime_ns:
+            self._index_dir(parent, mtime_ns)
+
+    def queue(self, parent: str):
+        """Have the background thread re-list one directory if it changed, without
+        waiting for it"""
+        self.start()
+        with self._changed:
+            self._wanted.add(parent)
+            self._changed.notify()
+
+    def listing(self, parent: str, sort: str = 'name', descending: bool = False,
+                cursor: str | None = None, limit: int = 200) -> Page:
+        """Page of a directory (relative to root, '' is root), directories first.
+        Descending order reverses the whole listing. Pages continue after the
+        cursor of the previous one; raises ValueError for a malformed cursor.
+
+        The directory is queued for a refresh, changes show on a later request."""
+        self.queue(parent)
+        column = sort if sort in SORTS else 'name'
+        keys = ('name',) if column == 'name' else (column, 'name')
+        direction, compare = ('desc', '<') if descending else ('asc', '>')
+        # Directories first (last when descending), one index range each
+        kinds = [0, 1] if descending else [1, 0]
+        after: list[Any] = []
+        if cursor:
+            is_dir, *after = decode_cursor(cursor, len(keys) + 1)
+            if is_dir not in kinds:
+                raise ValueError(f"Invalid cursor {cursor!r}")
+            kinds = kinds[kinds.index(is_dir):]
+        rows: list[tuple[Any, ...]] = []
+        for is_dir in kinds:
+            where = "parent = ? and is_dir = ?"
+            if after:
+                where += f" and ({', '.join(keys)}) {compare} ({', '.join('?' * len(keys))})"
+            rows += self._query(
+                f"select name, is_dir, size, mtime from files where {where} "
+                f"order by {', '.join(f'{key} {direction}' for key in keys)} limit ?",
+                (parent, is_dir, *after, limit + 1 - len(rows)))
+            after = []
+            if len(rows) > limit:
+                break
+        return _listing_page(rows, limit, keys)
+
+    def search(self, query: str, prefix: bool = False, cursor: str | None = None,
+               limit: int = 200) -> Page:
+        """Page of entries anywhere under root whose name starts with (case-sensitive,
+        uses the name index) or contains (case-insensitive) query. Entry names are
+        paths relative to root. Pages continue after the cursor of the previous
+        one; raises ValueError for a malformed cursor."""
+        self.start()
+        if prefix:
+            where, params = "name >= ? and name < ?", (query, query + '\U0010ffff')
+        else:
+            where, params = "name like ? escape '\\'", (f"%{_escape_like(query)}%",)
+        if cursor:
+            where += " and (name, parent) > (?, ?)"
+            params += tuple(decode_cursor(cursor, 2))
+        rows = self._query(
+            f"select parent, name, is_dir, size, mtime from files where {where} "
+            "order by name, parent limit ?", (*params, limit + 1))
+        entries = [Entry(_child(parent, name), bool(is_dir), size, mtime)
+                   for parent, name, is_dir, size, mtime in rows]
+        if len(entries) <= limit:
+            return Page(entries, None)
+        parent, name = rows[limit - 1][:2]
+        return Page(entries[:limit], encode_cursor([name, parent]))
+
+    def _next_task(self, next_scan: float) -> set[str] | None:
+        """Wait for queued directories or the next periodic scan, None when stopping"""
+        with self._changed:
+            while not self._stopping and not self._wanted \
+                    and (self.interval <= 0 or monotonic() < next_scan):
+                self._changed.wait(next_scan - monotonic() if self.interval > 0 else None)
+            if self._stopping:
+                return None
+            wanted, self._wanted = self._wanted, set()
+            return wanted
+
+    def _run(self):
+        next_scan = monotonic()
+        try:
+            while (wanted := self._next_task(next_scan)) is not None:
+                try:
+                    for parent in wanted:
+                        with suppress(FileNotFoundError, NotADirectoryError):
+                            self.refresh(parent)
+                    if self.interval > 0 and monotonic() >= next_scan:
+                        next_scan = monotonic() + self.interval
+                        self.scan()
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    warn(f"File index scan failed: {exc!r}")
+        finally:
+            self.manager.close()
+
+    def start(self):
+        """Start the background thread in this process, if not running. Called on
+        first use rather than at startup, so forked workers each get their own
+        thread and startup stays free of database work."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = Thread(target=self._run, name="file-index", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, dropping queued directories"""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            with self._changed:
+                self._stopping = True
+                self._wanted.clear()
+                self._changed.notify()
+            thread.join()
+
+
+file_index = FileIndex(database)
+atexit_register(file_index.stop)
+
+
+def init_app(app: Flask):
+    """Configure file index for `FILES_ROOT`. This function should be registered in
+    `bootstrap.register` after `files.init_app`
+
+    Config:
+        FILES_INDEX_INTERVAL: seconds between background rescans, defaults to 60.
+            0 disables periodic rescans, directories are then indexed when browsed
+            or by `flask files index`, and search covers those.
+    """
+    file_index.stop()
+    file_index.configure(realpath(app.config["FILES_ROOT"]),
+                         app.config.get("FILES_INDEX_INTERVAL", SCAN_INTERVAL))
@@ -0,0 +1,156 @@
+"""File serving"""
+from datetime import datetime, timezone
+from mimetypes import guess_type
+from os import fstat, makedirs
+from os.path import commonpath, join, realpath, relpath
+from typing import BinaryIO, Iterator, NamedTuple
+from urllib.parse import quote
+
+from flask import Flask, Response, abort, current_app, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import parse_if_range_header, parse_range_header
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+# Read size when the server has no `wsgi.file_wrapper` and the file is streamed
+CHUNK_SIZE = 1 << 20
+
+
+class Entry(NamedTuple):
+    """Directory listing entry"""
+    name: str
+    is_dir: bool
+    size: int
+    modified: float
+
+
+def files_root() -> str:
+    """Configured root directory, symlinks resolved"""
+    return realpath(current_app.config["FILES_ROOT"])
+
+
+def resolve(filepath: str, root: str | None = None) -> str:
+    """Resolve filepath under root, aborting with 404 when it escapes root (through
+    `..`, an absolute path or a symlink) or does not exist"""
+    root = root or files_root()
+    joined = safe_join(root, filepath)
+    if joined is None:
+        return abort(404)
+    try:
+        path = realpath(joined, strict=True)
+    except (OSError, ValueError):
+        return abort(404)
+    if commonpath((root, path)) != root:
+        return abort(404)
+    return path
+
+
+def timestamp(value: float) -> str:
+    """Format a modification time, used as template filter"""
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M")
+
+
+def _offload(path: str, root: str, mimetype: str) -> Response | None:
+    config = current_app.config
+    accel = config.get("FILES_ACCEL_REDIRECT")
+    if accel:
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = \
+            f"{accel.rstrip('/')}/{quote(relpath(path, root))}"
+        return response
+    if config.get("USE_X_SENDFILE"):
+        response = Response(mimetype=mimetype)
+        response.headers['X-Sendfile'] = path
+        return response
+    return None
+
+
+def _single_range(etag: str, modified: datetime, size: int) -> tuple[int, int] | None:
+    """(start, stop) of the one satisfiable byte range requested, None when the
+    whole file is to be sent or werkzeug has to answer (several or invalid ranges)"""
+    if request.method not in ('GET', 'HEAD') or not size or 'Range' not in request.headers:
+        return None
+    if_range = parse_if_range_header(request.headers.get('If-Range'))
+    if (if_range.etag is not None and if_range.etag != etag) \
+            or (if_range.date is not None and if_range.date != modified):
+        return None
+    parsed = parse_range_header(request.headers['Range'])
+    if parsed is None or len(parsed.ranges) != 1:
+        return None
+    return parsed.range_for_length(size)
+
+
+def _read_range(file: BinaryIO, length: int, chunk_size: int) -> Iterator[bytes]:
+    try:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def send_path(path: str, root: str | None = None) -> Response:
+    """Send a file with Range and conditional request support.
+
+    The body is handed to the front proxy (`FILES_ACCEL_REDIRECT`/`USE_X_SENDFILE`)
+    when configured, otherwise to the server's `wsgi.file_wrapper`, which gunicorn
+    and uwsgi implement with sendfile. Single ranges go the same way: the file is
+    positioned at the range start and the server sends Content-Length bytes from
+    there. Without either it is streamed in FILES_CHUNK_SIZE pieces, so the file
+    is never read into memory as a whole.
+    """
+    root = root or files_root()
+    mimetype = guess_type(path)[0] or 'application/octet-stream'
+    offloaded = _offload(path, root, mimetype)
+    if offloaded is not None:
+        return offloaded
+    file = open(path, 'rb')  # pylint: disable=consider-using-with
+    try:
+        stat = fstat(file.fileno())
+        size = stat.st_size
+        etag = f"{stat.st_mtime_ns:x}-{size:x}"
+        modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+        chunk_size = current_app.config.get("FILES_CHUNK_SIZE", CHUNK_SIZE)
+        byte_range = _single_range(etag, modified, size)
+        if byte_range is None:
+            body = wrap_file(request.environ, file, chunk_size)
+        else:
+            file.seek(byte_range[0])
+            length = byte_range[1] - byte_range[0]
+            body = wrap_file(request.environ, file, chunk_size) \
+                if 'wsgi.file_wrapper' in request.environ \
+                else _read_range(file, length, chunk_size)
+        response = Response(body, mimetype=mimetype, direct_passthrough=True)
+    except BaseException:
+        file.close()
+        raise
+    response.last_modified = modified
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    if byte_range is None:
+        response.content_length = size
+        return response.make_conditional(request, accept_ranges=True, complete_length=size)
+    response.status_code = 206
+    response.content_length = byte_range[1] - byte_range[0]
+    response.content_range = ContentRange('bytes', *byte_range, size)  # type: ignore
+    response.accept_ranges = 'bytes'
+    return response.make_conditional(request)
+
+
+def init_app(app: Flask):
+    """Configure file serving. This function should be registered in `bootstrap.register`
+
+    Config:
+        FILES_ROOT: served directory, defaults to `<instance path>/files`
+        FILES_CHUNK_SIZE: read size when streaming without sendfile
+        FILES_ACCEL_REDIRECT: internal nginx location mapped to FILES_ROOT, sends
+            `X-Accel-Redirect` and lets nginx serve the file
+        USE_X_SENDFILE: Flask's own setting, sends `X-Sendfile` (Apache, lighttpd)
+    """
+    root = app.config.setdefault("FILES_ROOT", join(app.instance_path, "files"))
+    makedirs(root, exist_ok=True)
+    app.add_template_filter(timestamp)
@@ -6,13 +6,13 @@ from string import punctuation
 from types import SimpleNamespace
 from typing import Any
 
-from flask import Response, abort
+from flask import Response, abort, current_app
 from flask_login import current_user
 
 try:
-    from app.utils import has_common_item
+    from app.utils import NO_ROLES
 except ImportError:
-    from .utils import has_common_item
+    from .utils import NO_ROLES
 
 _USERNAMEPASS_STR = punctuation.replace("_", "").replace('.', "")
 _USERNAME = re_compile(f"[{re_escape(_USERNAMEPASS_STR)}]+")
@@ -42,21 +42,20 @@ def get_moderator() -> str:
 def role_required(*roles: str, code=403):
     """Add role filter to view/function.
 
-    Put role names, and they should be done.
+    Put role names, and they should be done. Works on async views too.
     """
+    required = frozenset(roles)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Response | str:
             if current_user is None:
                 return abort(code)
+            user_roles: frozenset[str] = getattr(current_user, 'roles', NO_ROLES)
             # if user is admin, we should always return func()
-            user_roles: list[str] = current_user.groups.split(  # type: ignore
-                ',')  # type: ignore
-            if get_admin() in user_roles:
-                return func(*args, **kwargs)
-            if not has_common_item(roles, user_roles):
+            if get_admin() not in user_roles and required.isdisjoint(user_roles):
                 return abort(code)
-            return func(*args, **kwargs)
+            return current_app.ensure_sync(func)(*args, **kwargs)
         return wrapper
     return decorator
 
@@ -0,0 +1,204 @@
+"""Password hashing"""
+from atexit import register as atexit_register
+from concurrent.futures import Executor
+from json import JSONDecodeError, dump, load
+from math import log2
+from os import cpu_count, makedirs, replace
+from os.path import dirname, join
+from statistics import median
+from time import perf_counter
+from typing import Iterable
+
+from flask import Flask
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Cost floors, calibration never goes below these (werkzeug defaults).
+MIN_COST = {
+    'scrypt': 2 ** 15,
+    'pbkdf2': 600_000
+}
+MAX_SCRYPT_COST = 2 ** 17
+# Timed hashes per calibration, the median counts
+CALIBRATION_SAMPLES = 5
+# Stored hashes with at least this fraction of current cost are not rehashed
+REHASH_TOLERANCE = 0.75
+
+
+def _method_of(algorithm: str, cost: int) -> str:
+    if algorithm == 'scrypt':
+        return f"scrypt:{cost}:8:1"
+    if algorithm == 'pbkdf2':
+        return f"pbkdf2:sha256:{cost}"
+    raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+
+def _parse_method(method: str) -> tuple[str, int, tuple[str, ...]] | None:
+    """"scrypt:32768:8:1" -> ('scrypt', 32768, ('8', '1')),
+    "pbkdf2:sha256:600000" -> ('pbkdf2', 600000, ('sha256',)), None if unknown"""
+    parts = method.split(':')
+    try:
+        if parts[0] == 'scrypt' and len(parts) == 4:
+            return 'scrypt', int(parts[1]), tuple(parts[2:])
+        if parts[0] == 'pbkdf2' and len(parts) == 3:
+            return 'pbkdf2', int(parts[2]), (parts[1],)
+    except ValueError:
+        pass
+    return None
+
+
+class PasswordHasher:
+    """Hash and verify passwords, optionally on a process pool.
+
+    Args:
+        algorithm (str, optional): 'scrypt' or 'pbkdf2'. Defaults to 'scrypt'.
+        cost (int | None, optional): scrypt N or pbkdf2 iterations. Defaults to MIN_COST.
+    """
+
+    def __init__(self, algorithm: str = 'scrypt', cost: int | None = None) -> None:
+        self.algorithm = algorithm
+        self.cost = cost or MIN_COST[algorithm]
+        self.method = _method_of(algorithm, self.cost)
+        self._executor: Executor | None = None
+
+    def configure(self, algorithm: str | None = None, cost: int | None = None):
+        """Change hashing parameters"""
+        if algorithm is not None and algorithm != self.algorithm:
+            self.algorithm = algorithm
+            self.cost = MIN_COST[algorithm]
+        if cost is not None:
+            self.cost = cost
+        self.method = _method_of(self.algorithm, self.cost)
+
+    def start(self, workers: int | None = None):
+        """Start a process pool, sized to CPU count by default"""
+        # multiprocessing is slow to import, only pay for it when pooling
+        from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+        self.shutdown()
+        self._executor = ProcessPoolExecutor(workers or cpu_count() or 1)
+
+    def shutdown(self):
+        """Stop process pool, hashing goes back to calling thread"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def hash(self, password: str) -> str:
+        """Hash a password with current parameters"""
+        if self._executor is None:
+            return generate_password_hash(password, self.method)
+        return self._executor.submit(generate_password_hash, password, self.method).result()
+
+    def hash_many(self, passwords: Iterable[str]) -> list[str]:
+        """Hash many passwords, in parallel when a pool is running"""
+        if self._executor is None:
+            return [generate_password_hash(password, self.method) for password in passwords]
+        passwords = list(passwords)
+        return list(self._executor.map(generate_password_hash, passwords,
+                                       [self.method] * len(passwords),
+                                       chunksize=max(1, len(passwords) // 64)))
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Check password against a stored hash"""
+        if self._executor is None:
+            return check_password_hash(pwhash, password)
+        return self._executor.submit(check_password_hash, pwhash, password).result()
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """Is stored hash made with another algorithm, or a cost well below
+        current one? Higher costs and small differences are fine."""
+        stored = _parse_method(pwhash.split('$', 1)[0])
+        current = _parse_method(self.method)
+        if stored is None or current is None:
+            return True
+        algorithm, cost, params = stored
+        return (algorithm, params) != (current[0], current[2]) \
+            or cost < current[1] * REHASH_TOLERANCE
+
+    def calibrate(self, target_ms: float, floor: int | None = None) -> int:
+        """Pick cost so that one hash takes about target_ms on this machine.
+
+        Args:
+            target_ms (float): Target hashing latency in milliseconds.
+            floor (int | None, optional): Minimum cost. Defaults to MIN_COST.
+
+        Returns:
+            int: Chosen cost, also applied to this hasher.
+        """
+        floor = floor or MIN_COST[self.algorithm]
+        sample = MIN_COST[self.algorithm]
+        method = _method_of(self.algorithm, sample)
+        timings = []
+        for _ in range(CALIBRATION_SAMPLES):
+            start = perf_counter()
+            generate_password_hash("calibration", method)
+            timings.append((perf_counter() - start) * 1000)
+        scaled = sample * target_ms / max(median(timings), 0.001)
+        if self.algorithm == 'scrypt':
+            cost = min(MAX_SCRYPT_COST, 2 ** max(0, round(log2(scaled))))
+        else:
+            cost = int(round(scaled, -3))
+        self.configure(cost=max(floor, cost))
+        return self.cost
+
+    def calibrate_stored(self, target_ms: float, path: str) -> int:
+        """Like `calibrate`, but only once per algorithm and target: the chosen
+        cost is stored in a JSON file and read back by later starts, so every
+        process and restart hashes with the same parameters.
+
+        Args:
+            target_ms (float): Target hashing latency in milliseconds.
+            path (str): File keeping calibrated costs.
+
+        Returns:
+            int: Chosen cost, also applied to this hasher.
+        """
+        key = f"{self.algorithm}:{target_ms:g}"
+        try:
+            with open(path, encoding="utf-8") as file:
+                stored = load(file)
+        except (OSError, JSONDecodeError):
+            stored = {}
+        if isinstance(stored.get(key), int):
+            self.configure(cost=max(MIN_COST[self.algorithm], stored[key]))
+            return self.cost
+        stored[key] = self.calibrate(target_ms)
+        makedirs(dirname(path) or '.', exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            dump(stored, file)
+        replace(f"{path}.tmp", path)
+        return self.cost
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.method!r}, pooled={self._executor is not None})"
+
+
+hasher = PasswordHasher()
+atexit_register(hasher.shutdown)
+
+
+def init_app(app: Flask):
+    """Configure password hashing from config, should be registered in `bootstrap.register`
+
+    Config:
+        PASSWORD_HASH_ALGORITHM: 'scrypt' or 'pbkdf2'
+        PASSWORD_HASH_COST: fixed cost, skips calibration
+        PASSWORD_HASH_TARGET_MS: calibrate cost to this latency on first start
+        PASSWORD_HASH_CALIBRATION_FILE: calibrated costs are kept here, defaults
+            to `<instance path>/password-hash.json`. Empty string calibrates on
+            every start.
+        PASSWORD_HASH_WORKERS: process pool size, 0 hashes in request thread,
+            -1 uses CPU count
+    """
+    hasher.configure(app.config.get("PASSWORD_HASH_ALGORITHM"),
+                     app.config.get("PASSWORD_HASH_COST"))
+    target = app.config.get("PASSWORD_HASH_TARGET_MS")
+    if target and not app.config.get("PASSWORD_HASH_COST"):
+        path = app.config.get("PASSWORD_HASH_CALIBRATION_FILE",
+                              join(app.instance_path, "password-hash.json"))
+        if path:
+            hasher.calibrate_stored(target, path)
+        else:
+            hasher.calibrate(target)
+    workers = app.config.get("PASSWORD_HASH_WORKERS", 0)
+    if workers:
+        hasher.start(None if workers < 0 else workers)
@@ -0,0 +1,113 @@
+"""Fast JSON provider and streaming JSON responses"""
+from json import dumps as std_dumps
+from json import loads as std_loads
+from typing import Any, Iterable, Iterator
+
+from flask import Flask, Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+# Streamed responses are flushed in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+# datetime/dataclass go through `default`, so output matches Flask's own provider
+_OPTIONS = 0 if orjson is None else (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                                     | orjson.OPT_PASSTHROUGH_DATACLASS)
+_default = DefaultJSONProvider.default
+
+
+def encode(obj: Any, sort_keys: bool = False, indent: bool = False) -> bytes:
+    """Serialize obj to compact UTF-8 JSON, with orjson when it's installed and can
+    handle obj (i.e. integers over 64 bits are not), stdlib json otherwise"""
+    if orjson is not None:
+        options = _OPTIONS
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_default, option=options)
+        except TypeError:
+            pass
+    return std_dumps(obj, default=_default, ensure_ascii=False, sort_keys=sort_keys,
+                     indent=2 if indent else None,
+                     separators=None if indent else (',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider using orjson when installed. Non-ASCII text is written as
+    UTF-8 instead of being escaped, otherwise output matches `DefaultJSONProvider`."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return encode(obj, self.sort_keys).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return std_loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(encode(obj, self.sort_keys, indent) + b"\n",
+                                        mimetype=self.mimetype)
+
+
+def _chunked(parts: Iterable[bytes]) -> Iterator[bytes]:
+    buffer: list[bytes] = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _ndjson_lines(rows: Iterable[Any]) -> Iterator[bytes]:
+    for row in rows:
+        yield encode(row) + b"\n"
+
+
+def _array_parts(rows: Iterable[Any], key: str | None,
+                 fields: dict[str, Any] | None) -> Iterator[bytes]:
+    if key is None:
+        yield b"["
+    else:
+        head = encode(fields or {})[:-1]
+        yield head + (b"," if len(head) > 1 else b"") + encode(key) + b":["
+    first = True
+    for row in rows:
+        yield encode(row) if first else b"," + encode(row)
+        first = False
+    yield b"]" if key is None else b"]}"
+
+
+def ndjson_response(rows: Iterable[Any], status: int = 200) -> Response:
+    """Stream rows as newline delimited JSON, nothing is buffered beyond one chunk"""
+    return current_app.response_class(stream_with_context(_chunked(_ndjson_lines(rows))),
+                                      status, mimetype="application/x-ndjson")
+
+
+def json_array_response(rows: Iterable[Any], key: str | None = None,
+                        fields: dict[str, Any] | None = None,
+                        status: int = 200) -> Response:
+    """Stream rows as a JSON array. With key the array is put in an object, after
+    fields: `{"status": "success", key: [rows...]}`"""
+    return current_app.response_class(
+        stream_with_context(_chunked(_array_parts(rows, key, fields))), status,
+        mimetype="application/json")
+
+
+def init_app(app: Flask):
+    """Use `FastJSONProvider` for `jsonify`/`app.json`. This function should be
+    registered in `bootstrap.register`"""
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,167 @@
+"""Request metrics"""
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from flask import Flask, g, has_app_context, request
+
+try:
+    from app.database_loader import QUERY_HOOKS
+except ImportError:
+    from .database_loader import QUERY_HOOKS
+
+# Upper bounds in seconds, last bucket catches everything above.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+PREFIX = "rimustuff"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value: float):
+        """Record a value"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, percent: float) -> float:
+        """Estimate a percentile, interpolating linearly inside the bucket"""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                upper = min(upper, self.maximum)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.maximum
+
+
+class EndpointStats:  # pylint: disable=too-few-public-methods
+    """Latency and SQL usage of one endpoint"""
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.max_sql_statements = 0
+
+    def as_dict(self) -> dict[str, float]:
+        """Summary for admin page"""
+        latency = self.latency
+        count = latency.count or 1
+        return {
+            'requests': latency.count,
+            'p50_ms': latency.percentile(50) * 1000,
+            'p95_ms': latency.percentile(95) * 1000,
+            'p99_ms': latency.percentile(99) * 1000,
+            'max_ms': latency.maximum * 1000,
+            'sql_per_request': self.sql_statements / count,
+            'max_sql_per_request': self.max_sql_statements,
+            'sql_ms_per_request': self.sql_seconds / count * 1000
+        }
+
+
+class Metrics:
+    """Per-endpoint request metrics"""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, EndpointStats] = {}
+        self._lock = Lock()
+
+    def record(self, endpoint: str, seconds: float, sql_statements: int, sql_seconds: float):
+        """Record one finished request"""
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.latency.observe(seconds)
+            stats.sql_statements += sql_statements
+            stats.sql_seconds += sql_seconds
+            stats.max_sql_statements = max(stats.max_sql_statements, sql_statements)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Per-endpoint summary"""
+        with self._lock:
+            return {endpoint: stats.as_dict()
+                    for endpoint, stats in sorted(self.endpoints.items())}
+
+    def reset(self):
+        """Forget everything recorded"""
+        with self._lock:
+            self.endpoints.clear()
+
+    def prometheus(self) -> str:
+        """Render metrics in Prometheus text exposition format"""
+        lines = [
+            f"# HELP {PREFIX}_request_duration_seconds Request latency per endpoint.",
+            f"# TYPE {PREFIX}_request_duration_seconds histogram"
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for endpoint, stats in endpoints:
+                label = f'endpoint="{endpoint}"'
+                cumulative = 0
+                for upper, count in zip(stats.latency.buckets, stats.latency.counts):
+                    cumulative += count
+                    bound = "+Inf" if upper == float('inf') else repr(upper)
+                    lines.append(f'{PREFIX}_request_duration_seconds_bucket'
+                                 f'{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f"{PREFIX}_request_duration_seconds_sum{{{label}}} "
+                             f"{stats.latency.total}")
+                lines.append(f"{PREFIX}_request_duration_seconds_count{{{label}}} "
+                             f"{stats.latency.count}")
+            for name, attr, kind in (("sql_statements_total", "sql_statements", "counter"),
+                                     ("sql_seconds_total", "sql_seconds", "counter")):
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                for endpoint, stats in endpoints:
+                    lines.append(f'{PREFIX}_{name}{{endpoint="{endpoint}"}} '
+                                 f'{getattr(stats, attr)}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _on_query(_name: str, seconds: float):
+    if not has_app_context():
+        return
+    sql = g.get('_metrics_sql')
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += seconds
+
+
+def _start():
+    g._metrics_start = perf_counter()  # pylint: disable=protected-access
+    g._metrics_sql = [0, 0.0]  # pylint: disable=protected-access
+
+
+def _finish(_exc: BaseException | None = None):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    statements, sql_seconds = g.pop('_metrics_sql', (0, 0.0))
+    endpoint = request.endpoint or "<unmatched>"
+    metrics.record(endpoint, perf_counter() - start, statements, sql_seconds)
+
+
+def install(app: Flask):
+    """Record request latency and SQL usage. This function should be registered
+    in `bootstrap.register`"""
+    if _on_query not in QUERY_HOOKS:
+        QUERY_HOOKS.append(_on_query)
+    app.before_request(_start)
+    app.teardown_request(_finish)
@@ -1,18 +1,32 @@
 """Models"""
 
 from inspect import get_annotations
-from typing import Protocol
+from typing import Any, ClassVar, Iterable, Iterator, Protocol
 
+from sqlite_database import op
 from sqlite_database.table import Table
-from sqlite_database.typings import TypicalNamedTuple
-from future_router.proxies import AttrDict
+
+try:
+    from ..cache import LRUCache
+    from ..errors import ResourceNotFound
+    from ..page_cache import invalidate
+    from ..write_behind import MISSING, write_behind
+except ImportError:
+    from app.cache import LRUCache
+    from app.errors import ResourceNotFound
+    from app.page_cache import invalidate
+    from app.write_behind import MISSING, write_behind
+
+IDENTITY_CACHE_SIZE = 1024
+IDENTITY_CACHE_TTL = 300.0
+# SQLite caps bound parameters per statement (999 on older builds)
+MAX_VARIABLES = 900
 
 
 class AnyModel(Protocol):
     """Model Protocol"""
+    __slots__ = ()
     _table: 'Table'  # type: ignore
-    _raw_attributes: TypicalNamedTuple
-    _attrs: AttrDict
 
     @staticmethod
     def find(user_id: str):
@@ -32,29 +46,167 @@ class AnyModel(Protocol):
         return f"{type(self).__name__}({id(self)})"
 
 
-class BaseModel(AnyModel):
-    """Base Models"""
-    _table: Table
+class ModelMeta(type(Protocol)):  # type: ignore
+    """Give models created with `table=` one slot per annotated attribute.
+
+    Slots must exist before a class is created, so this can't be done in
+    `__init_subclass__`. Annotations are used instead of table columns so that
+    defining a model doesn't touch the database; annotations which aren't
+    columns (i.e. derived data like `roles`) are plain slots."""
 
-    def __init_subclass__(cls, table: Table):  # pylint: disable=arguments-differ
+    def __new__(cls, name: str, bases: tuple[type, ...], namespace: dict[str, Any], **kwargs):
+        if kwargs.get('table') is not None and '__slots__' not in namespace:
+            namespace['__slots__'] = tuple(
+                varname for varname in namespace.get('__annotations__', {})
+                if varname not in namespace)
+        return super().__new__(cls, name, bases, namespace, **kwargs)
+
+
+class BaseModel(AnyModel, metaclass=ModelMeta):
+    """Base Models"""
+    __slots__ = ('_pk',)
+    _table: ClassVar[Table]
+    _key: ClassVar[str]
+    _identity: ClassVar[LRUCache]
+    _identity_ttl: ClassVar[float | None]
+    _fields: ClassVar[tuple[str, ...] | None]
+    _all_slots: ClassVar[tuple[str, ...]]
+
+    # pylint: disable-next=arguments-differ
+    def __init_subclass__(cls, table: Table, key: str | None = None,
+                          ttl: float | None = IDENTITY_CACHE_TTL):
         cls._table = table
-        namespace = table.get_namespace()
-        for varname, annotated in get_annotations(namespace).items():
-            def temp_function(varname):
-                def wrapper(self: BaseModel):
-                    return getattr(self._attrs, varname)  # pylint: disable=protected-access
-                return wrapper
-            tmp_fn = temp_function(varname)
-            tmp_fn.__name__ = varname
-            tmp_fn.__qualname__ = varname
-            tmp_fn.__annotations__['return'] = annotated
-            cls.__annotations__[varname] = annotated
-            setattr(cls, varname, property(tmp_fn))
-
-    def __init__(self, _query: AttrDict) -> None:
+        cls._fields = None
+        cls._key = key or cls.__slots__[0]
+        cls._identity_ttl = ttl
+        cls.configure_identity_cache()
+        cls._all_slots = tuple(dict.fromkeys(
+            slot for klass in reversed(cls.__mro__) for slot in vars(klass).get('__slots__', ())))
+
+    @classmethod
+    def columns(cls) -> tuple[str, ...]:
+        """Annotated attributes which are table columns, looked up on first use"""
+        fields = cls._fields
+        if fields is None:
+            names = get_annotations(cls._table.get_namespace())
+            fields = cls._fields = tuple(
+                varname for varname in names if varname in cls.__slots__)
+        return fields
+
+    def __init__(self, _query: Any) -> None:
         super().__init__()
-        self._raw_attributes = self._table.get_namespace()(**_query)
-        self._attrs = _query
+        for varname in self._fields or self.columns():
+            setattr(self, varname, _query[varname])
+        self._pk = _query[self._key]
+
+    def copy(self):
+        """Shallow copy. The identity cache keeps its own instances and hands out
+        copies, so callers can change what they load without affecting others."""
+        clone = object.__new__(type(self))
+        for slot in self._all_slots:
+            try:
+                setattr(clone, slot, getattr(self, slot))
+            except AttributeError:
+                pass
+        return clone
+
+    @classmethod
+    def configure_identity_cache(cls, maxsize: int = IDENTITY_CACHE_SIZE, ttl: Any = MISSING):
+        """Replace identity cache of this model with a new one. ttl defaults to
+        the one the model was defined with, set becomes the model's default."""
+        if ttl is not MISSING:
+            cls._identity_ttl = ttl
+        cls._identity = LRUCache(maxsize, cls._identity_ttl, name=f"identity:{cls.__name__}")
+
+    @classmethod
+    def forget(cls, key: str):
+        """Drop a row from identity cache"""
+        cls._identity.discard(key)
+
+    @classmethod
+    def changed(cls, keys: Iterable[Any]):
+        """Drop rows written with raw SQL from identity cache, and cached pages
+        showing them"""
+        for key in keys:
+            cls._identity.discard(key)
+            cls.invalidate_pages(key)
+
+    @classmethod
+    def identity_stats(cls) -> dict[str, int]:
+        """Return identity cache hit/miss counters"""
+        return cls._identity.stats()
+
+    @classmethod
+    def load(cls, key: Any):
+        """Load one row by key, copied from identity cache when possible. Sees
+        writes still queued by write-behind."""
+        cached = cls._identity.get(key)
+        if cached is not None:
+            return cached.copy()
+        row = MISSING
+        if write_behind.enabled:
+            row = write_behind.pending(cls._table.name, cls._key, key)  # type: ignore
+        if row is MISSING:
+            row = cls._table.select_one({cls._key: op == key})  # type: ignore
+        if row:
+            model = cls(row)
+            cls._identity.set(key, model.copy())
+            return model
+        raise ResourceNotFound(f"Resource for {key} is not found")
+
+    @classmethod
+    def find_many(cls, keys: Iterable[Any]) -> list[Any]:
+        """Load many rows by key with as few queries as possible.
+
+        Rows already in identity cache are not queried again. Missing keys are
+        skipped, others are returned in the order of keys."""
+        keys = list(dict.fromkeys(keys))
+        found: dict[Any, Any] = {}
+        missing = []
+        for key in keys:
+            cached = cls._identity.get(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                found[key] = cached.copy()
+        for start in range(0, len(missing), MAX_VARIABLES):
+            chunk = missing[start:start + MAX_VARIABLES]
+            for row in cls._table.select({cls._key: op.in_(chunk)}):  # type: ignore
+                model = cls(row)
+                found[model._pk] = model
+                cls._identity.set(model._pk, model.copy())
+        return [found[key] for key in keys if key in found]
+
+    @classmethod
+    def where(cls, condition: dict[str, Any] | None = None, **kwargs: Any) -> list[Any]:
+        """Build models from one select. Extra kwargs (limit, offset, order) go to select"""
+        return [cls(row) for row in cls._table.select(condition, **kwargs)]  # type: ignore
+
+    @classmethod
+    def page(cls, after: Any = None, limit: int = 50,
+             condition: dict[str, Any] | None = None) -> list[Any]:
+        """Keyset pagination: return up to limit rows with key greater than after,
+        ordered by key. Pass last row's key of a page to get the next one."""
+        where = dict(condition or {})
+        if after is not None:
+            where[cls._key] = op > after
+        return cls.where(where or None, limit=limit, order=(cls._key, 'asc'))
+
+    @classmethod
+    def iterate(cls, batch: int = 500,
+                condition: dict[str, Any] | None = None) -> Iterator[Any]:
+        """Iterate every row, holding at most one batch in memory"""
+        after = None
+        while True:
+            rows = cls.page(after, batch, condition)
+            yield from rows
+            if len(rows) < batch:
+                return
+            after = getattr(rows[-1], cls._key)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Column values of this row"""
+        return {varname: getattr(self, varname) for varname in self.columns()}
 
     @staticmethod
     def find(user_id: str):
@@ -64,8 +216,33 @@ class BaseModel(AnyModel):
     def all():
         pass
 
+    @classmethod
+    def invalidate_pages(cls, key: Any):  # pylint: disable=unused-argument
+        """Drop cached pages showing the row of key, every page unless a model
+        narrows it down"""
+        invalidate()
+
     def save(self):
-        self._table.update_one(self._attrs, self._raw_attributes._asdict())
+        """Write this row, queued when write-behind is enabled (see `write_behind`).
+        Cached pages showing it are dropped."""
+        self.invalidate_pages(self._pk)
+        if not write_behind.enabled:
+            self._table.update_one({self._key: op == self._pk}, self.as_dict())
+            self._identity.discard(self._pk)
+            self._pk = getattr(self, self._key)
+            return
+        write_behind.update(self._table.name, self._key, self._pk,  # type: ignore
+                            self.as_dict())
+        # Until flushed, the database is stale: keep serving this instance
+        self._identity.discard(self._pk)
+        self._pk = getattr(self, self._key)
+        self._identity.set(self._pk, self.copy())
 
     def destroy(self):
-        self._table.delete_one(self._raw_attributes._asdict())
+        """Delete this row, queued when write-behind is enabled"""
+        self.invalidate_pages(self._pk)
+        if write_behind.enabled:
+            write_behind.delete(self._table.name, self._key, self._pk)  # type: ignore
+        else:
+            self._table.delete_one({self._key: op == self._pk})
+        self._identity.discard(self._pk)
@@ -1,33 +1,45 @@
 """User Model"""
+from typing import Any
+
 from flask_login import UserMixin
-from sqlite_database import op
 
 try:
-    from ..errors import ResourceNotFound
     from ..database_loader import table
+    from ..page_cache import invalidate
+    from ..utils import parse_roles
     from . import BaseModel
 except ImportError:
-    from app.errors import ResourceNotFound
     from app.database_loader import table
+    from app.page_cache import invalidate
+    from app.utils import parse_roles
     from app.model import BaseModel
 
+# Workers of a prefork server each cache users, a revoked role or deleted user
+# is seen by the others within this many seconds
+USER_CACHE_TTL = 5.0
+
 
-class UserModel(BaseModel, table=table('users')):  # type: ignore
+class UserModel(BaseModel, table=table('users'), key='username',  # type: ignore
+                ttl=USER_CACHE_TTL):
     """User Model"""
     username: str
     password: str
     picture: str
     groups: str
+    roles: frozenset[str]
+
+    def __init__(self, _query: Any) -> None:
+        super().__init__(_query)
+        self.roles = parse_roles(self.groups)
+
+    def save(self):
+        self.roles = parse_roles(self.groups)
+        super().save()
 
-    """User Model"""
     @classmethod
-    def load(cls, user_id: str):
-        """Load from user_id"""
-        user = cls._table.select_one(  # type: ignore
-            {"username": op == user_id})
-        if user:
-            return UserModel(user)
-        raise ResourceNotFound(f"Resource for {user_id} is not found")
+    def invalidate_pages(cls, key: Any):
+        # Cached pages show a user's row only to that user (navbar)
+        invalidate(viewer=key)
 
     @staticmethod
     def find(user_id: str):
@@ -35,7 +47,11 @@ class UserModel(BaseModel, table=table('users')):  # type: ignore
 
     @staticmethod
     def all():
-        return UserModel._table.select()
+        return UserModel.iterate()
+
+    def as_public(self) -> dict[str, Any]:
+        """Fields safe to show to other users"""
+        return {'username': self.username, 'picture': self.picture, 'groups': self.groups}
 
 
 class UserInterface(UserMixin):  # type: ignore
@@ -55,11 +71,21 @@ class UserInterface(UserMixin):  # type: ignore
         """Is Authenticated"""
         return True
 
+    @property
+    def roles(self) -> frozenset[str]:
+        """Role names of this user"""
+        return self._data.roles
+
     @classmethod
     def get(cls, user_id: str):
         """Get UserModel by Id"""
         return cls(user_id)
 
+    @staticmethod
+    def forget(user_id: str):
+        """Drop cached user so next `get` reloads it"""
+        UserModel.forget(user_id)
+
     def get_id(self) -> str:
         """Get user id"""
         return self._data.username
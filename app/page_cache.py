@@ -0,0 +1,102 @@
+"""Rendered page cache"""
+from functools import wraps
+from hashlib import blake2b
+from threading import Lock
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from flask import Flask, Response, make_response, request, session
+from flask_login import current_user
+
+try:
+    from app.cache import LRUCache
+    from app.utils import NO_ROLES
+except ImportError:
+    from .cache import LRUCache
+    from .utils import NO_ROLES
+
+PAGE_CACHE_SIZE = 512
+
+pages = LRUCache(PAGE_CACHE_SIZE, name="pages")
+# Bumped by `invalidate`, keyed by (endpoint, viewer), None standing for all of them
+_generations: dict[tuple[str | None, str | None], int] = {}
+_lock = Lock()
+_Settings = SimpleNamespace(enabled=True)
+
+
+def invalidate(*endpoints: str, viewer: str | None = None):
+    """Drop cached pages of endpoints, or of every endpoint when none is given,
+    only those rendered for viewer (a user id) when given. Call this after
+    changing anything cached pages render, i.e. settings."""
+    with _lock:
+        for endpoint in endpoints or (None,):
+            key = (endpoint, viewer)
+            _generations[key] = _generations.get(key, 0) + 1
+    if not endpoints and viewer is None:
+        pages.clear()
+
+
+def _stamp(endpoint: str | None, viewer: str | None) -> tuple[int, ...]:
+    return tuple(_generations.get(key, 0) for key in (
+        (None, None), (endpoint, None), (None, viewer), (endpoint, viewer)))
+
+
+def _viewer() -> tuple[str | None, frozenset[str]]:
+    # The navbar shows the username, so pages are per user, not only per role set
+    if not current_user or not current_user.is_authenticated:
+        return None, NO_ROLES
+    return current_user.get_id(), getattr(current_user, 'roles', NO_ROLES)
+
+
+def _cached_response(body: bytes, mimetype: str, etag: str) -> Response:
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def cache_page(func: Callable):
+    """Cache rendered output of a GET view per endpoint, view arguments, query
+    string and viewer, answering `If-None-Match` with 304. Requests with pending
+    flashed messages and non-200 responses bypass the cache.
+
+    Place it below login/role checks, so those still run on every request."""
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any):
+        if (not _Settings.enabled or request.method not in ('GET', 'HEAD')
+                or session.get('_flashes')):
+            return func(*args, **kwargs)
+        endpoint = request.endpoint
+        viewer = _viewer()
+        key = (endpoint, tuple(sorted(kwargs.items())), request.query_string, viewer)
+        stamp = _stamp(endpoint, viewer[0])
+        entry = pages.get(key, None, stamp)
+        if entry is None:
+            response = make_response(func(*args, **kwargs))
+            if (response.status_code != 200 or response.is_streamed
+                    or response.direct_passthrough):
+                return response
+            body = response.get_data()
+            entry = (body, response.mimetype, blake2b(body, digest_size=16).hexdigest())
+            pages.set(key, entry, stamp)
+        return _cached_response(*entry)
+    return wrapper
+
+
+def init_app(app: Flask):
+    """Configure page cache. This function should be registered in `bootstrap.register`
+
+    Config:
+        PAGE_CACHE: enable page caching, defaults to on unless debugging
+            (templates may change under a running debug server)
+        PAGE_CACHE_SIZE: maximum cached pages
+        PAGE_CACHE_TTL: seconds a page stays cached, defaults to forever
+    """
+    enabled = app.config.get("PAGE_CACHE")
+    _Settings.enabled = not app.debug if enabled is None else bool(enabled)
+    pages.maxsize = app.config.get("PAGE_CACHE_SIZE", PAGE_CACHE_SIZE)
+    pages.ttl = app.config.get("PAGE_CACHE_TTL")
+    invalidate()
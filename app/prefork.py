@@ -0,0 +1,427 @@
+"""Preforking server
+
+The master process bootstraps the app once, then forks workers that share its
+memory copy-on-write. Each worker runs a `wsgiref` server with a fixed pool of
+request threads (keeping HTTP/1.1 connections alive between requests) on the
+shared listening socket, or on its own `SO_REUSEPORT` socket. File responses
+(`wsgi.file_wrapper`) are sent with `socket.sendfile`, from the file's current
+position for Content-Length bytes, so single ranges are sent that way too.
+
+Signals to the master:
+    SIGHUP: reload; re-exec with new code and config, then replace workers
+    SIGTERM: graceful stop, workers finish in-flight requests
+    SIGINT, SIGQUIT: stop now
+"""
+from contextlib import suppress
+from gc import collect, freeze
+from http.server import BaseHTTPRequestHandler
+from logging import getLogger
+from os import WNOHANG, _exit, environ as os_environ, execve, fork, kill, pipe, read
+from os import sched_getaffinity, set_blocking, waitpid
+from queue import SimpleQueue
+from random import randint
+from select import select
+from signal import SIG_DFL, SIGCHLD, SIGHUP, SIGINT, SIGKILL, SIGQUIT, SIGTERM
+from signal import set_wakeup_fd, signal
+from socket import AF_INET, AF_INET6, SO_REUSEADDR, SO_REUSEPORT, SOCK_STREAM, SOL_SOCKET
+from socket import socket
+from sys import executable, orig_argv
+from threading import Condition, Thread
+from time import monotonic, sleep
+from typing import Any, Iterable, NamedTuple
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer
+
+from flask import Flask
+
+try:
+    from app.async_database import executor
+    from app.database_loader import database
+    from app.file_index import file_index
+    from app.hashing import hasher
+    from app.write_behind import write_behind
+except ImportError:
+    from .async_database import executor
+    from .database_loader import database
+    from .file_index import file_index
+    from .hashing import hasher
+    from .write_behind import write_behind
+
+# Handed from a reloading master to the program it execs
+ENV_FD = "PREFORK_FD"
+ENV_RETIRING = "PREFORK_RETIRING"
+BACKLOG = 2048
+
+logger = getLogger(__name__)
+
+
+class Options(NamedTuple):
+    """Prefork settings, see `Options.from_config`"""
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 0
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    graceful_timeout: float = 30.0
+    reuse_port: bool = False
+    threads: int = 16
+    keepalive: float = 2.0
+
+    @classmethod
+    def from_config(cls, app: Flask, **overrides: Any) -> 'Options':
+        """Read options from app config, overrides (i.e. command line) win.
+
+        Config:
+            PREFORK_BIND: "host:port", defaults to "0.0.0.0:8000"
+            PREFORK_WORKERS: worker processes, defaults to one per usable core
+            PREFORK_MAX_REQUESTS: recycle a worker after this many requests,
+                0 never does
+            PREFORK_MAX_REQUESTS_JITTER: add up to this many to each worker's
+                limit, so workers don't all recycle at once
+            PREFORK_GRACEFUL_TIMEOUT: seconds a stopping worker waits for
+                in-flight requests
+            PREFORK_REUSE_PORT: one SO_REUSEPORT socket per worker instead of a
+                shared one, the kernel then balances connections
+            PREFORK_THREADS: request threads per worker
+            PREFORK_KEEPALIVE: seconds an idle connection is kept open for
+                further requests, 0 closes it after each response
+        """
+        options = cls(
+            *parse_bind(app.config.get("PREFORK_BIND", "0.0.0.0:8000")),
+            app.config.get("PREFORK_WORKERS", 0) or len(sched_getaffinity(0)),
+            app.config.get("PREFORK_MAX_REQUESTS", 0),
+            app.config.get("PREFORK_MAX_REQUESTS_JITTER", 0),
+            app.config.get("PREFORK_GRACEFUL_TIMEOUT", 30.0),
+            app.config.get("PREFORK_REUSE_PORT", False),
+            app.config.get("PREFORK_THREADS", 16),
+            app.config.get("PREFORK_KEEPALIVE", 2.0))
+        return options._replace(**{key: value for key, value in overrides.items()
+                                   if value is not None})
+
+
+def parse_bind(bind: str) -> tuple[str, int]:
+    """Split "host:port" (IPv6 hosts in brackets), host defaults to all addresses"""
+    host, _, port = bind.rpartition(':')
+    return host.strip('[]') or "0.0.0.0", int(port)
+
+
+def listen(host: str, port: int, reuse_port: bool = False) -> socket:
+    """Open a listening TCP socket"""
+    sock = socket(AF_INET6 if ':' in host else AF_INET, SOCK_STREAM)
+    sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    return sock
+
+
+def before_fork():
+    """Drop what workers must not inherit: queued writes, threads, process pools
+    and SQLite connections. Each worker opens its own lazily, and hashes passwords in its
+    request threads, N workers keep every core busy already. Then move
+    surviving objects out of the collector's reach, so collections in workers
+    don't write to (and copy) pages shared with the master."""
+    write_behind.stop()
+    executor.shutdown()
+    hasher.shutdown()
+    file_index.stop()
+    database.close_all()
+    collect()
+    freeze()
+
+
+class FileServerHandler(ServerHandler):
+    """Response writer sending `wsgi.file_wrapper` bodies with `socket.sendfile`,
+    asking to close the connection when the response can't be kept alive"""
+    http_version = "1.1"
+    request_handler: 'RequestHandler'
+
+    def cleanup_headers(self):
+        super().cleanup_headers()
+        bodyless = self.status[:3] in ('204', '304') or self.environ['REQUEST_METHOD'] == 'HEAD'
+        if 'Content-Length' not in self.headers and not bodyless:
+            self.request_handler.close_connection = True
+        if self.request_handler.close_connection:
+            self.headers['Connection'] = "close"
+
+    def handle_error(self):
+        # The response may be cut short, the client can't tell where it ends
+        self.request_handler.close_connection = True
+        super().handle_error()
+
+    def sendfile(self):
+        length = self.headers.get('Content-Length')
+        try:
+            file = self.result.filelike
+            offset = file.tell()
+        except (AttributeError, OSError, ValueError):
+            return False
+        if length is None:
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        self.bytes_sent += self.request_handler.connection.sendfile(file, offset, int(length))
+        return True
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Requests of one connection. HTTP/1.1 connections stay open between
+    requests, for up to the server's keepalive seconds. Those with a request body
+    are closed after it, so an unread body can't be taken for the next request."""
+    server: 'Server'
+    protocol_version = "HTTP/1.1"
+    requestline = ''
+    handle = BaseHTTPRequestHandler.handle
+
+    def handle_one_request(self):
+        if self.requestline:
+            # Waiting for another request on an open connection
+            self.connection.settimeout(self.server.keepalive)
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except TimeoutError:
+            self.close_connection = True
+            return
+        self.connection.settimeout(None)
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = self.request_version = self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        worker = self.server.worker
+        if worker.stopping or not self.server.keepalive or self.request_version != "HTTP/1.1" \
+                or self.headers.get('Content-Length', '0') != '0' \
+                or 'Transfer-Encoding' in self.headers:
+            self.close_connection = True
+        handler = FileServerHandler(self.rfile, self.wfile, self.get_stderr(),
+                                    self.get_environ(), multithread=True)
+        handler.request_handler = self
+        worker.started()
+        handler.run(worker.app)
+
+    def log_message(self, format: str, *args: Any):  # pylint: disable=redefined-builtin
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class Server(WSGIServer):
+    """WSGI server on an already listening socket. Accepted connections are
+    served by a fixed pool of threads, so what a thread keeps (i.e. its database
+    connection) is reused by the requests that follow."""
+
+    def __init__(self, sock: socket, worker: 'Worker', threads: int, keepalive: float) -> None:
+        super().__init__(sock.getsockname()[:2], RequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_name, self.server_port = self.server_address[:2]
+        self.setup_environ()
+        self.set_app(worker.app)
+        self.worker = worker
+        self.keepalive = keepalive
+        self._accepted: SimpleQueue[tuple[socket, Any] | None] = SimpleQueue()
+        self._threads = [Thread(target=self._serve, name=f"request-{number}", daemon=True)
+                         for number in range(max(1, threads))]
+        for thread in self._threads:
+            thread.start()
+
+    def process_request(self, request: Any, client_address: Any):
+        self.worker.accepted()
+        self._accepted.put((request, client_address))
+
+    def _serve(self):
+        while (accepted := self._accepted.get()) is not None:
+            request, client_address = accepted
+            try:
+                self.finish_request(request, client_address)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self.worker.closed()
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._accepted.put(None)
+
+
+class Worker:  # pylint: disable=too-many-instance-attributes
+    """One forked process serving the app until stopped or recycled, then
+    draining accepted connections"""
+
+    def __init__(self, app: Flask, sock: socket | None, options: Options) -> None:
+        self.app = app
+        self.options = options
+        self.limit = options.max_requests
+        if self.limit:
+            self.limit += randint(0, options.max_requests_jitter)
+        self.served = 0
+        # Accepted connections not closed yet
+        self.active = 0
+        self.stopping = False
+        self._idle = Condition()
+        if sock is None:
+            sock = listen(options.host, options.port, True)
+        self.server = Server(sock, self, options.threads, options.keepalive)
+
+    def accepted(self):
+        """Count an accepted connection"""
+        with self._idle:
+            self.active += 1
+
+    def started(self):
+        """Count a request, stop accepting more once the limit is reached"""
+        with self._idle:
+            self.served += 1
+            if self.served == self.limit:
+                self.stop()
+
+    def closed(self):
+        """A connection was closed"""
+        with self._idle:
+            self.active -= 1
+            self._idle.notify_all()
+
+    def stop(self, *_: Any):
+        """Stop accepting connections, `run` then drains and returns. Open
+        connections are closed after their current request."""
+        self.stopping = True
+        # shutdown waits for the serve loop, which may be on the calling thread
+        Thread(target=self.server.shutdown, daemon=True).start()
+
+    def run(self):
+        """Serve until stopped, then wait for accepted connections and write what
+        their requests queued"""
+        set_wakeup_fd(-1)
+        for signum in (SIGHUP, SIGTERM):
+            signal(signum, self.stop)
+        for signum in (SIGINT, SIGQUIT, SIGCHLD):
+            signal(signum, SIG_DFL)
+        try:
+            self.server.serve_forever()
+        finally:
+            deadline = monotonic() + self.options.graceful_timeout
+            with self._idle:
+                while self.active and deadline > monotonic():
+                    self._idle.wait(deadline - monotonic())
+            self.server.server_close()
+            # Workers leave through os._exit, atexit handlers don't run
+            write_behind.stop()
+
+
+class Arbiter:
+    """Master process: keeps `Options.workers` workers running and handles
+    signals (see module docstring)"""
+
+    def __init__(self, app: Flask, options: Options) -> None:
+        self.app = app
+        self.options = options
+        self.socket: socket | None = None
+        self.workers: set[int] = set()
+        # Workers of a previous master, stopping once ours are up
+        self.retiring: set[int] = set()
+        self._signals: list[int] = []
+
+    def _on_signal(self, signum: int, _frame: Any):
+        self._signals.append(signum)
+
+    def spawn(self):
+        """Fork a worker"""
+        pid = fork()
+        if pid:
+            self.workers.add(pid)
+            return
+        status = 0
+        try:
+            Worker(self.app, self.socket, self.options).run()
+        except BaseException:  # pylint: disable=broad-exception-caught
+            logger.exception("Worker failed")
+            status = 1
+        finally:
+            _exit(status)
+
+    def reap(self):
+        """Collect exited workers"""
+        while True:
+            try:
+                pid, status = waitpid(-1, WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if status and pid in self.workers:
+                logger.warning("Worker %d exited with status %d", pid, status)
+            self.workers.discard(pid)
+            self.retiring.discard(pid)
+
+    def reload(self):
+        """Re-exec this program, which loads and bootstraps current code and
+        config, forks new workers and only then stops ours. The listening socket
+        stays open throughout. Should the new program fail to start, current
+        workers keep serving until they are stopped by hand."""
+        env = dict(os_environ)
+        env[ENV_RETIRING] = ','.join(str(pid) for pid in self.workers | self.retiring)
+        if self.socket is not None:
+            self.socket.set_inheritable(True)
+            env[ENV_FD] = str(self.socket.fileno())
+        logger.info("Reloading")
+        execve(executable, [executable, *orig_argv[1:]], env)
+
+    def stop(self, graceful: bool = True):
+        """Stop every worker, killing those still running after the graceful timeout"""
+        self.signal_all(SIGTERM if graceful else SIGINT)
+        deadline = monotonic() + self.options.graceful_timeout + 1
+        while (self.workers or self.retiring) and deadline > monotonic():
+            sleep(0.1)
+            self.reap()
+        self.signal_all(SIGKILL)
+
+    def signal_all(self, signum: int, pids: Iterable[int] | None = None):
+        """Send a signal to workers, all of them by default"""
+        for pid in list(self.workers | self.retiring if pids is None else pids):
+            with suppress(ProcessLookupError):
+                kill(pid, signum)
+
+    def _setup(self) -> int:
+        inherited = os_environ.pop(ENV_FD, None)
+        if inherited is not None:
+            self.socket = socket(fileno=int(inherited))
+            self.socket.set_inheritable(False)
+        elif not self.options.reuse_port:
+            self.socket = listen(self.options.host, self.options.port)
+        retiring = os_environ.pop(ENV_RETIRING, '')
+        self.retiring = {int(pid) for pid in retiring.split(',') if pid}
+        wake, wakeup = pipe()
+        set_blocking(wake, False)
+        set_blocking(wakeup, False)
+        set_wakeup_fd(wakeup)
+        for signum in (SIGHUP, SIGTERM, SIGINT, SIGQUIT, SIGCHLD):
+            signal(signum, self._on_signal)
+        return wake
+
+    def run(self):
+        """Fork workers and supervise them until stopped"""
+        wake = self._setup()
+        before_fork()
+        logger.info("Serving on %s:%d with %d workers", self.options.host,
+                    self.options.port, self.options.workers)
+        while len(self.workers) < self.options.workers:
+            self.spawn()
+        self.signal_all(SIGTERM, self.retiring)
+        while True:
+            if select([wake], [], [], 1.0)[0]:
+                read(wake, 512)
+            self.reap()
+            while len(self.workers) < self.options.workers:
+                self.spawn()
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum == SIGHUP:
+                    self.reload()
+                elif signum in (SIGTERM, SIGINT, SIGQUIT):
+                    self.stop(signum == SIGTERM)
+                    return
@@ -0,0 +1,268 @@
+"""On-demand request profiling
+
+An admin adds `X-Profile: cprofile` (or `sample`) to a request, or `_profile=...`
+to its query string, and only that request is profiled. Results are kept in a
+bounded ring, listed on /internal/profiles.
+
+Modes:
+    cprofile: deterministic, every call is traced. Exact counts, slows the
+        request down. Downloads as pstats (`python -m pstats`, snakeviz).
+        Since Python 3.12 cProfile traces every thread of the process, so it
+        only starts while no other request is in the app, the request is
+        sampled otherwise. Requests starting during the run are still traced,
+        the summary then says how many.
+    sample: a thread records the request thread's stack every few
+        milliseconds. Low overhead. Downloads as collapsed stacks
+        (flamegraph.pl, speedscope).
+"""
+from collections import Counter, deque
+from cProfile import Profile as CProfile
+from io import StringIO
+from itertools import count
+from marshal import dumps as marshal_dumps
+from pstats import Stats
+from sys import _current_frames, version_info
+from threading import Event, Lock, Thread, get_ident
+from time import perf_counter, time
+from types import FrameType, SimpleNamespace
+from typing import Any, NamedTuple
+
+from flask import Flask, Response, g, request
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+try:
+    from app.flask_utils import role_required
+except ImportError:
+    from .flask_utils import role_required
+
+HEADER = "X-Profile"
+QUERY = "_profile"
+MODES = ('cprofile', 'sample')
+RING_SIZE = 20
+SAMPLE_INTERVAL = 0.002
+# Lines of the text summary
+SUMMARY_LINES = 40
+# cProfile traces all threads, not just the one enabling it
+PROCESS_WIDE = version_info >= (3, 12)
+
+
+class Profile(NamedTuple):
+    """One profiled request"""
+    id: int
+    created: float
+    mode: str
+    method: str
+    path: str
+    endpoint: str
+    status: int
+    user: str
+    duration_ms: float
+    summary: str
+    data: bytes
+
+    @property
+    def filename(self) -> str:
+        """Download name, extension tells the format"""
+        return f"profile-{self.id}.{'pstats' if self.mode == 'cprofile' else 'folded'}"
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(';', ',')
+
+
+class Sampler:
+    """Record stacks of one thread on a background thread until stopped"""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = _current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def start(self):
+        """Start sampling"""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> bytes:
+        """Stacks in collapsed format, root first: `a;b;c <samples>` per line"""
+        return "".join(f"{stack} {samples}\n"
+                       for stack, samples in self.stacks.most_common()).encode()
+
+    def summary(self) -> str:
+        """Frames by samples spent in them (self) and under them (total)"""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, samples in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += samples
+            for frame in set(frames):
+                total[frame] += samples
+        samples = sum(self.stacks.values())
+        lines = [f"{samples} samples every {self.interval * 1000:g} ms", "",
+                 "   self%  total%  frame"]
+        for frame, hits in own.most_common(SUMMARY_LINES):
+            lines.append(f"{hits / samples:8.1%}{total[frame] / samples:8.1%}  {frame}")
+        return "\n".join(lines)
+
+
+class Profiles:
+    """Bounded ring of recent profiles"""
+
+    def __init__(self, size: int = RING_SIZE) -> None:
+        self._ring: deque[Profile] = deque(maxlen=size)
+        self._ids = count(1)
+        self._lock = Lock()
+
+    def resize(self, size: int):
+        """Change ring size, keeping the newest profiles"""
+        with self._lock:
+            self._ring = deque(self._ring, maxlen=size)
+
+    def next_id(self) -> int:
+        """Reserve an id"""
+        return next(self._ids)
+
+    def add(self, profile: Profile):
+        """Store a profile, dropping the oldest when full"""
+        with self._lock:
+            self._ring.append(profile)
+
+    def get(self, profile_id: int) -> Profile | None:
+        """Profile by id, if still kept"""
+        with self._lock:
+            return next((profile for profile in self._ring if profile.id == profile_id), None)
+
+    def recent(self) -> list[Profile]:
+        """Kept profiles, newest first"""
+        with self._lock:
+            return list(reversed(self._ring))
+
+    def clear(self):
+        """Drop every profile"""
+        with self._lock:
+            self._ring.clear()
+
+
+profiles = Profiles()
+_Settings = SimpleNamespace(enabled=True, interval=SAMPLE_INTERVAL)
+_admin_only = role_required("admin")(lambda: True)
+# Requests in the app now, and started so far
+_requests = SimpleNamespace(running=0, started=0)
+_requests_lock = Lock()
+
+
+def _requested_mode() -> str | None:
+    mode = request.headers.get(HEADER) or request.args.get(QUERY)
+    if not mode:
+        return None
+    mode = mode.lower()
+    if mode not in MODES:
+        mode = MODES[0]
+    try:
+        _admin_only()
+    except HTTPException:
+        return None
+    return mode
+
+
+def _start():
+    if not _Settings.enabled:
+        return
+    with _requests_lock:
+        _requests.running += 1
+        _requests.started += 1
+        alone, started = _requests.running == 1, _requests.started
+    g._profile_counted = True  # pylint: disable=protected-access
+    mode = _requested_mode()
+    if mode is None:
+        return
+    if mode == 'cprofile' and (alone or not PROCESS_WIDE):
+        profiler: Any = CProfile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another cProfile run is active, one per process since Python 3.12
+            mode = 'sample'
+    else:
+        mode = 'sample'
+    if mode == 'sample':
+        profiler = Sampler(get_ident(), _Settings.interval)
+        profiler.start()
+    g._profile = (mode, profiler, perf_counter(), started)  # pylint: disable=protected-access
+
+
+def _stop(status: int) -> int | None:
+    state = g.pop('_profile', None)
+    if state is None:
+        return None
+    mode, profiler, start, started = state
+    if mode == 'cprofile':
+        profiler.disable()
+        duration = (perf_counter() - start) * 1000
+        stats = Stats(profiler, stream=StringIO())
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        summary = stats.stream.getvalue()  # type: ignore
+        others = _requests.started - started
+        if PROCESS_WIDE and others:
+            summary = f"{others} other requests started meanwhile, their calls are " \
+                f"included.\n{summary}"
+        data = marshal_dumps(stats.stats)  # type: ignore
+    else:
+        profiler.stop()
+        duration = (perf_counter() - start) * 1000
+        summary, data = profiler.summary(), profiler.collapsed()
+    profile_id = profiles.next_id()
+    profiles.add(Profile(profile_id, time(), mode, request.method, request.full_path.rstrip('?'),
+                         request.endpoint or "<unmatched>", status, current_user.get_id() or '',
+                         duration, summary, data))
+    return profile_id
+
+
+def _after(response: Response) -> Response:
+    profile_id = _stop(response.status_code)
+    if profile_id is not None:
+        response.headers[f"{HEADER}-Id"] = str(profile_id)
+    return response
+
+
+def _teardown(_exc: BaseException | None = None):
+    # Only still running when the request failed before after_request
+    _stop(500)
+    if g.pop('_profile_counted', False):
+        with _requests_lock:
+            _requests.running -= 1
+
+
+def install(app: Flask):
+    """Profile requests that ask for it. This function should be registered in
+    `bootstrap.register`
+
+    Config:
+        PROFILING: allow admins to profile requests, defaults to true
+        PROFILE_RING_SIZE: profiles kept
+        PROFILE_SAMPLE_INTERVAL: seconds between stack samples in sample mode
+    """
+    _Settings.enabled = app.config.get("PROFILING", True)
+    _Settings.interval = app.config.get("PROFILE_SAMPLE_INTERVAL", SAMPLE_INTERVAL)
+    profiles.resize(app.config.get("PROFILE_RING_SIZE", RING_SIZE))
+    app.before_request(_start)
+    app.after_request(_after)
+    app.teardown_request(_teardown)
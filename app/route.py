@@ -1,40 +1,64 @@
 """Main Route"""
 # pylint: disable=missing-function-docstring,missing-class-docstring
+from os.path import isdir, relpath
+
 from flask_login import login_required, login_user, logout_user
-from flask import render_template, request, flash, redirect, url_for, abort
+from flask import render_template, request, flash, redirect, url_for, abort, jsonify, Response
 from markupsafe import escape
-from werkzeug.security import check_password_hash, generate_password_hash
 from sqlite_database.signature import op
 
 
 try:
     from app import Route
-    from app.forms import LoginForm, RegisterForm
-    from app.database_loader import table
-    from app.model.user import UserInterface
+    from app.database_loader import table, database
+    from app.model.user import UserInterface, UserModel
     from app.flask_utils import is_invalid_username, role_required, admin_only
+    from app.cache import cache_stats
+    from app import files
+    from app.file_index import file_index
+    from app.hashing import hasher
+    from app.metrics import metrics
+    from app.page_cache import cache_page
+    from app.profiler import profiles
+    from app.throttle import login_throttle, throttled
+    from app.utils import LazyModule
+    from app.write_behind import write_behind
 except ImportError:
     from . import Route
-    from .forms import LoginForm, RegisterForm
-    from .model.user import UserInterface
+    from .model.user import UserInterface, UserModel
     from .flask_utils import is_invalid_username, role_required, admin_only
-    from .database_loader import table
-
+    from .database_loader import table, database
+    from .cache import cache_stats
+    from . import files
+    from .file_index import file_index
+    from .hashing import hasher
+    from .metrics import metrics
+    from .page_cache import cache_page
+    from .profiler import profiles
+    from .throttle import login_throttle, throttled
+    from .utils import LazyModule
+    from .write_behind import write_behind
+
+forms = LazyModule(".forms", __package__)
 users = table('users')
 groups = table('groups')
+FILES_PAGE_SIZE = 200
+FILES_MAX_PAGE_SIZE = 1000
 
 
 @login_required
 @Route.get("/")
+@cache_page
 def root():
     return render_template("root.html")
 
 
 @Route.route("/login", methods=["GET", "POST"])
+@throttled
 def login():
     if request.method == "GET":
-        return render_template("login.html", form=LoginForm())
-    loginform = LoginForm()
+        return render_template("login.html", form=forms.LoginForm())
+    loginform = forms.LoginForm()
     if not loginform.validate_on_submit():
         return render_template("login.html", form=loginform)
     username: str = loginform.username.data
@@ -44,10 +68,16 @@ def login():
         flash(f"{escape(username)} is not exist.", 'error')
         return render_template("login.html", form=loginform)
 
-    if not check_password_hash(user.password, passwd):
+    if not hasher.verify(user.password, passwd):
         flash("Invalid password.", "error")
         return render_template("login.html", form=loginform)
+    if hasher.needs_rehash(user.password):
+        write_behind.settle('users', 'username', user.username)
+        users.update_one({"username": op == user.username},
+                         {"password": hasher.hash(passwd)})
+        UserInterface.forget(user.username)
     login_user(UserInterface.get(user.username), True)
+    login_throttle.succeeded(request.form.get('username', ''), request.remote_addr or '')
     flash('Logged in successfully.', 'success')
     return redirect("/")
 
@@ -55,19 +85,23 @@ def login():
 @Route.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "GET":
-        return render_template("register.html", form=RegisterForm())
-    form = RegisterForm()
+        return render_template("register.html", form=forms.RegisterForm())
+    form = forms.RegisterForm()
     if not form.validate_on_submit():
         return render_template("register.html", form=form)
     username, password = form.username.data, form.password.data
-    if users.exists({"username": op == username}):
-        flash("This username is already exists.", 'error')
-        return render_template("register.html", form=form)
     if is_invalid_username(username):
         flash("Username can only have . and/or _ special characters.", 'error')
         return render_template("register.html", form=form)
-    users.insert(
-        {"username": username, "password": generate_password_hash(password)})
+    write_behind.settle('users', 'username', username)
+    inserted = database.execute(
+        "insert into users (username, password) values (?, ?) "
+        "on conflict (username) do nothing",
+        (username, hasher.hash(password)), commit=True).rowcount
+    if not inserted:
+        flash("This username is already exists.", 'error')
+        return render_template("register.html", form=form)
+    UserModel.changed((username,))
     flash('Registered successfully. Please login.', 'success')
     return redirect(url_for('login'))
 
@@ -82,22 +116,69 @@ def logout():
 
 @Route.get("/settings")
 @login_required
+@cache_page
 def settings():
     return render_template("settings.html")
 
 
 @Route.get("/internal")
 @role_required("admin", code=404)
+@cache_page
 def internal():
     return render_template("internal.html")
 
 
 @Route.get("/internal/settings")
 @role_required("admin", code=404)
+@cache_page
 def internal_settings():
     return render_template("serversettings.html")
 
 
+@Route.get("/internal/caches")
+@role_required("admin", code=404)
+def internal_caches():
+    return jsonify(cache_stats())
+
+
+@Route.get("/internal/metrics")
+@role_required("admin", code=404)
+def internal_metrics():
+    return render_template("metrics.html", title="Metrics", endpoints=metrics.summary())
+
+
+@Route.get("/internal/metrics.txt")
+@role_required("admin", code=404)
+def internal_metrics_text():
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@Route.get("/internal/profiles")
+@role_required("admin", code=404)
+def internal_profiles():
+    return render_template("profiles.html", title="Profiles", profiles=profiles.recent())
+
+
+@Route.get("/internal/profiles/<int:profile_id>")
+@role_required("admin", code=404)
+def internal_profile(profile_id: int):
+    profile = profiles.get(profile_id)
+    if profile is None:
+        abort(404)
+    return Response(profile.summary, mimetype="text/plain")
+
+
+@Route.get("/internal/profiles/<int:profile_id>/download")
+@role_required("admin", code=404)
+def internal_profile_download(profile_id: int):
+    profile = profiles.get(profile_id)
+    if profile is None:
+        abort(404)
+    mimetype = "application/octet-stream" if profile.mode == 'cprofile' else "text/plain"
+    return Response(profile.data, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{profile.filename}"'})
+
+
 @Route.get("/abort/<int:code>")
 @role_required("admin", code=404)
 def abort_(code: int):
@@ -107,14 +188,36 @@ def abort_(code: int):
 @Route.get("/files/<path:filepath>")
 @role_required("admin", code=403)
 def files_index(filepath):
-    return f"/{filepath}"
+    base = files.files_root()
+    path = files.resolve(filepath, base)
+    if not isdir(path):
+        return files.send_path(path, base)
+    return _file_listing(relpath(path, base))
 
 
 @Route.get("/files")
 @Route.get("/files/")
 @role_required("admin", code=403)
 def files_root():
-    return "/"
+    return _file_listing(".")
+
+
+def _file_listing(filepath: str):
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('after') or None
+    limit = min(max(1, request.args.get('limit', FILES_PAGE_SIZE, type=int)),
+                FILES_MAX_PAGE_SIZE)
+    try:
+        if query:
+            page = file_index.search(query, 'prefix' in request.args, cursor, limit)
+        else:
+            page = file_index.listing("" if filepath == "." else filepath,
+                                      request.args.get('sort', 'name'),
+                                      request.args.get('order') == 'desc', cursor, limit)
+    except ValueError:
+        return abort(400)
+    return render_template("files.html", title="Files", filepath=filepath, query=query,
+                           entries=page.entries, cursor=page.cursor, first=cursor is None)
 
 
 @Route.get("/flash/")
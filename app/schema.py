@@ -0,0 +1,120 @@
+"""Database schema and migrations"""
+from sqlite3 import Connection
+from typing import Callable
+
+from flask import Flask
+
+try:
+    from app.database_loader import database
+    from app.errors import ApplicationError
+except ImportError:
+    from .database_loader import database
+    from .errors import ApplicationError
+
+
+def _duplicates(conn: Connection, table: str, column: str) -> str:
+    duplicated = conn.execute(
+        f"select {column} from {table} group by {column} having count(*) > 1 limit 10"
+    ).fetchall()
+    return ', '.join(repr(row[column] if isinstance(row, dict) else row[0])
+                     for row in duplicated)
+
+
+def _check_unique_usernames(conn: Connection):
+    names = _duplicates(conn, "users", "username")
+    if names:
+        raise ApplicationError(
+            f"Cannot add unique username index, duplicated usernames: {names}. "
+            "Rename or delete them and restart.")
+
+
+def _check_unique_gids(conn: Connection):
+    gids = _duplicates(conn, "groups", "gid")
+    if gids:
+        raise ApplicationError(
+            f"Cannot add unique gid index, duplicated gids: {gids}. "
+            "Renumber or delete those groups and restart.")
+
+
+Migration = tuple[str | Callable[[Connection], None], ...]
+
+# Applied in order, index + 1 is stored as `pragma user_version` once applied.
+# Never edit an applied migration, append a new one.
+MIGRATIONS: list[Migration] = [
+    (
+        "create table if not exists users ("
+        "username text not null, "
+        "password text not null, "
+        "picture text not null default '', "
+        "groups text not null default '')",
+        "create table if not exists groups ("
+        "gid integer not null, "
+        "name text not null)",
+    ),
+    (
+        _check_unique_usernames,
+        "create unique index if not exists users_username on users (username)",
+        _check_unique_gids,
+        "create unique index if not exists groups_gid on groups (gid)",
+    ),
+    (
+        # File metadata index, see `file_index`. mtime in whole seconds.
+        "create table if not exists files ("
+        "parent text not null, "
+        "name text not null, "
+        "is_dir integer not null, "
+        "is_link integer not null, "
+        "size integer not null, "
+        "mtime integer not null, "
+        "primary key (parent, name)) without rowid",
+        "create index if not exists files_parent_name on files (parent, is_dir desc, name)",
+        "create index if not exists files_parent_size on files (parent, is_dir desc, size)",
+        "create index if not exists files_parent_mtime on files (parent, is_dir desc, mtime)",
+        "create index if not exists files_name on files (name)",
+        "create table if not exists file_dirs ("
+        "path text primary key, "
+        "mtime_ns integer not null) without rowid",
+    ),
+]
+
+
+def schema_version(conn: Connection) -> int:
+    """Return applied migration count"""
+    row = conn.execute("pragma user_version").fetchone()
+    return row['user_version'] if isinstance(row, dict) else row[0]
+
+
+def migrate(conn: Connection) -> int:
+    """Apply pending migrations, each in its own transaction. Transactions are
+    begun explicitly: in its default mode sqlite3 doesn't open one for DDL, so a
+    failing migration would leave earlier statements applied.
+
+    Returns:
+        int: Schema version after migrating
+    """
+    version = schema_version(conn)
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for number, steps in enumerate(MIGRATIONS[version:], version + 1):
+            conn.execute("begin immediate")
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"pragma user_version = {number}")
+            except BaseException:
+                conn.execute("rollback")
+                raise
+            conn.execute("commit")
+    finally:
+        conn.isolation_level = isolation_level
+    return schema_version(conn)
+
+
+def init_app(_app: Flask):
+    """Create tables, constraints and indexes when configured database is first
+    connected to. This function should be registered in `bootstrap.register`"""
+    database.on_first_connect(migrate)
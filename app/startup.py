@@ -0,0 +1,63 @@
+"""Bootstrap steps of the server app, shared by server.py and the benchmarks"""
+
+try:
+    from app import register_login
+    from app.assets import build_assets, init_app as init_assets
+    from app.async_database import init_app as init_async_database
+    from app.bootstrap import register
+    from app.hashing import init_app as init_hashing
+    from app.json_provider import init_app as init_json
+    from app.cli import register_cli
+    from app.files import init_app as init_files
+    from app.file_index import init_app as init_file_index
+    from app.metrics import install as install_metrics
+    from app.page_cache import init_app as init_page_cache
+    from app.profiler import install as install_profiler
+    from app.schema import init_app as init_schema
+    from app.templating import init_app as init_templates
+    from app.throttle import init_app as init_throttle
+    from app.write_behind import init_app as init_write_behind
+    from app.route import Route
+    from app.api_route import Route as ApiRoute
+except ImportError:
+    from . import register_login
+    from .assets import build_assets, init_app as init_assets
+    from .async_database import init_app as init_async_database
+    from .bootstrap import register
+    from .hashing import init_app as init_hashing
+    from .json_provider import init_app as init_json
+    from .cli import register_cli
+    from .files import init_app as init_files
+    from .file_index import init_app as init_file_index
+    from .metrics import install as install_metrics
+    from .page_cache import init_app as init_page_cache
+    from .profiler import install as install_profiler
+    from .schema import init_app as init_schema
+    from .templating import init_app as init_templates
+    from .throttle import init_app as init_throttle
+    from .write_behind import init_app as init_write_behind
+    from .route import Route
+    from .api_route import Route as ApiRoute
+
+
+def register_all():
+    """Register every bootstrap step of the app, `bootstrap(app)` then runs them"""
+    register(init_schema)
+    register(register_login)
+    register(init_throttle)
+    register(init_json)
+    register(init_async_database)
+    register(init_write_behind)
+    register(init_hashing, parallel=True)
+    register(register_cli)
+    register(install_metrics)
+    register(install_profiler)
+    register(init_page_cache)
+    register(build_assets, parallel=True)
+    register(init_assets)
+    register(init_files)
+    register(init_file_index, depends=[init_files])
+    register(Route.init_app)
+    register(ApiRoute.init_app)
+    # Compiles every template, needs all blueprints and template filters in place
+    register(init_templates, depends=[ApiRoute.init_app], parallel=True)
@@ -0,0 +1,42 @@
+"""Template loading"""
+from os import makedirs
+from os.path import join
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+
+
+def warm_up(app: Flask) -> list[str]:
+    """Compile every template now instead of on its first render.
+
+    Returns:
+        list[str]: Names of compiled templates
+    """
+    names = app.jinja_env.list_templates(extensions=[ext[1:] for ext in TEMPLATE_EXTENSIONS])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+def init_app(app: Flask):
+    """Configure template caching and precompile templates. This function should be
+    registered in `bootstrap.register`
+
+    Config:
+        TEMPLATE_CACHE_DIR: on-disk bytecode cache directory, defaults to
+            `<instance path>/jinja-cache`. Empty string disables it.
+        TEMPLATES_AUTO_RELOAD: check templates for changes on every render.
+            Defaults to debug mode, set to false in production.
+        TEMPLATE_WARM_UP: precompile every template at startup. Defaults to true.
+    """
+    env = app.jinja_env
+    cache_dir = app.config.get("TEMPLATE_CACHE_DIR", join(app.instance_path, "jinja-cache"))
+    if cache_dir:
+        makedirs(cache_dir, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    auto_reload = app.config.get("TEMPLATES_AUTO_RELOAD")
+    env.auto_reload = app.debug if auto_reload is None else bool(auto_reload)
+    if app.config.get("TEMPLATE_WARM_UP", True):
+        warm_up(app)
@@ -0,0 +1,217 @@
+"""Login throttling"""
+from functools import wraps
+from threading import Lock
+from time import time
+from typing import Any, Protocol
+
+from flask import Flask, flash, render_template, request
+
+try:
+    from app.database_loader import ConnectionManager
+    from app.utils import LazyModule
+except ImportError:
+    from .database_loader import ConnectionManager
+    from .utils import LazyModule
+
+forms = LazyModule(".forms", __package__)
+
+SHARDS = 16
+# Per shard, full buckets are dropped past this many keys
+MAX_KEYS = 4096
+
+
+class Buckets(Protocol):
+    """Token bucket store"""
+
+    def take(self, key: str) -> float:
+        """Take a token for key. Returns 0 when allowed, otherwise seconds until
+        a token is available."""
+
+    def refund(self, key: str):
+        """Give back a token taken for key"""
+
+
+class TokenBuckets:
+    """In-process token buckets, sharded by key hash with one lock per shard so
+    concurrent logins rarely wait on each other.
+
+    Args:
+        capacity (float): Burst size, tokens a new key starts with
+        rate (float): Tokens regained per second
+        shards (int, optional): Lock stripes. Defaults to SHARDS.
+    """
+
+    def __init__(self, capacity: float, rate: float, shards: int = SHARDS) -> None:
+        self.capacity = capacity
+        self.rate = rate
+        # key -> [tokens, updated]
+        self._shards: list[dict[str, list[float]]] = [{} for _ in range(shards)]
+        self._locks = [Lock() for _ in range(shards)]
+
+    def _prune(self, shard: dict[str, list[float]], now: float):
+        full = [key for key, (tokens, updated) in shard.items()
+                if tokens + (now - updated) * self.rate >= self.capacity]
+        for key in full:
+            del shard[key]
+        # still flooded with fresh keys: forget oldest ones
+        for key in list(shard)[:max(0, len(shard) - MAX_KEYS // 2)]:
+            del shard[key]
+
+    def take(self, key: str) -> float:
+        """See `Buckets.take`"""
+        index = hash(key) % len(self._shards)
+        shard = self._shards[index]
+        now = time()
+        with self._locks[index]:
+            bucket = shard.get(key)
+            if bucket is None:
+                if len(shard) >= MAX_KEYS:
+                    self._prune(shard, now)
+                bucket = shard[key] = [self.capacity, now]
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / self.rate
+
+    def refund(self, key: str):
+        """See `Buckets.refund`"""
+        index = hash(key) % len(self._shards)
+        with self._locks[index]:
+            bucket = self._shards[index].get(key)
+            if bucket is not None:
+                bucket[0] = min(self.capacity, bucket[0] + 1)
+
+
+class SQLiteTokenBuckets:
+    """Token buckets in a SQLite file, shared by every process using the same file
+    (i.e. preforked workers). One statement per take, no read-modify-write race.
+
+    Args:
+        manager (ConnectionManager): Connections to the shared file
+        name (str): Bucket set name, several sets can share a file
+        capacity (float): Burst size
+        rate (float): Tokens regained per second
+    """
+
+    def __init__(self, manager: ConnectionManager, name: str, capacity: float,
+                 rate: float) -> None:
+        self.manager = manager
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        manager.on_first_connect(_create_table)
+
+    def take(self, key: str) -> float:
+        """See `Buckets.take`"""
+        conn = self.manager.connection
+        with conn:
+            row = conn.execute(
+                "insert into throttle (key, tokens, updated, allowed) "
+                "values (:key, :capacity - 1, :now, 1) "
+                "on conflict (key) do update set "
+                "allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1, "
+                "tokens = min(:capacity, tokens + (:now - updated) * :rate) "
+                "- (min(:capacity, tokens + (:now - updated) * :rate) >= 1), "
+                "updated = :now "
+                "returning tokens, allowed",
+                {'key': f"{self.name}:{key}", 'capacity': self.capacity,
+                 'now': time(), 'rate': self.rate}).fetchone()
+        if isinstance(row, dict):
+            row = (row['tokens'], row['allowed'])
+        tokens, allowed = row
+        return 0.0 if allowed else (1 - tokens) / self.rate
+
+    def refund(self, key: str):
+        """See `Buckets.refund`"""
+        conn = self.manager.connection
+        with conn:
+            conn.execute("update throttle set tokens = min(?, tokens + 1) where key = ?",
+                         (self.capacity, f"{self.name}:{key}"))
+
+
+def _create_table(conn: Any):
+    with conn:
+        conn.execute("create table if not exists throttle ("
+                     "key text primary key, "
+                     "tokens real not null, "
+                     "updated real not null, "
+                     "allowed integer not null) without rowid")
+
+
+class LoginThrottle:
+    """Limit failed login attempts per username and per client address. Every
+    attempt takes a token up front, successful ones give theirs back."""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.by_user: Buckets = TokenBuckets(5, 5 / 60)
+        self.by_address: Buckets = TokenBuckets(20, 30 / 60)
+
+    def check(self, username: str, address: str) -> float:
+        """Take a token for this attempt. Returns 0 when allowed, otherwise
+        seconds to wait."""
+        if not self.enabled:
+            return 0.0
+        wait = self.by_address.take(address)
+        if wait:
+            return wait
+        return self.by_user.take(username)
+
+    def succeeded(self, username: str, address: str):
+        """Give back the tokens a successful attempt took"""
+        if not self.enabled:
+            return
+        self.by_address.refund(address)
+        self.by_user.refund(username)
+
+
+login_throttle = LoginThrottle()
+
+
+def throttled(func):
+    """Reject POSTs over the login limits with 429, before the view runs any
+    database lookup or password hashing. The view calls
+    `login_throttle.succeeded` once a login went through."""
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any):
+        if request.method != "POST":
+            return func(*args, **kwargs)
+        wait = login_throttle.check(request.form.get('username', ''),
+                                    request.remote_addr or '')
+        if not wait:
+            return func(*args, **kwargs)
+        flash("Too many login attempts, try again later.", 'error')
+        response = render_template("login.html", form=forms.LoginForm())
+        return response, 429, {'Retry-After': str(int(wait) + 1)}
+    return wrapper
+
+
+def init_app(app: Flask):
+    """Configure login throttling. This function should be registered in
+    `bootstrap.register`
+
+    Config:
+        LOGIN_THROTTLE: enable throttling, defaults to true
+        LOGIN_THROTTLE_USER: (burst, per minute) attempts per username, defaults to (5, 5)
+        LOGIN_THROTTLE_ADDRESS: (burst, per minute) attempts per client address,
+            defaults to (20, 30)
+        LOGIN_THROTTLE_DATABASE: SQLite file shared by all workers. Defaults to
+            none, each process then keeps its own counters.
+    """
+    login_throttle.enabled = app.config.get("LOGIN_THROTTLE", True)
+    user_burst, user_rate = app.config.get("LOGIN_THROTTLE_USER", (5, 5))
+    address_burst, address_rate = app.config.get("LOGIN_THROTTLE_ADDRESS", (20, 30))
+    shared = app.config.get("LOGIN_THROTTLE_DATABASE")
+    if shared:
+        manager = ConnectionManager(shared)
+        login_throttle.by_user = SQLiteTokenBuckets(manager, "user", user_burst,
+                                                    user_rate / 60)
+        login_throttle.by_address = SQLiteTokenBuckets(manager, "address", address_burst,
+                                                       address_rate / 60)
+    else:
+        login_throttle.by_user = TokenBuckets(user_burst, user_rate / 60)
+        login_throttle.by_address = TokenBuckets(address_burst, address_rate / 60)
@@ -1,6 +1,6 @@
 """utils"""
 from datetime import datetime
-from functools import wraps
+from importlib import import_module
 from platform import python_version, system as osname_f
 from platform import version as osversion_f
 from traceback import format_exception
@@ -9,6 +9,11 @@ from typing import Any, Callable, Iterable, TextIO, Type
 
 from tomllib import loads as _load
 
+try:
+    from app.cache import cached
+except ImportError:
+    from .cache import cached
+
 PROJECT_VERSION = "0.0.2"
 
 EXC_FORMAT = """
@@ -25,22 +30,31 @@ def load(file: "TextIO", **kwargs) -> 'dict[str, Any]':
     return _load(file.read(), **kwargs)
 
 
-def usage_cache(used=10):
-    """Usage function"""
-    data = {}
+def usage_cache(used=10, **kwargs):
+    """Cache function results per arguments, recomputing after `used` calls.
+
+    Extra keyword arguments are passed to `cache.cached`."""
+    return cached(uses=used, **kwargs)
+
 
-    def wrapper0(func):
-        @wraps(func)  # type: ignore
-        def wrapper(*args, **kwargs):
-            if data.get(func, None) is None:
-                data[func] = [func(*args, **kwargs), used]
-                return data[func][0]
-            if data[func][1] == 0:
-                data[func] = [func(*args, **kwargs), used]
-                return data[func][0]
-            return data[func][0]
-        return wrapper
-    return wrapper0
+class LazyModule:
+    """Module proxy importing the module on first attribute access, used to keep
+    heavy imports (i.e. WTForms) off startup."""
+
+    def __init__(self, name: str, package: str | None = None) -> None:
+        self._name = name
+        self._package = package
+        self._module = None
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._module is None:
+            self._module = import_module(self._name, self._package)
+        return getattr(self._module, name)
+
+    def __repr__(self) -> str:
+        return f"LazyModule({self._name!r})"
 
 
 class CallAwait:
@@ -56,17 +70,21 @@ class CallAwait:
         return "CallAwait"
 
 
-def has_common_item(list1: Iterable[Any], list2: Iterable[Any]) -> bool:
-    """Are some iterable have common item?
+NO_ROLES: frozenset[str] = frozenset()
+
+
+def parse_roles(groups: str | None) -> frozenset[str]:
+    """Parse comma-separated groups string into a set of role names
 
     Args:
-        list1 (Iterable[Any]): Iterable 1
-        list2 (Iterable[Any]): Iterable 2
+        groups (str | None): Groups, as stored in users table ("root,admin")
 
     Returns:
-        bool: True if both array has common item.
+        frozenset[str]: Role names, empty names are dropped.
     """
-    return any(item in list2 for item in list1)
+    if not groups:
+        return NO_ROLES
+    return frozenset(role.strip() for role in groups.split(',') if role.strip())
 
 # Bootstrap related
 
@@ -92,9 +110,21 @@ def save_to_file_error(filename: str,
         return file.write(EXC_FORMAT.format(header=header, content=content, footer=footer))
 
 
+def format_timings(timings: Iterable[tuple[str, float, bool]], wall: float | None = None) -> str:
+    """Format (step name, seconds, parallel) timings, slowest first"""
+    timings = sorted(timings, key=lambda timing: timing[1], reverse=True)
+    total = sum(timing[1] for timing in timings) * 1000
+    wall_ms = total if wall is None else wall * 1000
+    lines = [f"Bootstrap took {wall_ms:.1f} ms wall, {total:.1f} ms in steps"]
+    for name, seconds, parallel in timings:
+        lines.append(f"{seconds * 1000:10.1f} ms  {'parallel' if parallel else 'serial  '}  {name}")
+    return "\n".join(lines)
+
+
 def save_exc_groups(filename: str,
-                    exc: BaseExceptionGroup):
-    """Save all errors to file"""
+                    exc: BaseExceptionGroup | None,
+                    timings: str | None = None):
+    """Save all errors, and bootstrap timings when given, to file"""
     bwrites = 0
     with open(filename, 'w', encoding='utf-8') as file:
         file.write(f"""\
@@ -105,9 +135,15 @@ System Version   : {osversion_f()}
 Python Version   : Python{python_version()}
 RimuStuff Version: {PROJECT_VERSION}""")
 
+        if timings:
+            bwrites += file.write(EXC_FORMAT.format(header=f"{' timings ':=^25}",
+                                                    content=timings, footer=f"{'':=>25}"))
+        if exc is None:
+            return bwrites
         header = f"{'':=^25}"
         content = save_traceback(
         type(exc), exc, exc.__traceback__)  # type: ignore
         footer = f"{'':=>25}"
         bwrites += file.write(EXC_FORMAT.format(header=header,
                               content=content, footer=footer))
+    return bwrites
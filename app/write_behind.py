@@ -0,0 +1,194 @@
+"""Write-behind queue for model writes"""
+from atexit import register as atexit_register
+from sqlite3 import IntegrityError
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import Any
+from warnings import warn
+
+from flask import Flask
+
+try:
+    from app.database_loader import ConnectionManager, database
+except ImportError:
+    from .database_loader import ConnectionManager, database
+
+# (table, key column, key value); None values mean delete
+RowKey = tuple[str, str, Any]
+
+MAX_PENDING = 1000
+INTERVAL = 1.0
+# Returned by `WriteBehind.pending` for rows without queued writes
+MISSING: Any = object()
+
+
+class WriteBehind:  # pylint: disable=too-many-instance-attributes
+    """Queue row updates and deletes, writing them in batched transactions from a
+    background thread.
+
+    Writes to the same row coalesce: the last one queued, update or delete, is
+    written. A batch is flushed once max_pending rows are queued or interval
+    seconds passed since the first of them, and on `flush`/`stop` (registered at
+    exit). Writes bypassing the queue must `settle` the row first.
+
+    Args:
+        manager (ConnectionManager): Database written to
+        max_pending (int, optional): Queued rows that trigger a flush. Defaults to MAX_PENDING.
+        interval (float, optional): Seconds a write may wait. Defaults to INTERVAL.
+    """
+
+    def __init__(self, manager: ConnectionManager, max_pending: int = MAX_PENDING,
+                 interval: float = INTERVAL) -> None:
+        self.manager = manager
+        self.enabled = False
+        self.max_pending = max_pending
+        self.interval = interval
+        self.commits = 0
+        self._pending: dict[RowKey, dict[str, Any] | None] = {}
+        self._oldest = 0.0
+        self._changed = Condition()
+        # Held while writing, so `settle` can't overtake a flush in progress
+        self._writing = Lock()
+        self._thread: Thread | None = None
+
+    def _queue(self, row: RowKey, values: dict[str, Any] | None):
+        with self._changed:
+            if not self._pending:
+                self._oldest = monotonic()
+                self._changed.notify()
+            self._pending[row] = values
+            if len(self._pending) >= self.max_pending:
+                self._changed.notify()
+        if self._thread is None:
+            self.start()
+
+    def update(self, table: str, key: str, value: Any, values: dict[str, Any]):
+        """Queue `update table set values where key = value`"""
+        self._queue((table, key, value), dict(values))
+
+    def delete(self, table: str, key: str, value: Any):
+        """Queue `delete from table where key = value`"""
+        self._queue((table, key, value), None)
+
+    def pending(self, table: str, key: str, value: Any) -> Any:
+        """Queued values of a row, None if its deletion is queued, `MISSING`
+        without queued writes"""
+        with self._changed:
+            return self._pending.get((table, key, value), MISSING)
+
+    def settle(self, table: str, key: str, value: Any):
+        """Write a row's queued change now, before the caller writes the row
+        directly (i.e. inserts a username whose delete is queued)"""
+        row = (table, key, value)
+        with self._writing:
+            with self._changed:
+                if row not in self._pending:
+                    return
+                values = self._pending.pop(row)
+            try:
+                self._write({row: values})
+            except BaseException:
+                with self._changed:
+                    self._pending.setdefault(row, values)
+                raise
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _write(self, batch: dict[RowKey, dict[str, Any] | None]):
+        conn = self.manager.connection
+        with conn:
+            for (table, key, value), values in batch.items():
+                if values is None:
+                    conn.execute(f'delete from "{table}" where "{key}" = ?', (value,))
+                    continue
+                assignments = ', '.join(f'"{column}" = ?' for column in values)
+                conn.execute(f'update "{table}" set {assignments} where "{key}" = ?',
+                             (*values.values(), value))
+        self.commits += 1
+
+    def flush(self) -> int:
+        """Write every queued row in one transaction on the calling thread.
+        Returns number of rows written."""
+        with self._writing:
+            with self._changed:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except IntegrityError:
+                # One bad row must not hold back the rest: write rows one by one,
+                # dropping those that still fail
+                for row, values in batch.items():
+                    try:
+                        self._write({row: values})
+                    except IntegrityError as exc:
+                        warn(f"Write-behind dropped write to {row!r}: {exc!r}")
+            except BaseException:
+                # Put the batch back behind anything queued meanwhile, newer values win
+                with self._changed:
+                    self._pending = batch | self._pending
+                raise
+        return len(batch)
+
+    def _run(self):
+        try:
+            while True:
+                with self._changed:
+                    while self._thread is not None and len(self._pending) < self.max_pending:
+                        if not self._pending:
+                            self._changed.wait()
+                            continue
+                        left = self._oldest + self.interval - monotonic()
+                        if left <= 0:
+                            break
+                        self._changed.wait(left)
+                    stopping = self._thread is None
+                try:
+                    self.flush()
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    warn(f"Write-behind flush failed, retrying: {exc!r}")
+                    if not stopping:
+                        with self._changed:
+                            self._changed.wait(self.interval)
+                if stopping:
+                    return
+        finally:
+            self.manager.close()
+
+    def start(self):
+        """Start background flushing in this process, done on first queued write"""
+        with self._changed:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop background flushing and write what is still queued"""
+        with self._changed:
+            thread, self._thread = self._thread, None
+            self._changed.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+
+write_behind = WriteBehind(database)
+atexit_register(write_behind.stop)
+
+
+def init_app(app: Flask):
+    """Configure write-behind of model saves and deletes. This function should be
+    registered in `bootstrap.register`
+
+    Config:
+        WRITE_BEHIND: queue `BaseModel.save`/`destroy` instead of writing at once,
+            defaults to false
+        WRITE_BEHIND_MAX_PENDING: queued rows that trigger a flush
+        WRITE_BEHIND_INTERVAL: seconds a queued write may wait
+    """
+    write_behind.stop()
+    write_behind.enabled = app.config.get("WRITE_BEHIND", False)
+    write_behind.max_pending = app.config.get("WRITE_BEHIND_MAX_PENDING", MAX_PENDING)
+    write_behind.interval = app.config.get("WRITE_BEHIND_INTERVAL", INTERVAL)
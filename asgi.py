@@ -0,0 +1,15 @@
+"""ASGI entry point, i.e. `uvicorn asgi:application`
+
+The ASGI server holds connections on its event loop, a pool thread is only taken
+while a request is inside the app (up to `ASGI_THREADS` at once). Request bodies
+are read before that, so slow clients and idle keep-alive connections cost no
+thread. Async views run on the request's thread, their database calls on
+`async_database.executor`."""
+try:
+    from app.asgi import THREADS, ThreadedWsgiToAsgi
+    from server import app
+except ImportError:
+    from .app.asgi import THREADS, ThreadedWsgiToAsgi
+    from .server import app
+
+application = ThreadedWsgiToAsgi(app, app.config.get('ASGI_THREADS', THREADS))
@@ -0,0 +1,38 @@
+"""Production server: preforked workers, see `app.prefork`
+
+    python serve.py [--bind HOST:PORT] [--workers N] [--max-requests N]
+
+`kill -HUP <pid>` reloads code and config without dropping connections."""
+from argparse import ArgumentParser
+from logging import INFO, basicConfig
+
+try:
+    from app.prefork import Arbiter, Options, parse_bind
+except ImportError:
+    from .app.prefork import Arbiter, Options, parse_bind
+
+
+def main():
+    """Parse arguments, bootstrap app and run the master process"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bind", help="HOST:PORT, defaults to PREFORK_BIND")
+    parser.add_argument("--workers", type=int, help="defaults to one per core")
+    parser.add_argument("--max-requests", type=int,
+                        help="recycle workers after this many requests")
+    args = parser.parse_args()
+    basicConfig(level=INFO, format="[%(process)d] %(levelname)s %(message)s")
+
+    # Bootstraps the app (templates included) here, before workers are forked
+    try:
+        from server import app  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        from .server import app  # pylint: disable=import-outside-toplevel
+
+    overrides = {'workers': args.workers, 'max_requests': args.max_requests}
+    if args.bind:
+        overrides['host'], overrides['port'] = parse_bind(args.bind)
+    Arbiter(app, Options.from_config(app, **overrides)).run()
+
+
+if __name__ == '__main__':
+    main()
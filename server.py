@@ -1,21 +1,16 @@
 """Server program"""
 
 try:
-    from app import create_app, register_login
-    from app.bootstrap import bootstrap, register
-    from app.route import Route
-    from app.api_route import Route as ApiRoute
+    from app import create_app
+    from app.bootstrap import bootstrap
+    from app.startup import register_all
 except ImportError:
-    from .app import create_app, register_login
-    from .app.bootstrap import bootstrap, register
-    from .app.route import Route
-    from .app.api_route import Route as ApiRoute
+    from .app import create_app
+    from .app.bootstrap import bootstrap
+    from .app.startup import register_all
 
 app = create_app()
-
-register(register_login)
-register(Route.init_app)
-register(ApiRoute.init_app)
+register_all()
 bootstrap(app)
 
 if __name__ == '__main__':
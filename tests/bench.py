@@ -0,0 +1,214 @@
+"""Micro-benchmarks for request hot paths.
+
+Builds the app with `create_app()` against a temporary SQLite database seeded
+with N users and prints timings as JSON, so runs can be compared across commits:
+
+    python -m tests.bench --users 10000 --output bench.json
+"""
+# pylint: disable=import-outside-toplevel
+from argparse import ArgumentParser
+from json import dumps
+from pathlib import Path
+from platform import python_version
+from sqlite3 import connect
+from statistics import mean, median
+from subprocess import DEVNULL, run
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys_path:
+    sys_path.insert(0, str(ROOT))
+PASSWORD = "benchmark-password"
+ADMIN = "admin"
+
+
+def timeit(func: Callable[[], Any], number: int, repeat: int = 5) -> dict[str, float]:
+    """Run func number times per round, return per-call statistics in microseconds"""
+    func()  # warm-up
+    rounds = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((perf_counter() - start) / number * 1e6)
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min_us': round(min(rounds), 3),
+        'median_us': round(median(rounds), 3),
+        'mean_us': round(mean(rounds), 3)
+    }
+
+
+def seed(path: str, users: int, pwhash: str):
+    """Create users/groups tables and insert users, first one being admin"""
+    conn = connect(path)
+    with conn:
+        conn.execute("create table if not exists users "
+                     "(username text, password text, picture text, groups text)")
+        conn.execute("create table if not exists groups (gid integer, name text)")
+        conn.executemany("insert into groups values (?, ?)", [(0, 'root'), (999, 'moderator')])
+        conn.execute("insert into users values (?, ?, '', 'root')", (ADMIN, pwhash))
+        conn.executemany("insert into users values (?, ?, '', '')",
+                         ((f"user{i}", pwhash) for i in range(1, users)))
+    conn.close()
+
+
+def git_revision() -> str | None:
+    """Current commit, if available"""
+    proc = run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+               text=True, check=False, stdin=DEVNULL)
+    return proc.stdout.strip() or None
+
+
+def build_app(path: str, config: dict[str, Any] | None = None):
+    """Create and bootstrap app the same way server.py does, config overrides
+    benchmark defaults"""
+    try:
+        from app import create_app
+        from app.bootstrap import bootstrap, clear
+        from app.startup import register_all
+    except ImportError:
+        from ..app import create_app
+        from ..app.bootstrap import bootstrap, clear
+        from ..app.startup import register_all
+
+    app = create_app({
+        'DATABASE': path,
+        'SECRET_KEY': 'benchmark',
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+        'PASSWORD_HASH_WORKERS': 0,
+        'TEMPLATE_CACHE_DIR': str(Path(path).parent / "jinja-cache"),
+        'ASSETS_OUTPUT': str(Path(path).parent / "assets"),
+        'FILES_ROOT': str(Path(path).parent / "files"),
+        **(config or {})
+    })
+    # Registrations of a previous build would run again
+    clear()
+    register_all()
+    bootstrap(app)
+    return app
+
+
+def run_benchmarks(users: int, number: int) -> dict[str, Any]:  # pylint: disable=too-many-locals,too-many-statements
+    """Seed a temporary database, build app and time every hot path"""
+    from flask import render_template
+    from flask_login import login_user
+    from werkzeug.security import generate_password_hash
+
+    results: dict[str, Any] = {}
+    with TemporaryDirectory() as tmp:
+        path = str(Path(tmp, "bench.db"))
+        start = perf_counter()
+        seed(path, users, generate_password_hash(PASSWORD))
+        results['seed'] = {'users': users, 'seconds': round(perf_counter() - start, 3)}
+        try:
+            try:
+                from app import login_manager
+                from app.flask_utils import role_required
+                from app.hashing import hasher
+                from app.json_provider import encode
+                from app.model.user import UserInterface, UserModel
+                from app.write_behind import write_behind
+            except ImportError:
+                from ..app import login_manager
+                from ..app.flask_utils import role_required
+                from ..app.hashing import hasher
+                from ..app.json_provider import encode
+                from ..app.model.user import UserInterface, UserModel
+                from ..app.write_behind import write_behind
+
+            app = build_app(path)
+            stored = UserModel.load(ADMIN).password
+            target = f"user{users // 2}" if users > 1 else ADMIN
+
+            def user_loader_cold():
+                UserModel.forget(target)
+                login_manager._user_callback(target)  # pylint: disable=protected-access
+
+            results['user_loader_cold'] = timeit(user_loader_cold, number)
+            results['user_loader_warm'] = timeit(
+                lambda: login_manager._user_callback(target), number)  # pylint: disable=protected-access
+
+            guarded = role_required("moderator")(lambda: None)
+            is_admin = app.jinja_env.globals['is_admin']
+            with app.test_request_context("/"):
+                login_user(UserInterface.get(ADMIN))
+                results['role_required'] = timeit(guarded, number * 10)
+                results['is_admin'] = timeit(is_admin, number * 10)
+                results['render_root'] = timeit(lambda: render_template("root.html"), number)
+
+            results['login_hash_verify'] = timeit(
+                lambda: hasher.verify(stored, PASSWORD), max(1, number // 100), 3)
+
+            client = app.test_client()
+            counter = iter(range(10 ** 9))
+
+            def register_user():
+                client.post("/register", data={
+                    'username': f"bench{next(counter)}",
+                    'password': PASSWORD,
+                    'confirm_password': PASSWORD
+                })
+
+            results['register_insert'] = timeit(register_user, max(1, number // 100), 3)
+            results['api_root'] = timeit(lambda: client.get("/api/"), number)
+
+            client.post("/login", data={'username': ADMIN, 'password': PASSWORD})
+            results['e2e_root'] = timeit(lambda: client.get("/"), number)
+            results['e2e_api_users'] = timeit(lambda: client.get("/api/users"), number)
+            results['e2e_api_users_ndjson'] = timeit(
+                lambda: client.get("/api/users.ndjson").data, max(1, number // 20))
+            results['e2e_api_users_json_stream'] = timeit(
+                lambda: client.get("/api/users.json").data, max(1, number // 20))
+
+            model = UserModel.load(target)
+            results['model_save_immediate'] = timeit(model.save, number)
+            write_behind.enabled = True
+            results['model_save_write_behind'] = timeit(model.save, number)
+            write_behind.enabled = False
+            write_behind.stop()
+
+            page = [user.as_public() for user in UserModel.page(None, 500)]
+            results['json_encode_page_stdlib'] = timeit(lambda: dumps(page), number)
+            results['json_encode_page_fast'] = timeit(lambda: encode(page), number)
+        finally:
+            try:
+                from app.database_loader import database
+            except ImportError:
+                from ..app.database_loader import database
+            database.close_all()
+    return results
+
+
+def write_report(report: dict[str, Any], output: str | None):
+    """Write report as JSON to output file, or stdout"""
+    data = dumps(report, indent=2)
+    if output:
+        Path(output).write_text(data + "\n", encoding='utf-8')
+    else:
+        print(data)
+
+
+def main(argv: list[str] | None = None):
+    """Entry point"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="Seeded users")
+    parser.add_argument("--number", type=int, default=200, help="Calls per round")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        'revision': git_revision(),
+        'python': python_version(),
+        'results': run_benchmarks(args.users, args.number)
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
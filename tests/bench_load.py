@@ -0,0 +1,307 @@
+"""Load test: many concurrent users against a running app.
+
+Seeds a temporary database, serves the app on a local port and drives user
+scenarios from concurrent workers for a while, then reports throughput and
+latency percentiles per endpoint, with error rates, as JSON:
+
+    python -m tests.bench_load --concurrency 50 --duration 30 --mix visitor=1,admin=1,api=4
+
+`--mode thread` serves from a thread of this process (simple, but clients and
+server share one GIL), `--mode prefork` from `app.prefork` workers in a child
+process, closer to production.
+"""
+# pylint: disable=import-outside-toplevel
+from argparse import ArgumentParser
+from http.client import HTTPConnection, HTTPException
+from http.cookies import SimpleCookie
+from math import ceil
+from pathlib import Path
+from platform import python_version
+from random import Random
+from signal import SIGTERM
+from socket import create_connection, socket
+from subprocess import DEVNULL, Popen
+from sys import executable
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import monotonic, perf_counter, sleep
+from typing import Any, Callable, Iterable
+from urllib.parse import urlencode
+
+try:
+    from tests.bench import ADMIN, PASSWORD, build_app, git_revision, seed, write_report
+except ImportError:
+    from .bench import ADMIN, PASSWORD, build_app, git_revision, seed, write_report
+
+ROOT = Path(__file__).resolve().parent.parent
+HOST = "127.0.0.1"
+# Throttling would turn most logins from one address into 429s
+CONFIG = {'LOGIN_THROTTLE': False}
+
+# Runs in a child process for --mode prefork
+SERVER = """
+import tests.bench as bench
+from tests.bench_load import CONFIG
+from app.prefork import Arbiter, Options
+app = bench.build_app({path!r}, CONFIG)
+Arbiter(app, Options({host!r}, {port}, {workers})).run()
+"""
+
+
+class Client:
+    """One virtual user: a connection, cookies and recorded samples. Prefork
+    workers keep it alive between requests, the `--mode thread` server closes it
+    after each response, so there latencies include reconnecting."""
+
+    def __init__(self, port: int, seeded: int, seed_: int) -> None:
+        self.port = port
+        self.seeded = seeded
+        self.rng = Random(seed_)
+        self.conn = HTTPConnection(HOST, port, timeout=30)
+        self.cookies: dict[str, str] = {}
+        # label -> [(milliseconds, status)], status 0 when the request failed
+        self.samples: dict[str, list[tuple[float, int]]] = {}
+
+    def request(self, method: str, path: str, label: str | None = None,
+                form: dict[str, str] | None = None) -> int:
+        """Send a request without following redirects, return its status"""
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{key}={value}" for key, value in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = "application/x-www-form-urlencoded"
+        start = perf_counter()
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            response.read()
+            status = response.status
+            self._store_cookies(response.headers.get_all('Set-Cookie') or ())
+        except (OSError, HTTPException):
+            self.conn.close()
+            status = 0
+        elapsed = (perf_counter() - start) * 1000
+        self.samples.setdefault(label or f"{method} {path}", []).append((elapsed, status))
+        return status
+
+    def _store_cookies(self, headers: Iterable[str]):
+        for header in headers:
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                if not morsel.value or morsel['max-age'] == '0':
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+    def login(self, username: str, password: str = PASSWORD) -> int:
+        """Log in through the form"""
+        return self.request("POST", "/login", form={'username': username, 'password': password})
+
+
+def visitor(client: Client, ident: str):
+    """New user: register, log in, browse, log out"""
+    username = f"load{ident}"
+    client.request("POST", "/register", form={
+        'username': username, 'password': PASSWORD, 'confirm_password': PASSWORD})
+    client.login(username)
+    client.request("GET", "/")
+    client.request("GET", "/settings")
+    client.request("POST", "/logout")
+    client.cookies.clear()
+
+
+def admin(client: Client, _ident: str):
+    """Admin browsing internal pages"""
+    if 'session' not in client.cookies:
+        client.login(ADMIN)
+    for path in ("/internal", "/internal/caches", "/internal/metrics"):
+        client.request("GET", path)
+
+
+def api(client: Client, _ident: str):
+    """API client: public root, then user listing and lookups as admin"""
+    client.request("GET", "/api/")
+    if 'session' not in client.cookies:
+        client.login(ADMIN)
+    client.request("GET", "/api/users?limit=50", "GET /api/users")
+    user = f"user{client.rng.randrange(1, client.seeded)}" if client.seeded > 1 else ADMIN
+    client.request("GET", f"/api/users/{user}", "GET /api/users/<username>")
+
+
+SCENARIOS: dict[str, Callable[[Client, str], None]] = {
+    'visitor': visitor,
+    'admin': admin,
+    'api': api
+}
+
+
+def parse_mix(mix: str) -> list[str]:
+    """"visitor=1,api=3" -> scenario names, each repeated by its weight"""
+    names = []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        names.extend([name] * int(weight or 1))
+    return names
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    return ordered[max(0, ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples: list[tuple[float, int]], seconds: float) -> dict[str, Any]:
+    """Throughput, latency percentiles (ms) and error rate of samples. Errors are
+    failed requests and 4xx/5xx responses."""
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    errors = sum(1 for _, status in samples if not status or status >= 400)
+    statuses: dict[str, int] = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / seconds, 2),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4),
+        'statuses': statuses,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3)
+    }
+
+
+def drive(port: int, args: Any) -> tuple[list[Client], float]:
+    """Run every worker until the duration is over, return clients and elapsed seconds"""
+    names = parse_mix(args.mix)
+    clients = [Client(port, args.users, index) for index in range(args.concurrency)]
+    deadline = monotonic() + args.duration
+
+    def work(index: int):
+        client = clients[index]
+        scenario = SCENARIOS[names[index % len(names)]]
+        iteration = 0
+        while monotonic() < deadline:
+            scenario(client, f"{index}x{iteration}")
+            iteration += 1
+            if args.think_ms:
+                sleep(args.think_ms / 1000)
+        client.conn.close()
+
+    start = perf_counter()
+    threads = [Thread(target=work, args=(index,), daemon=True)
+               for index in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients, perf_counter() - start
+
+
+def serve_thread(path: str) -> tuple[int, Callable[[], None]]:
+    """Serve app from a thread of this process, return port and stop function"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        """Skip per-request logging"""
+
+        def log_request(self, *args: Any, **kwargs: Any):
+            pass
+
+    server = make_server(HOST, 0, build_app(path, CONFIG), threaded=True,
+                         request_handler=QuietHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server.port, server.shutdown
+
+
+def serve_prefork(path: str, workers: int) -> tuple[int, Callable[[], None]]:
+    """Serve app from preforked workers in a child process"""
+    with socket() as probe:
+        probe.bind((HOST, 0))
+        port = probe.getsockname()[1]
+    command = [executable, "-c", SERVER.format(path=path, host=HOST, port=port, workers=workers)]
+    proc = Popen(command, cwd=ROOT, stdout=DEVNULL, stderr=DEVNULL)  # pylint: disable=consider-using-with
+    deadline = monotonic() + 60
+    while True:
+        try:
+            create_connection((HOST, port), 1).close()
+            break
+        except OSError:
+            if proc.poll() is not None or monotonic() > deadline:
+                proc.kill()
+                raise RuntimeError("Prefork server did not start") from None
+            sleep(0.1)
+
+    def stop():
+        proc.send_signal(SIGTERM)
+        proc.wait(60)
+    return port, stop
+
+
+def run_load(args: Any) -> dict[str, Any]:
+    """Seed, serve, drive and summarize"""
+    from werkzeug.security import generate_password_hash
+
+    with TemporaryDirectory() as tmp:
+        path = str(Path(tmp, "load.db"))
+        seed(path, args.users, generate_password_hash(PASSWORD))
+        if args.mode == 'prefork':
+            port, stop = serve_prefork(path, args.workers)
+        else:
+            port, stop = serve_thread(path)
+        try:
+            clients, seconds = drive(port, args)
+        finally:
+            stop()
+            if args.mode == 'thread':
+                try:
+                    from app.database_loader import database
+                except ImportError:
+                    from ..app.database_loader import database
+                database.close_all()
+
+    merged: dict[str, list[tuple[float, int]]] = {}
+    for client in clients:
+        for label, samples in client.samples.items():
+            merged.setdefault(label, []).extend(samples)
+    return {
+        'seconds': round(seconds, 3),
+        'total': summarize([sample for samples in merged.values() for sample in samples],
+                           seconds) if merged else {},
+        'endpoints': {label: summarize(samples, seconds)
+                      for label, samples in sorted(merged.items())}
+    }
+
+
+def main(argv: list[str] | None = None):
+    """Entry point"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--mix", default="visitor=1,admin=1,api=4",
+                        help="Scenario weights, from: " + ', '.join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=1000, help="Seeded users")
+    parser.add_argument("--think-ms", type=float, default=0.0,
+                        help="Pause between scenario iterations")
+    parser.add_argument("--mode", choices=('thread', 'prefork'), default='thread')
+    parser.add_argument("--workers", type=int, default=4, help="Prefork worker processes")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    report = {
+        'revision': git_revision(),
+        'python': python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        **run_load(args)
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
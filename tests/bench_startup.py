@@ -0,0 +1,101 @@
+"""Startup-time benchmark with a budget.
+
+Measures, in fresh interpreters, how long importing the app, starting
+server.py (create and bootstrap) and serving the first request take. Exits
+with status 1 when the median import + bootstrap time exceeds the budget:
+
+    python -m tests.bench_startup --runs 5 --budget-ms 600
+"""
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import environ
+from pathlib import Path
+from statistics import median
+from subprocess import run
+from sys import executable, exit as sys_exit
+from tempfile import TemporaryDirectory
+
+try:
+    from tests.bench import write_report
+except ImportError:
+    from .bench import write_report
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_MS = 600.0
+
+# Files the server writes, kept in the run's directory
+PATHS = {
+    'DATABASE': "startup.db",
+    'PASSWORD_HASH_CALIBRATION_FILE': "password-hash.json",
+    'TEMPLATE_CACHE_DIR': "jinja-cache",
+    'ASSETS_OUTPUT': "assets",
+    'FILES_ROOT': "files",
+    'LOGIN_THROTTLE_DATABASE': "throttle.db"
+}
+
+# Runs in a fresh interpreter with APP_CONFIG set, prints one JSON line
+PROBE = """
+from time import perf_counter
+start = perf_counter()
+import app.startup
+imported = perf_counter()
+import server
+bootstrapped = perf_counter()
+from app.database_loader import database
+connections = database.opened
+server.app.test_client().get("/api/")
+first_request = perf_counter()
+import sys, json
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'bootstrap_ms': (bootstrapped - imported) * 1000,
+    'first_request_ms': (first_request - bootstrapped) * 1000,
+    'startup_ms': (bootstrapped - start) * 1000,
+    'db_connections_at_startup': connections,
+    'modules': len(sys.modules)
+}))
+"""
+
+
+def write_config(directory: str) -> str:
+    """Write config.toml for server.py into directory, return its path"""
+    config = {'SECRET_KEY': "benchmark",
+              **{key: str(Path(directory, name)) for key, name in PATHS.items()}}
+    lines = [f"{key} = {dumps(value)}" for key, value in config.items()]
+    path = Path(directory, "config.toml")
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+
+def probe(config: str) -> dict[str, float]:
+    """Run one cold start of server.py in a new interpreter"""
+    proc = run([executable, "-c", PROBE], cwd=ROOT, env={**environ, 'APP_CONFIG': config},
+               capture_output=True, text=True, check=True)
+    return loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None):
+    """Entry point"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS,
+                        help="Maximum median startup (import + bootstrap) time")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with TemporaryDirectory() as tmp:
+        config = write_config(tmp)
+        runs = [probe(config) for _ in range(args.runs)]
+    report = {
+        'budget_ms': args.budget_ms,
+        'runs': runs,
+        'median': {key: median(run_[key] for run_ in runs) for key in runs[0]}
+    }
+    report['within_budget'] = report['median']['startup_ms'] <= args.budget_ms
+    write_report(report, args.output)
+    if not report['within_budget']:
+        sys_exit(1)
+
+
+if __name__ == '__main__':
+    main()
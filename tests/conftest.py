@@ -0,0 +1,40 @@
+"""Shared fixtures"""
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from flask import Flask
+
+try:
+    from app.database_loader import database
+    from app.files import resolve, send_path
+    from app.schema import migrate
+except ImportError:
+    from ..app.database_loader import database
+    from ..app.files import resolve, send_path
+    from ..app.schema import migrate
+
+# Contents of data.bin served by `files_app`
+FILE_DATA = bytes(range(256)) * 4
+
+
+@pytest.fixture(name="database_path")
+def fixture_database_path(tmp_path: Path) -> Iterator[str]:
+    """Point `database` at a fresh, migrated database file"""
+    previous = database.path
+    path = str(tmp_path / "test.db")
+    database.configure(path)
+    database.on_first_connect(migrate)
+    yield path
+    database.configure(previous)
+
+
+@pytest.fixture(name="files_app")
+def fixture_files_app(tmp_path: Path) -> Flask:
+    """App serving tmp_path/data.bin (FILE_DATA) at /data.bin"""
+    (tmp_path / "data.bin").write_bytes(FILE_DATA)
+    app = Flask(__name__)
+    app.config['FILES_ROOT'] = str(tmp_path)
+    app.add_url_rule("/<path:filepath>", "file",
+                     lambda filepath: send_path(resolve(filepath)))
+    return app
@@ -0,0 +1,92 @@
+"""app.api_route"""
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_login import LoginManager, UserMixin
+
+try:
+    from app.api_route import MAX_PAGE_SIZE, PAGE_SIZE, Route
+    from app.database_loader import database
+    from app.flask_utils import get_admin
+except ImportError:
+    from ..app.api_route import MAX_PAGE_SIZE, PAGE_SIZE, Route
+    from ..app.database_loader import database
+    from ..app.flask_utils import get_admin
+
+USERS = sorted(f"user{number:03}" for number in range(120))
+
+
+class Admin(UserMixin):
+    """Logged in through the X-User header"""
+
+    def __init__(self, user_id: str) -> None:
+        self.id = user_id
+        self.roles = frozenset({get_admin()})
+
+
+@pytest.fixture(name="app", scope="module")
+def fixture_app() -> Flask:
+    """App with the API blueprint, which can be registered only once"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = "test"
+    login = LoginManager(app)
+    login.user_loader(lambda _user_id: None)
+    login.request_loader(lambda request: request.headers.get("X-User") and
+                         Admin(request.headers["X-User"]))
+    Route.init_app(app)
+    return app
+
+
+@pytest.fixture(name="client")
+def fixture_client(app: Flask, database_path: str) -> FlaskClient:
+    """Client logged in as admin, USERS in the database"""
+    assert database_path
+    with database.connection as conn:
+        conn.executemany("insert into users (username, password) values (?, ?)",
+                         [(username, "hash") for username in USERS])
+    client = app.test_client()
+    client.environ_base['HTTP_X_USER'] = "admin"
+    return client
+
+
+def _page(client: FlaskClient, **args: str | int) -> tuple[list[str], str | None]:
+    response = client.get("/api/users", query_string=args)
+    assert response.status_code == 200
+    data = response.get_json()
+    return [user['username'] for user in data['users']], data['next']
+
+
+def test_pages_follow_cursor(client: FlaskClient):
+    """Pages continue after the cursor until a short last page without one"""
+    seen = []
+    after = None
+    while True:
+        names, after = _page(client, limit=50, **({'after': after} if after else {}))
+        seen.extend(names)
+        if after is None:
+            break
+        assert after == names[-1] and len(names) == 50
+    assert seen == USERS
+    assert len(names) == 20
+
+
+def test_page_sizes(client: FlaskClient):
+    """Default size, clamped to 1..MAX_PAGE_SIZE, an exactly full last page
+    still points at an empty next one"""
+    names, after = _page(client)
+    assert names == USERS[:PAGE_SIZE] and after == USERS[PAGE_SIZE - 1]
+    assert _page(client, limit=0) == (USERS[:1], USERS[0])
+    names, after = _page(client, limit=MAX_PAGE_SIZE + 1)
+    assert names == USERS and after is None
+    assert _page(client, limit=60, after=USERS[59]) == (USERS[60:], USERS[-1])
+    assert _page(client, after=USERS[-1]) == ([], None)
+
+
+def test_malformed_cursor(client: FlaskClient):
+    """Unparsable limits fall back to the default, an empty cursor is the first
+    page, unknown ones are positions in username order"""
+    assert _page(client, limit="many") == (USERS[:PAGE_SIZE], USERS[PAGE_SIZE - 1])
+    assert _page(client, after="", limit=5) == (USERS[:5], USERS[4])
+    assert _page(client, after="user050x", limit=2) == (USERS[51:53], USERS[52])
+    assert _page(client, after="zzz") == ([], None)
+    assert client.get("/api/users", environ_base={'HTTP_X_USER': ""}).status_code == 403
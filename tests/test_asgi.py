@@ -0,0 +1,107 @@
+"""app.asgi"""
+from asyncio import gather, run
+from threading import current_thread
+from time import monotonic, sleep
+
+import pytest
+
+pytest.importorskip("asgiref")
+
+try:
+    from app.asgi import ThreadedWsgiToAsgi
+except ImportError:
+    from ..app.asgi import ThreadedWsgiToAsgi
+
+
+def _slow_app(_environ, start_response):
+    sleep(0.2)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [current_thread().name.encode()]
+
+
+async def _request(application, headers=(), messages: list | None = None) -> bytes:
+    scope = {'type': "http", 'method': "GET", 'path': "/", 'query_string': b"",
+             'headers': list(headers), 'http_version': "1.1", 'server': ("test", 80)}
+    body = []
+
+    async def receive():
+        return {'type': "http.request", 'body': b"", 'more_body': False}
+
+    async def send(message):
+        if messages is not None:
+            messages.append(message)
+        if message['type'] == "http.response.body":
+            body.append(message.get('body', b""))
+
+    await application(scope, receive, send)
+    return b"".join(body)
+
+
+def test_requests_overlap():
+    """Slow requests run at the same time, each on a pool thread"""
+    application = ThreadedWsgiToAsgi(_slow_app, threads=5)
+
+    async def five():
+        return await gather(*(_request(application) for _ in range(5)))
+
+    start = monotonic()
+    bodies = run(five())
+    assert monotonic() - start < 0.6
+    assert len(set(bodies)) == 5 and all(body.startswith(b"asgi") for body in bodies)
+    application.executor.shutdown()
+
+
+class _Body:
+    """Response iterable recording whether the server closed it"""
+
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        """WSGI servers call this once the response is sent"""
+        self.closed = True
+
+
+def test_response_framing():
+    """Headers come first, Content-Length caps the body, the iterable is closed"""
+    bodies = []
+
+    def app(_environ, start_response):
+        start_response("201 Created", [("Content-Length", "5"), ("X-Test", "yes")])
+        bodies.append(_Body([b"abc", b"defgh", b"ij"]))
+        return bodies[-1]
+
+    application = ThreadedWsgiToAsgi(app, threads=1)
+    messages: list[dict] = []
+    assert run(_request(application, messages=messages)) == b"abcde"
+    assert messages[0] == {'type': "http.response.start", 'status': 201,
+                           'headers': [(b"content-length", b"5"), (b"x-test", b"yes")]}
+    assert messages[-1] == {'type': "http.response.body"}
+    assert bodies[0].closed
+    application.executor.shutdown()
+
+    def empty(_environ, start_response):
+        start_response("204 No Content", [])
+        return []
+
+    application = ThreadedWsgiToAsgi(empty, threads=1)
+    messages.clear()
+    assert run(_request(application, messages=messages)) == b""
+    assert [message['type'] for message in messages] == ["http.response.start",
+                                                         "http.response.body"]
+    application.executor.shutdown()
+
+
+def test_duplicate_headers_rejected():
+    """Past the duplicate header limit the app isn't called, 400 is sent"""
+    calls = []
+    application = ThreadedWsgiToAsgi(lambda *args: calls.append(args), threads=1,
+                                     duplicate_header_limit=2)
+    messages: list[dict] = []
+    run(_request(application, [(b"x-a", b"1")] * 3, messages))
+    assert messages[0]['status'] == 400 and not calls
+    application.executor.shutdown()
@@ -0,0 +1,94 @@
+"""app.assets"""
+from gzip import decompress
+from pathlib import Path
+
+import pytest
+from flask import Flask, render_template_string
+from flask.testing import FlaskClient
+
+try:
+    from app import assets
+except ImportError:
+    from ..app import assets
+
+CSS = b"body { color: black; }\n" * 20
+JS = b"let x = 1;\n"
+
+
+def _brotli(content: bytes) -> bytes:
+    return b"brotli:" + content
+
+
+@pytest.fixture(name="app")
+def fixture_app(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Flask:
+    """App with main/app.css (compressed), main/tiny.js (too small) and
+    other/plain.txt (not fingerprinted), built into tmp_path/dist"""
+    static = tmp_path / "static"
+    (static / "main").mkdir(parents=True)
+    (static / "other").mkdir()
+    (static / "main" / "app.css").write_bytes(CSS)
+    (static / "main" / "tiny.js").write_bytes(JS)
+    (static / "other" / "plain.txt").write_bytes(b"plain")
+    monkeypatch.setattr(assets, "brotli_compress", _brotli)
+    state = assets._Assets  # pylint: disable=protected-access
+    monkeypatch.setattr(state, "manifest", {})
+    monkeypatch.setattr(state, "output", None)
+    app = Flask(__name__, static_folder=str(static))
+    app.config['ASSETS_OUTPUT'] = str(tmp_path / "dist")
+    assets.build_assets(app)
+    assets.init_app(app)
+    return app
+
+
+@pytest.fixture(name="client")
+def fixture_client(app: Flask) -> FlaskClient:
+    """Test client of `app`"""
+    return app.test_client()
+
+
+def _url(app: Flask, name: str) -> str:
+    with app.test_request_context():
+        return render_template_string("{{ static_url(name) }}", name=name)
+
+
+def test_fingerprinted_manifest(app: Flask, tmp_path: Path):
+    """Asset dirs get content hashed names in the manifest, other files don't"""
+    manifest = assets.load_manifest(str(tmp_path / "dist"))
+    assert manifest == {'main/app.css': assets.fingerprint("main/app.css", CSS),
+                        'main/tiny.js': assets.fingerprint("main/tiny.js", JS)}
+    assert manifest['main/app.css'].startswith("main/app.") and \
+        manifest['main/app.css'].endswith(".css")
+    assert assets.fingerprint("main/app.css", CSS + b" ") != manifest['main/app.css']
+    assert _url(app, "main/app.css") == f"/assets/{manifest['main/app.css']}"
+    assert _url(app, "other/plain.txt") == "/static/other/plain.txt"
+    dist = tmp_path / "dist"
+    assert (dist / f"{manifest['main/app.css']}.gz").exists()
+    assert not (dist / f"{manifest['main/tiny.js']}.gz").exists()
+
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("br, gzip", "br"),
+    ("gzip", "gzip"),
+    ("gzip;q=0, br;q=0", None),
+    ("", None),
+])
+def test_encoding_negotiation(app: Flask, client: FlaskClient, accept: str, encoding: str | None):
+    """The best precompressed copy the client accepts is sent, varying on Accept-Encoding"""
+    response = client.get(_url(app, "main/app.css"), headers={'Accept-Encoding': accept})
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == encoding
+    assert response.mimetype == "text/css"
+    data = decompress(response.data) if encoding == "gzip" else response.data
+    assert data == (_brotli(CSS) if encoding == "br" else CSS)
+    assert "Accept-Encoding" in response.headers['Vary']
+    assert response.headers['Cache-Control'] == \
+        f"public, max-age={assets.MAX_AGE}, immutable"
+
+
+def test_uncompressed_and_missing(app: Flask, client: FlaskClient):
+    """Small files are always sent as is, unknown names and the manifest are 404"""
+    response = client.get(_url(app, "main/tiny.js"), headers={'Accept-Encoding': "br, gzip"})
+    assert response.data == JS and 'Content-Encoding' not in response.headers
+    assert "immutable" in response.headers['Cache-Control']
+    assert client.get("/assets/main/missing.css").status_code == 404
+    assert client.get(f"/assets/{assets.MANIFEST}").status_code == 404
@@ -0,0 +1,109 @@
+"""app.bootstrap"""
+from threading import Event, current_thread, main_thread
+
+import pytest
+from flask import Flask
+
+try:
+    from app import bootstrap as bootstrap_module
+    from app.bootstrap import TIMINGS, bootstrap, clear, register
+except ImportError:
+    from ..app import bootstrap as bootstrap_module
+    from ..app.bootstrap import TIMINGS, bootstrap, clear, register
+
+
+@pytest.fixture(autouse=True)
+def fixture_registry(monkeypatch: pytest.MonkeyPatch):
+    """Empty registry, failures raise instead of going to the report file"""
+    monkeypatch.setattr(bootstrap_module, "_PENDING_BOOTSTRAP", [])
+    monkeypatch.setitem(bootstrap_module.SETTINGS, 'true_keep', True)
+
+
+def test_order_and_threads():
+    """Serial steps run in order on the calling thread, parallel ones on the pool
+    after their dependencies"""
+    calls = []
+    released = Event()
+
+    def first(_app: Flask):
+        calls.append(("first", current_thread() is main_thread()))
+
+    def slow(_app: Flask):
+        released.wait(5)
+        calls.append(("slow", current_thread() is main_thread()))
+
+    def second(_app: Flask):
+        calls.append(("second", current_thread() is main_thread()))
+        released.set()
+
+    def after_slow(_app: Flask):
+        calls.append(("after_slow", current_thread() is main_thread()))
+
+    register(first)
+    register(slow, parallel=True)
+    register(second)
+    register(after_slow, depends=[slow])
+    bootstrap(Flask(__name__))
+    assert calls == [("first", True), ("second", True), ("slow", False), ("after_slow", True)]
+    assert [timing.name.rsplit('.', 1)[-1] for timing in TIMINGS] \
+        == ["first", "second", "slow", "after_slow"]
+
+
+def test_unknown_dependency_and_cycle():
+    """Bad graphs are rejected before anything runs, serial steps implicitly
+    depend on the one registered before them"""
+    calls = []
+
+    def step_a(_app: Flask):
+        calls.append("a")
+
+    def step_b(_app: Flask):
+        calls.append("b")
+
+    register(step_a, depends=[step_b], parallel=True)
+    with pytest.raises(ValueError, match="not registered"):
+        bootstrap(Flask(__name__))
+    register(step_b, depends=[step_a], parallel=True)
+    with pytest.raises(ValueError, match="cycle"):
+        bootstrap(Flask(__name__))
+    bootstrap_module.remove(step_a)
+    bootstrap_module.remove(step_b)
+    register(step_a, depends=[step_b])
+    register(step_b)
+    with pytest.raises(ValueError, match="cycle"):
+        bootstrap(Flask(__name__))
+    assert not calls
+
+
+def test_failed_dependency_skips_dependents():
+    """Other steps still run, dependents of a failed step are skipped"""
+    calls = []
+
+    def broken(_app: Flask):
+        raise RuntimeError("broken")
+
+    def dependent(_app: Flask):
+        calls.append("dependent")
+
+    def independent(_app: Flask):
+        calls.append("independent")
+
+    register(broken, parallel=True)
+    register(dependent, depends=[broken])
+    register(independent)
+    with pytest.raises(ExceptionGroup) as info:
+        bootstrap(Flask(__name__))
+    assert calls == ["independent"]
+    assert [str(exc) for exc in info.value.exceptions] == [
+        "broken", f"{__name__}.test_failed_dependency_skips_dependents.<locals>.dependent "
+        "skipped, a dependency failed to bootstrap."]
+
+
+def test_clear():
+    """Cleared functions don't run"""
+    calls = []
+    register(lambda _app: calls.append("old"))
+    clear()
+    register(lambda _app: calls.append("new"))
+    bootstrap(Flask(__name__))
+    assert calls == ["new"]
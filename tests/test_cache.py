@@ -0,0 +1,74 @@
+"""app.cache"""
+import pytest
+
+try:
+    from app import cache as cache_module
+    from app.cache import LRUCache, cached
+except ImportError:
+    from ..app import cache as cache_module
+    from ..app.cache import LRUCache, cached
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """Controllable `monotonic`, advance by changing `clock[0]`"""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_eviction():
+    """Least recently used entry goes first"""
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expiry(clock: list[float]):
+    """Expired entries are neither contained, counted nor served"""
+    cache = LRUCache(4, ttl=10)
+    cache.set('a', 1)
+    assert 'a' in cache and len(cache) == 1
+    clock[0] += 11
+    assert 'a' not in cache
+    assert len(cache) == 0
+    assert cache.get('a', 'missing') == 'missing'
+    assert cache.stats()['expirations'] == 1
+
+
+def test_contains_does_not_use_entry():
+    """Membership tests leave usage counts alone"""
+    cache = LRUCache(4, uses=1)
+    cache.set('a', 1)
+    assert 'a' in cache
+    assert cache.get('a') == 1
+    assert 'a' not in cache
+
+
+def test_stamp_mismatch_misses():
+    """Entries stored with another stamp miss"""
+    cache = LRUCache(4)
+    cache.set('a', 1, stamp=(1,))
+    assert cache.get('a', stamp=(2,)) is None
+    assert 'a' not in cache
+
+
+def test_cached_per_arguments():
+    """Results are cached per positional and keyword arguments"""
+    calls = []
+
+    @cached(maxsize=8, name="tests.cached")
+    def double(value: int, scale: int = 2) -> int:
+        calls.append(value)
+        return value * scale
+
+    assert double(2) == 4 and double(2) == 4
+    assert double(2, scale=3) == 6
+    assert calls == [2, 2]
+    assert double([1]) == [1, 1]  # unhashable arguments bypass the cache
+    assert len(double.cache) == 2  # type: ignore
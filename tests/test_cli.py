@@ -0,0 +1,61 @@
+"""app.cli"""
+from typing import Iterator
+
+import pytest
+
+try:
+    from app.cli import insert_users
+    from app.database_loader import database
+    from app.hashing import hasher
+    from app.model.user import UserModel
+except ImportError:
+    from ..app.cli import insert_users
+    from ..app.database_loader import database
+    from ..app.hashing import hasher
+    from ..app.model.user import UserModel
+
+pytestmark = pytest.mark.usefixtures("database_path")
+
+
+@pytest.fixture(autouse=True)
+def fixture_cheap_hashes() -> Iterator[None]:
+    """Hash with low cost"""
+    method = hasher.method
+    hasher.method = "pbkdf2:sha256:1000"
+    yield
+    hasher.method = method
+
+
+def test_insert_users():
+    """Rows are hashed and inserted, optional columns defaulted"""
+    inserted, errors = insert_users([
+        {'username': "alice", 'password': "secret", 'groups': "admin"},
+        {'username': "bob", 'password': "secret", 'picture': None},
+    ])
+    assert (inserted, errors) == (2, [])
+    rows = database.connection.execute(
+        "select username, password, picture, groups from users order by username").fetchall()
+    assert [(row['username'], row['picture'], row['groups']) for row in rows] \
+        == [("alice", "", "admin"), ("bob", "", "")]
+    assert hasher.verify(rows[0]['password'], "secret")
+
+
+def test_rows_without_password_rejected():
+    """Missing passwords and usernames are reported, not inserted"""
+    inserted, errors = insert_users([
+        {'username': "alice", 'password': ""},
+        {'username': "bob"},
+        {'password': "secret"},
+        {'username': "carol", 'password': "secret"},
+    ])
+    assert inserted == 1
+    assert errors == ["no password for 'alice'", "no password for 'bob'", "no username"]
+    assert insert_users([{'username': "carol", 'password': "other"}]) == (0, [])
+
+
+def test_inserted_users_invalidated(monkeypatch: pytest.MonkeyPatch):
+    """Raw inserts drop the users from model caches"""
+    changed = []
+    monkeypatch.setattr(UserModel, "changed", changed.extend)
+    insert_users([{'username': "alice", 'password': "secret"}, {'username': "bob"}])
+    assert changed == ["alice"]
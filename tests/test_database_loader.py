@@ -0,0 +1,120 @@
+"""app.database_loader"""
+from gc import collect
+from pathlib import Path
+from threading import Barrier, Thread
+from weakref import ref
+
+import pytest
+from flask import Flask
+
+try:
+    from app.database_loader import QUERY_HOOKS, ConnectionManager, TableProxy, database
+except ImportError:
+    from ..app.database_loader import QUERY_HOOKS, ConnectionManager, TableProxy, database
+
+
+def test_connection_per_thread(tmp_path: Path):
+    """Threads get their own connection, kept across calls"""
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    main = manager.database
+    assert manager.database is main
+    seen = []
+    thread = Thread(target=lambda: seen.append(manager.database))
+    thread.start()
+    thread.join()
+    assert seen[0] is not main
+    manager.close_all()
+
+
+def test_exited_thread_connection_reused(tmp_path: Path):
+    """Connections of exited threads go back to the pool, any thread reuses them"""
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    seen = []
+    for _ in range(20):
+        thread = Thread(target=lambda: seen.append(manager.database))
+        thread.start()
+        thread.join()
+    assert len({id(db) for db in seen}) == 1 and not seen[0].closed
+    assert manager.database is seen[0]
+    manager.close_all()
+    assert seen[0].closed
+    # Closing drops the exit handler that kept the database alive
+    closed = ref(seen.pop())
+    seen.clear()
+    collect()
+    assert closed() is None
+
+
+def test_pool_size(tmp_path: Path):
+    """Released connections beyond the pool size are closed"""
+    manager = ConnectionManager(str(tmp_path / "test.db"), pool_size=1)
+    barrier = Barrier(3)
+    seen = []
+
+    def use():
+        seen.append(manager.database)
+        barrier.wait()
+        manager.release()
+    threads = [Thread(target=use) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(db.closed for db in seen) == [False, True, True]
+    assert not manager.database.closed and manager.database in seen
+    manager.close_all()
+
+
+def test_release_rolls_back(tmp_path: Path):
+    """A connection goes back to the pool without its open transaction"""
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    manager.execute("create table items (name text)", commit=True)
+    manager.execute("insert into items values ('x')")
+    manager.release()
+    assert not manager.connection.in_transaction
+    assert manager.execute("select count(*) as n from items").fetchone()['n'] == 0
+    manager.close_all()
+
+
+def test_released_after_request(tmp_path: Path):
+    """By default app context teardown returns the connection to the pool"""
+    app = Flask(__name__)
+    app.config['DATABASE'] = str(tmp_path / "test.db")
+    manager = ConnectionManager("unused.db")
+    manager.init_app(app)
+    with app.app_context():
+        db = manager.database
+    assert not db.closed
+    seen = []
+    thread = Thread(target=lambda: seen.append(manager.database))
+    thread.start()
+    thread.join()
+    assert seen == [db]
+
+    app = Flask(__name__)
+    app.config.update(DATABASE=str(tmp_path / "test.db"), DATABASE_CLOSE_ON_TEARDOWN=True)
+    manager.init_app(app)
+    with app.app_context():
+        db = manager.database
+    assert db.closed
+    manager.close_all()
+
+
+@pytest.mark.usefixtures("database_path")
+def test_query_hooks():
+    """Proxy methods are timed while hooks are installed, wrapped once per proxy"""
+    users = TableProxy(database, 'users')
+    assert users.select == users.table.select
+    calls = []
+
+    def hook(name: str, _seconds: float):
+        calls.append(name)
+    QUERY_HOOKS.append(hook)
+    try:
+        select = users.select
+        assert users.select is select
+        assert select() == []
+        database.execute("select 1")
+    finally:
+        QUERY_HOOKS.remove(hook)
+    assert calls == ["users.select", "execute"]
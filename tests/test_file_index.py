@@ -0,0 +1,80 @@
+"""app.file_index"""
+from os import utime
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Iterator
+
+import pytest
+
+try:
+    from app.database_loader import database
+    from app.file_index import FileIndex, Page
+except ImportError:
+    from ..app.database_loader import database
+    from ..app.file_index import FileIndex, Page
+
+
+@pytest.fixture(name="index")
+def fixture_index(database_path: str, tmp_path: Path) -> Iterator[FileIndex]:
+    """Scanned index of 3 directories and 5 files, no periodic rescans"""
+    assert database_path
+    root = tmp_path / "files"
+    for number in range(3):
+        (root / f"dir{number}").mkdir(parents=True)
+    for number in range(5):
+        path = root / f"file{number}.txt"
+        path.write_bytes(b"x" * (10 - number))
+        utime(path, (1000 + number, 1000 + number))
+    (root / "dir1" / "file9.txt").write_bytes(b"")
+    index = FileIndex(database, str(root))
+    index.configure(interval=0)
+    index.scan()
+    yield index
+    index.stop()
+
+
+def _pages(fetch) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        page: Page = fetch(cursor)
+        pages.append([entry.name for entry in page.entries])
+        if page.cursor is None:
+            return pages
+        cursor = page.cursor
+
+
+def test_listing_pages(index: FileIndex):
+    """Pages follow each other across the directory/file boundary"""
+    assert _pages(lambda cursor: index.listing("", cursor=cursor, limit=3)) == [
+        ["dir0", "dir1", "dir2"], ["file0.txt", "file1.txt", "file2.txt"],
+        ["file3.txt", "file4.txt"]]
+    assert _pages(lambda cursor: index.listing("", 'size', True, cursor, 4)) == [
+        ["file0.txt", "file1.txt", "file2.txt", "file3.txt"], ["file4.txt", "dir2", "dir1", "dir0"]]
+    assert _pages(lambda cursor: index.listing("", 'mtime', False, cursor, 2))[-2:] == [
+        ["file1.txt", "file2.txt"], ["file3.txt", "file4.txt"]]
+
+
+def test_search_pages(index: FileIndex):
+    """Search pages continue after (name, parent)"""
+    assert _pages(lambda cursor: index.search("file", True, cursor, 2)) == [
+        ["file0.txt", "file1.txt"], ["file2.txt", "file3.txt"], ["file4.txt", "dir1/file9.txt"]]
+    assert _pages(lambda cursor: index.search("E9", False, cursor)) == [["dir1/file9.txt"]]
+
+
+def test_invalid_cursor(index: FileIndex):
+    """Malformed cursors raise ValueError"""
+    for cursor in ("garbage", "W10", "eyJhIjoxfQ"):
+        with pytest.raises(ValueError):
+            index.listing("", cursor=cursor)
+        with pytest.raises(ValueError):
+            index.search("file", cursor=cursor)
+
+
+def test_listing_refreshes_in_background(index: FileIndex):
+    """Listing doesn't walk the directory itself, the background thread does"""
+    root = Path(index.root)
+    (root / "dir2" / "new.txt").write_bytes(b"new")
+    deadline = monotonic() + 5
+    while not index.listing("dir2").entries and monotonic() < deadline:
+        sleep(0.01)
+    assert [entry.name for entry in index.listing("dir2").entries] == ["new.txt"]
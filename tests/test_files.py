@@ -0,0 +1,81 @@
+"""app.files"""
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+try:
+    from tests.conftest import FILE_DATA as DATA
+except ImportError:
+    from .conftest import FILE_DATA as DATA
+
+
+@pytest.fixture(name="client")
+def fixture_client(files_app: Flask) -> FlaskClient:
+    """Test client of `files_app`"""
+    return files_app.test_client()
+
+
+def test_whole_file(client: FlaskClient):
+    """Plain GET sends everything, announcing range support"""
+    response = client.get("/data.bin")
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['Accept-Ranges'] == "bytes"
+    assert client.get("/missing.bin").status_code == 404
+    assert client.get("/../data.bin").status_code == 404
+
+
+@pytest.mark.parametrize("header, start, stop", [
+    ("bytes=10-19", 10, 20),
+    ("bytes=1000-", 1000, 1024),
+    ("bytes=-4", 1020, 1024),
+    ("bytes=1020-5000", 1020, 1024),
+])
+def test_single_range(client: FlaskClient, header: str, start: int, stop: int):
+    """One range is answered with 206 and exactly its bytes"""
+    response = client.get("/data.bin", headers={'Range': header})
+    assert response.status_code == 206
+    assert response.data == DATA[start:stop]
+    assert response.headers['Content-Length'] == str(stop - start)
+    assert response.headers['Content-Range'] == f"bytes {start}-{stop - 1}/{len(DATA)}"
+
+
+def test_if_range(client: FlaskClient):
+    """A stale If-Range gets the whole file, a current one the range"""
+    etag = client.get("/data.bin").headers['ETag']
+    stale = client.get("/data.bin", headers={'Range': "bytes=0-9", 'If-Range': '"other"'})
+    assert stale.status_code == 200 and stale.data == DATA
+    current = client.get("/data.bin", headers={'Range': "bytes=0-9", 'If-Range': etag})
+    assert current.status_code == 206 and current.data == DATA[:10]
+
+
+def test_conditional_and_unsatisfiable(client: FlaskClient):
+    """Matching ETags get 304, ranges past the end 416"""
+    etag = client.get("/data.bin").headers['ETag']
+    assert client.get("/data.bin", headers={'If-None-Match': etag}).status_code == 304
+    assert client.get("/data.bin", headers={'Range': "bytes=5000-"}).status_code == 416
+
+
+def test_range_through_file_wrapper(client: FlaskClient):
+    """With a server file wrapper the file is handed over at the range start"""
+    positions = []
+
+    class FileWrapper:
+        """Records where the file was handed over, sends nothing"""
+
+        def __init__(self, file, _block_size: int) -> None:
+            positions.append(file.tell())
+            self.file = file
+
+        def __iter__(self):
+            return iter(())
+
+        def close(self):
+            """Close the file"""
+            self.file.close()
+
+    response = client.get("/data.bin", headers={'Range': "bytes=100-199"},
+                          environ_overrides={'wsgi.file_wrapper': FileWrapper})
+    assert response.status_code == 206
+    assert response.headers['Content-Length'] == "100"
+    assert positions == [100]
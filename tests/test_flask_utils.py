@@ -0,0 +1,68 @@
+"""app.flask_utils"""
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_login import LoginManager, UserMixin
+
+try:
+    from app.flask_utils import get_admin, role_required
+    from app.utils import parse_roles
+except ImportError:
+    from ..app.flask_utils import get_admin, role_required
+    from ..app.utils import parse_roles
+
+
+class Member(UserMixin):
+    """Logged in through the X-Groups header, holding its roles"""
+
+    def __init__(self, groups: str) -> None:
+        self.id = groups
+        self.roles = parse_roles(groups)
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> FlaskClient:
+    """App with views guarded by role_required"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = "test"
+    login = LoginManager(app)
+    login.user_loader(lambda _user_id: None)
+    login.request_loader(lambda request: "X-Groups" in request.headers and
+                         Member(request.headers["X-Groups"]))
+
+    @app.get("/moderate")
+    @role_required("moderator", "editor")
+    def moderate():
+        return "moderated"
+
+    @app.get("/hidden")
+    @role_required("staff", code=404)
+    async def hidden():
+        return "hidden"
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize("groups, status", [
+    ("moderator", 200),
+    ("editor,user", 200),
+    (get_admin(), 200),
+    ("user", 403),
+    ("", 403),
+    (None, 403),
+])
+def test_role_required(client: FlaskClient, groups: str | None, status: int):
+    """Any of the roles, or admin, is let through, others get the code"""
+    headers = {} if groups is None else {'X-Groups': groups}
+    response = client.get("/moderate", headers=headers)
+    assert response.status_code == status
+    if status == 200:
+        assert response.data == b"moderated"
+
+
+def test_role_required_code_and_async(client: FlaskClient):
+    """A custom code is used on deny, async views are awaited"""
+    assert client.get("/hidden", headers={'X-Groups': "user"}).status_code == 404
+    assert client.get("/hidden").status_code == 404
+    assert client.get("/hidden", headers={'X-Groups': "staff"}).data == b"hidden"
+    assert client.get("/hidden", headers={'X-Groups': get_admin()}).data == b"hidden"
@@ -0,0 +1,65 @@
+"""app.hashing"""
+from json import loads
+from pathlib import Path
+
+import pytest
+
+try:
+    from app import hashing
+    from app.hashing import MIN_COST, PasswordHasher
+except ImportError:
+    from ..app import hashing
+    from ..app.hashing import MIN_COST, PasswordHasher
+
+
+def test_hash_and_verify():
+    """Hashes verify with current parameters"""
+    hasher = PasswordHasher('pbkdf2', 1000)
+    pwhash = hasher.hash("secret")
+    assert pwhash.startswith("pbkdf2:sha256:1000$")
+    assert hasher.verify(pwhash, "secret") and not hasher.verify(pwhash, "wrong")
+    assert not hasher.needs_rehash(pwhash)
+
+
+def test_needs_rehash_tolerance():
+    """Only other algorithms and clearly weaker costs are rehashed"""
+    hasher = PasswordHasher('pbkdf2', 600_000)
+    assert not hasher.needs_rehash("pbkdf2:sha256:599000$salt$hash")
+    assert not hasher.needs_rehash("pbkdf2:sha256:900000$salt$hash")
+    assert hasher.needs_rehash("pbkdf2:sha256:260000$salt$hash")
+    assert hasher.needs_rehash("pbkdf2:sha1:600000$salt$hash")
+    assert hasher.needs_rehash("scrypt:32768:8:1$salt$hash")
+    assert hasher.needs_rehash("garbage")
+
+    hasher = PasswordHasher('scrypt', 2 ** 16)
+    assert not hasher.needs_rehash("scrypt:65536:8:1$salt$hash")
+    assert hasher.needs_rehash("scrypt:32768:8:1$salt$hash")
+    assert hasher.needs_rehash("scrypt:65536:16:1$salt$hash")
+
+
+def test_calibrate_takes_median(monkeypatch: pytest.MonkeyPatch):
+    """One slow sample doesn't move the calibrated cost"""
+    timings = iter([0.0, 0.5, 0.5, 0.6, 0.6, 0.7, 0.7, 0.8, 0.8, 0.9])
+    monkeypatch.setattr(hashing, "generate_password_hash", lambda *_: "")
+    monkeypatch.setattr(hashing, "perf_counter", lambda: next(timings))
+    hasher = PasswordHasher('pbkdf2')
+    # samples of 500, 100, 100, 100 and 100 ms against a 200 ms target
+    assert hasher.calibrate(200) == MIN_COST['pbkdf2'] * 2
+
+
+def test_calibration_is_stored(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Later starts reuse the stored cost instead of measuring again"""
+    path = str(tmp_path / "instance" / "password-hash.json")
+    calls = []
+
+    def calibrate(self: PasswordHasher, target_ms: float) -> int:
+        calls.append(target_ms)
+        self.configure(cost=700_000)
+        return self.cost
+    monkeypatch.setattr(PasswordHasher, "calibrate", calibrate)
+    first = PasswordHasher('pbkdf2')
+    first.calibrate_stored(100, path)
+    assert loads(Path(path).read_text(encoding="utf-8")) == {'pbkdf2:100': 700_000}
+    second = PasswordHasher('pbkdf2')
+    assert second.calibrate_stored(100, path) == 700_000
+    assert second.method == first.method and calls == [100]
@@ -0,0 +1,90 @@
+"""app.json_provider"""
+from datetime import datetime, timezone
+from json import dumps, loads
+from typing import Any
+
+import pytest
+from flask import Flask
+
+try:
+    from app import json_provider
+    from app.json_provider import CHUNK_SIZE, encode, json_array_response, ndjson_response
+except ImportError:
+    from ..app import json_provider
+    from ..app.json_provider import CHUNK_SIZE, encode, json_array_response, ndjson_response
+
+# About 100 bytes each, a few hundred cross the chunk size
+ROWS = [{'username': f"user{number:05}", 'picture': "x" * 64, 'groups': "émoji ✓"}
+        for number in range(2000)]
+
+
+@pytest.fixture(name="app")
+def fixture_app() -> Flask:
+    """App using `FastJSONProvider`"""
+    app = Flask(__name__)
+    json_provider.init_app(app)
+    return app
+
+
+def _chunks(app: Flask, make_response: Any, *args: Any) -> list[bytes]:
+    with app.test_request_context():
+        return list(make_response(*args).response)
+
+
+def test_encode_matches_stdlib():
+    """Compact UTF-8 output, datetimes formatted like Flask's provider"""
+    obj = {'name': "émoji ✓", 'when': datetime(2024, 1, 2, tzinfo=timezone.utc), 'n': [1, 2.5]}
+    assert loads(encode(obj)) == {'name': "émoji ✓", 'when': "Tue, 02 Jan 2024 00:00:00 GMT",
+                                  'n': [1, 2.5]}
+    assert encode({'b': 1, 'a': 2}, sort_keys=True) == b'{"a":2,"b":1}'
+
+
+def test_stdlib_fallback():
+    """What orjson rejects (integers over 64 bits) is encoded by stdlib json"""
+    if json_provider.orjson is None:
+        pytest.skip("orjson is not installed")
+    big = {'id': 2 ** 70, 'name': "é"}
+    with pytest.raises(TypeError):
+        json_provider.orjson.dumps(big)
+    assert encode(big) == dumps(big, ensure_ascii=False, separators=(',', ':')).encode()
+    assert encode(big, indent=True) == dumps(big, ensure_ascii=False, indent=2).encode()
+
+
+def test_provider(app: Flask):
+    """jsonify and app.json go through the fast path"""
+    with app.test_request_context():
+        response = app.json.response({'big': 2 ** 70, 'ok': True})
+    assert loads(response.data) == {'big': 2 ** 70, 'ok': True}
+    assert response.data.endswith(b"\n")
+    assert app.json.loads(app.json.dumps(ROWS[:3])) == ROWS[:3]
+
+
+def _assert_chunked(chunks: list[bytes]):
+    """Every chunk but the last is CHUNK_SIZE bytes, give or take one row"""
+    assert len(chunks) > 1
+    assert all(CHUNK_SIZE <= len(chunk) < CHUNK_SIZE + 1024 for chunk in chunks[:-1])
+    assert chunks[-1]
+
+
+def test_ndjson_framing(app: Flask):
+    """One row per line, lines aren't split across the chunk boundary"""
+    chunks = _chunks(app, ndjson_response, iter(ROWS))
+    _assert_chunked(chunks)
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    assert [loads(line) for line in b"".join(chunks).splitlines()] == ROWS
+    assert not _chunks(app, ndjson_response, iter([]))
+    assert _chunks(app, ndjson_response, iter(ROWS[:1])) == [encode(ROWS[0]) + b"\n"]
+
+
+@pytest.mark.parametrize("rows", [ROWS, [], ROWS[:1]], ids=["many", "empty", "single"])
+def test_json_array_framing(app: Flask, rows: list[dict[str, str]]):
+    """Chunks join into one valid array, bare or put in an object after fields"""
+    chunks = _chunks(app, json_array_response, iter(rows))
+    if len(rows) > 1:
+        _assert_chunked(chunks)
+    assert loads(b"".join(chunks)) == rows
+    joined = b"".join(_chunks(app, json_array_response, iter(rows), "users",
+                              {'status': "success"}))
+    assert loads(joined) == {'status': "success", 'users': rows}
+    assert loads(b"".join(_chunks(app, json_array_response, iter(rows), "users"))) \
+        == {'users': rows}
@@ -0,0 +1,109 @@
+"""app.model"""
+from time import sleep
+from typing import Iterator
+
+import pytest
+
+try:
+    from app.database_loader import database
+    from app.errors import ResourceNotFound
+    from app.model.user import USER_CACHE_TTL, UserModel
+    from app.page_cache import _stamp
+except ImportError:
+    from ..app.database_loader import database
+    from ..app.errors import ResourceNotFound
+    from ..app.model.user import USER_CACHE_TTL, UserModel
+    from ..app.page_cache import _stamp
+
+
+@pytest.fixture(autouse=True)
+def fixture_users(database_path: str) -> Iterator[str]:
+    """Ten users, user0 to user9, and an empty identity cache"""
+    with database.connection as conn:
+        conn.executemany("insert into users (username, password, groups) values (?, ?, ?)",
+                         [(f"user{number}", "hash", "admin" if number == 0 else "")
+                          for number in range(10)])
+    UserModel.configure_identity_cache()
+    yield database_path
+    UserModel.configure_identity_cache(ttl=USER_CACHE_TTL)
+
+
+def test_slotted_fields():
+    """Columns and derived values live in slots"""
+    user = UserModel.load("user0")
+    assert not hasattr(user, '__dict__')
+    assert user.as_dict() == {'username': "user0", 'password': "hash",
+                              'picture': "", 'groups': "admin"}
+    assert user.roles == frozenset({"admin"})
+
+
+def test_load_missing():
+    """Unknown keys raise ResourceNotFound"""
+    with pytest.raises(ResourceNotFound):
+        UserModel.load("nobody")
+
+
+def test_find_many_keeps_key_order():
+    """Missing keys are skipped, duplicates collapsed"""
+    UserModel.load("user5")
+    users = UserModel.find_many(["user5", "nobody", "user2", "user5", "user7"])
+    assert [user.username for user in users] == ["user5", "user2", "user7"]
+
+
+def test_page_and_iterate():
+    """Keyset pages follow each other, iterate crosses batch boundaries"""
+    first = UserModel.page(limit=4)
+    second = UserModel.page(first[-1].username, limit=4)
+    assert [user.username for user in first + second] == [f"user{n}" for n in range(8)]
+    assert [user.username for user in UserModel.iterate(batch=3)] \
+        == [f"user{number}" for number in range(10)]
+
+
+def test_save_renamed_key():
+    """Saving after changing the key updates the row it was loaded from"""
+    user = UserModel.load("user3")
+    user.username = "renamed"
+    user.save()
+    assert UserModel.load("renamed").username == "renamed"
+    with pytest.raises(ResourceNotFound):
+        UserModel.load("user3")
+    assert [user.username for user in UserModel.iterate(batch=2)].count("renamed") == 1
+
+
+def test_cached_instances_not_shared():
+    """Changes to a loaded instance stay with it until saved"""
+    first = UserModel.load("user1")
+    first.groups = "admin"
+    second = UserModel.load("user1")
+    assert second is not first and second.groups == ""
+    [third] = UserModel.find_many(["user1"])
+    assert third is not second and third.groups == ""
+    first.save()
+    assert UserModel.load("user1").groups == "admin"
+    assert UserModel.load("user1").roles == frozenset({"admin"})
+
+
+def _revoke(username: str):
+    """Write as another process would, behind the identity cache"""
+    with database.connection as conn:
+        conn.execute("update users set groups = '' where username = ?", (username,))
+
+
+def test_other_process_writes_expire():
+    """Users are reused only for a short TTL, then writes of other workers show"""
+    UserModel.configure_identity_cache(ttl=0.05)
+    assert UserModel.load("user0").roles == frozenset({"admin"})
+    _revoke("user0")
+    assert UserModel.load("user0").roles == frozenset({"admin"})
+    sleep(0.1)
+    assert UserModel.load("user0").roles == frozenset()
+
+
+def test_raw_writes_invalidate():
+    """`changed` drops rows written with raw SQL and their viewer's pages"""
+    assert UserModel.load("user0").roles == frozenset({"admin"})
+    stamps = _stamp(None, "user0"), _stamp(None, "user1")
+    _revoke("user0")
+    UserModel.changed(["user0"])
+    assert UserModel.load("user0").roles == frozenset()
+    assert _stamp(None, "user0") != stamps[0] and _stamp(None, "user1") == stamps[1]
@@ -0,0 +1,88 @@
+"""app.page_cache"""
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_login import LoginManager, UserMixin
+
+try:
+    from app import page_cache
+    from app.database_loader import database
+    from app.model.user import UserModel
+except ImportError:
+    from ..app import page_cache
+    from ..app.database_loader import database
+    from ..app.model.user import UserModel
+
+RENDERS: list[str] = []
+
+
+class Viewer(UserMixin):
+    """Logged in through the X-User header"""
+
+    def __init__(self, user_id: str) -> None:
+        self.id = user_id
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> FlaskClient:
+    """App with one cached view counting its renders"""
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY="test", PAGE_CACHE=True)
+    login = LoginManager(app)
+    login.user_loader(lambda _user_id: None)
+    login.request_loader(lambda request: request.headers.get("X-User") and
+                         Viewer(request.headers["X-User"]))
+    page_cache.init_app(app)
+
+    @app.get("/page")
+    @page_cache.cache_page
+    def page():
+        RENDERS.append("page")
+        return f"render {len(RENDERS)}"
+
+    RENDERS.clear()
+    return app.test_client()
+
+
+def test_cached_and_conditional(client: FlaskClient):
+    """Second request is served from cache, a matching ETag gets 304"""
+    first = client.get("/page")
+    second = client.get("/page")
+    assert first.data == second.data == b"render 1"
+    assert client.get("/page", headers={'If-None-Match': first.headers['ETag']}).status_code \
+        == 304
+    assert client.get("/page?other").data == b"render 2"
+    page_cache.invalidate("page")
+    assert client.get("/page").data == b"render 3"
+
+
+def test_invalidate_viewer(client: FlaskClient):
+    """Invalidating a viewer's pages leaves other viewers' cached"""
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 1"
+    assert client.get("/page", headers={'X-User': "bob"}).data == b"render 2"
+    page_cache.invalidate(viewer="alice")
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 3"
+    assert client.get("/page", headers={'X-User': "bob"}).data == b"render 2"
+    page_cache.invalidate("page", viewer="bob")
+    assert client.get("/page", headers={'X-User': "bob"}).data == b"render 4"
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 3"
+
+
+@pytest.mark.usefixtures("database_path")
+def test_model_writes_invalidate(client: FlaskClient):
+    """Saving or deleting a user drops the pages rendered for that user only"""
+    with database.connection as conn:
+        conn.execute("insert into users (username, password) values ('alice', 'x')")
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 1"
+    assert client.get("/page", headers={'X-User': "bob"}).data == b"render 2"
+    assert client.get("/page").data == b"render 3"
+    user = UserModel.load("alice")
+    user.picture = "alice.png"
+    user.save()
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 4"
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 4"
+    assert client.get("/page", headers={'X-User': "bob"}).data == b"render 2"
+    assert client.get("/page").data == b"render 3"
+    user.destroy()
+    assert client.get("/page", headers={'X-User': "alice"}).data == b"render 5"
+    assert client.get("/page", headers={'X-User': "bob"}).data == b"render 2"
@@ -0,0 +1,172 @@
+"""app.prefork"""
+from http.client import HTTPConnection
+from os import environ, pathsep
+from pathlib import Path
+from signal import SIGHUP, SIGTERM
+from socket import socket
+from subprocess import Popen
+from sys import executable
+from threading import Thread, current_thread
+from time import monotonic, sleep
+from typing import Iterator
+from urllib.request import urlopen
+
+import pytest
+from flask import Flask
+
+try:
+    from app import prefork
+    from app.prefork import Options, Worker, listen
+    from tests.conftest import FILE_DATA as DATA
+except ImportError:
+    from ..app import prefork
+    from ..app.prefork import Options, Worker, listen
+    from .conftest import FILE_DATA as DATA
+
+ROOT = Path(__file__).resolve().parent.parent
+# Run as `python -c SCRIPT PORT MAX_REQUESTS`, which a reload re-execs as is
+SCRIPT = """
+import os, sys, time
+from flask import Flask
+from app.prefork import Arbiter, Options
+app = Flask("prefork_test")
+app.add_url_rule("/pid", "pid", lambda: str(os.getpid()))
+app.add_url_rule("/slow", "slow", lambda: time.sleep(1) or "done")
+Arbiter(app, Options("127.0.0.1", int(sys.argv[1]), 1, int(sys.argv[2]), 0, 5)).run()
+"""
+
+
+def _free_port() -> int:
+    with socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(port: int, path: str) -> str:
+    with urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as response:
+        return response.read().decode()
+
+
+def _wait_closed(worker: Worker):
+    deadline = monotonic() + 5
+    while worker.active and monotonic() < deadline:
+        sleep(0.01)
+
+
+@pytest.fixture(name="serve")
+def fixture_serve():
+    """Start the master process, returns (process, port) once it answers"""
+    processes: list[Popen] = []
+
+    def serve(max_requests: int = 0) -> tuple[Popen, int]:
+        port = _free_port()
+        env = dict(environ, PYTHONPATH=pathsep.join(
+            filter(None, [str(ROOT), environ.get('PYTHONPATH')])))
+        process = Popen(  # pylint: disable=consider-using-with
+            [executable, "-c", SCRIPT, str(port), str(max_requests)], env=env)
+        processes.append(process)
+        deadline = monotonic() + 10
+        while True:
+            try:
+                with socket() as sock:
+                    sock.connect(("127.0.0.1", port))
+                return process, port
+            except OSError:
+                if monotonic() > deadline or process.poll() is not None:
+                    raise
+                sleep(0.05)
+
+    yield serve
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(SIGTERM)
+            process.wait(10)
+
+
+def test_worker_recycling(serve):
+    """A worker is replaced after max requests, no request is lost"""
+    _, port = serve(max_requests=2)
+    pids = [_get(port, "/pid") for _ in range(4)]
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+
+
+def test_graceful_reload(serve):
+    """SIGHUP brings up new workers, in-flight requests still complete"""
+    process, port = serve()
+    old = _get(port, "/pid")
+    slow: list[str] = []
+    request = Thread(target=lambda: slow.append(_get(port, "/slow")))
+    request.start()
+    sleep(0.3)
+    process.send_signal(SIGHUP)
+    deadline = monotonic() + 10
+    while _get(port, "/pid") == old and monotonic() < deadline:
+        sleep(0.05)
+    request.join(10)
+    assert slow == ["done"]
+    assert _get(port, "/pid") != old
+    assert process.poll() is None
+    process.send_signal(SIGTERM)
+    assert process.wait(10) == 0
+
+
+@pytest.fixture(name="worker")
+def fixture_worker(files_app: Flask) -> Iterator[Worker]:
+    """In-process worker serving `files_app`, without signal handling"""
+    files_app.add_url_rule("/thread", "thread", lambda: current_thread().name)
+    worker = Worker(files_app, listen("127.0.0.1", 0), Options("127.0.0.1", 0))
+    thread = Thread(target=worker.server.serve_forever, daemon=True)
+    thread.start()
+    yield worker
+    worker.server.shutdown()
+    worker.server.server_close()
+
+
+def test_file_wrapper_sendfile(worker: Worker, monkeypatch: pytest.MonkeyPatch):
+    """Files and single ranges go through sendfile, exactly Content-Length bytes"""
+    sent = []
+    sendfile = prefork.FileServerHandler.sendfile
+
+    def spy(self):
+        sent.append(self.result.filelike.tell())
+        return sendfile(self)
+
+    monkeypatch.setattr(prefork.FileServerHandler, "sendfile", spy)
+    for headers, status, body in (({}, 200, DATA),
+                                  ({'Range': "bytes=100-199"}, 206, DATA[100:200])):
+        connection = HTTPConnection(*worker.server.server_address[:2], timeout=10)
+        connection.request("GET", "/data.bin", headers=headers)
+        response = connection.getresponse()
+        assert (response.status, response.read()) == (status, body)
+        connection.close()
+    assert sent == [0, 100]
+    _wait_closed(worker)
+    assert worker.served == 2 and worker.active == 0
+
+
+def test_keep_alive(worker: Worker):
+    """HTTP/1.1 requests share one connection until the client closes it"""
+    connection = HTTPConnection(*worker.server.server_address[:2], timeout=10)
+    for _ in range(3):
+        connection.request("GET", "/data.bin", headers={'Range': "bytes=0-9"})
+        response = connection.getresponse()
+        assert response.read() == DATA[:10] and response.getheader('Connection') is None
+    assert worker.active == 1
+    connection.request("GET", "/data.bin", headers={'Connection': "close"})
+    response = connection.getresponse()
+    assert response.read() == DATA and response.getheader('Connection') == "close"
+    connection.close()
+    _wait_closed(worker)
+    assert (worker.served, worker.active) == (4, 0)
+
+
+def test_thread_pool(worker: Worker):
+    """Connections are served by the same fixed set of threads"""
+    names = set()
+    for _ in range(40):
+        connection = HTTPConnection(*worker.server.server_address[:2], timeout=10)
+        connection.request("GET", "/thread")
+        names.add(connection.getresponse().read().decode())
+        connection.close()
+    assert all(name.startswith("request-") for name in names)
+    assert len(names) <= worker.options.threads
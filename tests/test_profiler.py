@@ -0,0 +1,79 @@
+"""app.profiler"""
+from threading import Event, Thread
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_login import LoginManager, UserMixin
+
+try:
+    from app import profiler
+    from app.profiler import profiles
+except ImportError:
+    from ..app import profiler
+    from ..app.profiler import profiles
+
+
+class User(UserMixin):
+    """Logged in through the X-User header"""
+
+    def __init__(self, user_id: str, roles: frozenset[str]) -> None:
+        self.id = user_id
+        self.roles = roles
+
+
+USERS = {'alice': User("alice", frozenset({"admin"})), 'bob': User("bob", frozenset())}
+entered, release = Event(), Event()
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> FlaskClient:
+    """App with a quick and a blocking view, profiler installed"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = "test"
+    login = LoginManager(app)
+    login.user_loader(USERS.get)
+    login.request_loader(lambda request: USERS.get(request.headers.get("X-User", "")))
+    profiler.install(app)
+    app.add_url_rule("/page", "page", lambda: "page")
+
+    @app.get("/wait")
+    def wait():
+        entered.set()
+        release.wait(5)
+        return "waited"
+
+    profiles.clear()
+    entered.clear()
+    release.clear()
+    return app.test_client()
+
+
+def test_only_admins_profile(client: FlaskClient):
+    """Anonymous and non-admin users' X-Profile is ignored"""
+    for headers in ({}, {'X-User': "bob"}):
+        response = client.get("/page", headers={'X-Profile': "cprofile", **headers})
+        assert response.data == b"page" and "X-Profile-Id" not in response.headers
+    assert not profiles.recent()
+    response = client.get("/page", headers={'X-Profile': "cprofile", 'X-User': "alice"})
+    profile = profiles.get(int(response.headers["X-Profile-Id"]))
+    assert profile is not None
+    assert (profile.mode, profile.endpoint, profile.user) == ("cprofile", "page", "alice")
+    response = client.get("/page?_profile=sample", headers={'X-User': "alice"})
+    assert profiles.get(int(response.headers["X-Profile-Id"])).mode == "sample"
+
+
+def test_cprofile_only_alone(client: FlaskClient, monkeypatch: pytest.MonkeyPatch):
+    """With process-wide cProfile, requests running alongside others are sampled"""
+    monkeypatch.setattr(profiler, "PROCESS_WIDE", True)
+    other = Thread(target=client.get, args=("/wait",))
+    other.start()
+    assert entered.wait(5)
+    try:
+        response = client.get("/page", headers={'X-Profile': "cprofile", 'X-User': "alice"})
+    finally:
+        release.set()
+        other.join(5)
+    assert profiles.get(int(response.headers["X-Profile-Id"])).mode == "sample"
+    response = client.get("/page", headers={'X-Profile': "cprofile", 'X-User': "alice"})
+    assert profiles.get(int(response.headers["X-Profile-Id"])).mode == "cprofile"
@@ -0,0 +1,52 @@
+"""app.schema"""
+from pathlib import Path
+from sqlite3 import Connection, connect
+
+import pytest
+
+try:
+    from app.errors import ApplicationError
+    from app.schema import MIGRATIONS, migrate, schema_version
+except ImportError:
+    from ..app.errors import ApplicationError
+    from ..app.schema import MIGRATIONS, migrate, schema_version
+
+
+def _version_one(tmp_path: Path) -> Connection:
+    conn = connect(tmp_path / "test.db")
+    for step in MIGRATIONS[0]:
+        conn.execute(step)  # type: ignore
+    conn.execute("pragma user_version = 1")
+    conn.commit()
+    return conn
+
+
+def _indexes(conn: Connection) -> set[str]:
+    return {row[0] for row in conn.execute("select name from sqlite_master where type = 'index'")}
+
+
+def test_migrate_fresh(tmp_path: Path):
+    """Every migration applies once"""
+    conn = connect(tmp_path / "test.db")
+    assert migrate(conn) == len(MIGRATIONS)
+    assert {"users_username", "groups_gid", "files_name"} <= _indexes(conn)
+    assert migrate(conn) == len(MIGRATIONS)
+    conn.close()
+
+
+@pytest.mark.parametrize("table, rows, message", [
+    ("users (username, password)", [("alice", "x"), ("alice", "y")], "duplicated usernames"),
+    ("groups (gid, name)", [(1, "staff"), (1, "admin")], "duplicated gids"),
+])
+def test_duplicates_block_migration(tmp_path: Path, table: str,
+                                    rows: list[tuple], message: str):
+    """Duplicates are reported and the whole migration is rolled back"""
+    conn = _version_one(tmp_path)
+    conn.executemany(f"insert into {table} values (?, ?)", rows)
+    conn.commit()
+    with pytest.raises(ApplicationError, match=message):
+        migrate(conn)
+    assert schema_version(conn) == 1
+    assert not _indexes(conn) & {"users_username", "groups_gid"}
+    assert not conn.in_transaction
+    conn.close()
@@ -0,0 +1,67 @@
+"""app.throttle"""
+from pathlib import Path
+
+import pytest
+
+try:
+    from app import throttle
+    from app.database_loader import ConnectionManager
+    from app.throttle import LoginThrottle, SQLiteTokenBuckets, TokenBuckets
+except ImportError:
+    from ..app import throttle
+    from ..app.database_loader import ConnectionManager
+    from ..app.throttle import LoginThrottle, SQLiteTokenBuckets, TokenBuckets
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """Controllable `time`, advance by changing `clock[0]`"""
+    now = [1000.0]
+    monkeypatch.setattr(throttle, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(name="buckets", params=["memory", "sqlite"])
+def fixture_buckets(request: pytest.FixtureRequest, tmp_path: Path):
+    """Both bucket stores, burst of 2 and a token every 10 seconds"""
+    if request.param == "memory":
+        return TokenBuckets(2, 0.1)
+    manager = ConnectionManager(str(tmp_path / "throttle.db"))
+    request.addfinalizer(manager.close_all)
+    return SQLiteTokenBuckets(manager, "test", 2, 0.1)
+
+
+def test_take_and_refill(buckets, clock: list[float]):
+    """Burst is allowed, then one attempt per refill period"""
+    assert buckets.take("alice") == 0 and buckets.take("alice") == 0
+    assert buckets.take("alice") == pytest.approx(10)
+    assert buckets.take("bob") == 0
+    clock[0] += 10
+    assert buckets.take("alice") == 0
+    assert buckets.take("alice") > 0
+
+
+@pytest.mark.usefixtures("clock")
+def test_refund(buckets):
+    """Refunded tokens can be taken again, never beyond the burst"""
+    buckets.take("alice")
+    buckets.take("alice")
+    buckets.refund("alice")
+    assert buckets.take("alice") == 0
+    buckets.refund("bob")
+    for _ in range(3):
+        buckets.refund("alice")
+    assert buckets.take("alice") == 0 and buckets.take("alice") == 0
+    assert buckets.take("alice") > 0
+
+
+@pytest.mark.usefixtures("clock")
+def test_successful_logins_not_charged():
+    """Only failed attempts use up the limits"""
+    login = LoginThrottle()
+    for _ in range(20):
+        assert login.check("alice", "10.0.0.1") == 0
+        login.succeeded("alice", "10.0.0.1")
+    for _ in range(5):
+        assert login.check("alice", "10.0.0.1") == 0
+    assert login.check("alice", "10.0.0.1") > 0
@@ -0,0 +1,21 @@
+"""app.utils"""
+import pytest
+
+try:
+    from app.utils import NO_ROLES, parse_roles
+except ImportError:
+    from ..app.utils import NO_ROLES, parse_roles
+
+
+@pytest.mark.parametrize("groups, roles", [
+    (None, NO_ROLES),
+    ("", NO_ROLES),
+    ("admin", {"admin"}),
+    ("root,admin", {"root", "admin"}),
+    (" root , admin ,, ", {"root", "admin"}),
+    ("admin,admin", {"admin"}),
+])
+def test_parse_roles(groups: str | None, roles: set[str]):
+    """Comma separated names, whitespace and empty names dropped"""
+    parsed = parse_roles(groups)
+    assert isinstance(parsed, frozenset) and parsed == roles
@@ -0,0 +1,72 @@
+"""app.write_behind"""
+from typing import Iterator
+
+import pytest
+
+try:
+    from app.cli import insert_users
+    from app.database_loader import database
+    from app.model.user import UserModel
+    from app.write_behind import MISSING, write_behind
+except ImportError:
+    from ..app.cli import insert_users
+    from ..app.database_loader import database
+    from ..app.model.user import UserModel
+    from ..app.write_behind import MISSING, write_behind
+
+
+@pytest.fixture(autouse=True)
+def fixture_write_behind(database_path: str, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """Enabled write-behind that only writes when told to, alice in the database"""
+    assert database_path
+    monkeypatch.setattr(write_behind, "enabled", True)
+    monkeypatch.setattr(write_behind, "interval", 60.0)
+    with database.connection as conn:
+        conn.execute("insert into users (username, password) values ('alice', 'old')")
+    yield
+    write_behind.stop()
+
+
+def _passwords() -> dict[str, str]:
+    rows = database.connection.execute("select username, password from users").fetchall()
+    return {row['username']: row['password'] for row in rows}
+
+
+def test_last_write_wins():
+    """An update queued after a delete replaces it, and the other way around"""
+    user = UserModel.load("alice")
+    user.destroy()
+    assert write_behind.pending("users", "username", "alice") is None
+    user.picture = "alice.png"
+    user.save()
+    assert write_behind.pending("users", "username", "alice")['picture'] == "alice.png"
+    assert write_behind.flush() == 1
+    assert database.connection.execute("select picture from users").fetchone()['picture'] \
+        == "alice.png"
+    user.destroy()
+    assert write_behind.pending("users", "username", "alice") is None
+    write_behind.flush()
+    assert not _passwords()
+
+
+def test_delete_then_register():
+    """A direct insert of a username whose delete is queued creates the new user,
+    later flushes don't remove it"""
+    UserModel.load("alice").destroy()
+    assert insert_users([{'username': "alice", 'password': "new"}], prehashed=True) == (1, [])
+    write_behind.flush()
+    assert _passwords() == {'alice': "new"}
+
+
+def test_settle():
+    """Settling writes one row's queued change, leaving the others queued"""
+    with database.connection as conn:
+        conn.execute("insert into users (username, password) values ('bob', 'old')")
+    UserModel.load("alice").destroy()
+    UserModel.load("bob").destroy()
+    write_behind.settle("users", "username", "alice")
+    assert write_behind.pending("users", "username", "alice") is MISSING
+    with database.connection as conn:
+        conn.execute("insert into users (username, password) values ('alice', 'new')")
+    write_behind.flush()
+    assert _passwords() == {'alice': "new"}